@@ -0,0 +1,262 @@
+"""
+Archivo en Parquet de las predicciones antiguas.
+
+Las filas de `predictions` con más de `ARCHIVE_AFTER_DAYS` días se mueven,
+por días completos, a archivos Parquet particionados por día:
+
+    archive/day=2024-05-01/part-<primer id>-<último id>.parquet
+
+Cada día se escribe primero en el archivo y después se borra de SQLite, así
+que un corte a medias solo deja filas que se vuelven a archivar en el mismo
+archivo (mismos ids). La tabla caliente queda pequeña y el archivo ocupa una
+fracción: columnas comprimidas con zstd y cadenas con diccionario.
+
+Los agregados del dashboard salen de las tablas de `api.rollups`, que no se
+tocan al archivar. Las filas en bruto solo hacen falta para los granos finos
+(minuto, hora) más antiguos que su retención: `query_raw_emotions` y
+`query_raw_sectors` los calculan uniendo la tabla caliente con el archivo,
+leyendo solo las particiones de los días pedidos y las columnas necesarias.
+
+Requiere pyarrow; sin él no se archiva y las consultas usan solo SQLite.
+
+    python -m api.archive ./test.db ./archive --older-than-days 30
+"""
+import argparse
+import os
+import sqlite3
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from api.rollups import GRAIN_FORMATS, bucket_start
+
+COLUMNS = ("id", "name", "age", "gender", "sector", "text", "result", "emotion",
+           "suicide_probability", "timestamp", "minute_bucket")
+DAY_FORMAT = "%Y-%m-%d"
+# Longitud del prefijo de minute_bucket que identifica el bucket de cada grano
+BUCKET_PREFIX = {"minute": 16, "hour": 13, "day": 10}
+BUCKET_SUFFIX = {"minute": ":00", "hour": ":00:00", "day": " 00:00:00"}
+
+
+def _schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ("id", pa.int64()),
+        ("name", pa.string()),
+        ("age", pa.int64()),
+        ("gender", pa.string()),
+        ("sector", pa.string()),
+        ("text", pa.string()),
+        ("result", pa.string()),
+        ("emotion", pa.string()),
+        ("suicide_probability", pa.float64()),
+        ("timestamp", pa.timestamp("us")),
+        ("minute_bucket", pa.string()),
+    ])
+
+
+def _parse_timestamp(value):
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+class PredictionArchive:
+    def __init__(self, root):
+        self.root = root
+
+    def days(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name[4:] for name in os.listdir(self.root) if name.startswith("day="))
+
+    def write_day(self, day, rows):
+        """Escribe las filas (tuplas en el orden de COLUMNS) de un día. Devuelve la ruta."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        columns = list(zip(*rows))
+        columns[COLUMNS.index("timestamp")] = [_parse_timestamp(value) for value in columns[COLUMNS.index("timestamp")]]
+        table = pa.table(columns, schema=_schema())
+
+        directory = os.path.join(self.root, f"day={day}")
+        os.makedirs(directory, exist_ok=True)
+        name = f"part-{rows[0][0]}-{rows[-1][0]}.parquet"
+        # Los archivos que empiezan por "." no se leen hasta renombrarlos
+        temporary = os.path.join(directory, f".{name}.tmp")
+        pq.write_table(table, temporary, compression="zstd")
+        os.replace(temporary, os.path.join(directory, name))
+        return os.path.join(directory, name)
+
+    def scan(self, columns, since, until, where=None):
+        """
+        Tabla de Arrow con `columns` de las filas con since <= timestamp < until.
+        Solo se abren las particiones de esos días; `where` añade un filtro.
+        """
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        files = [
+            os.path.join(self.root, f"day={day}", name)
+            for day in self.days() if since.strftime(DAY_FORMAT) <= day <= until.strftime(DAY_FORMAT)
+            for name in sorted(os.listdir(os.path.join(self.root, f"day={day}")))
+            if name.endswith(".parquet") and not name.startswith(".")
+        ]
+        if not files:
+            return pa.table({column: pa.array([], type=_schema().field(column).type) for column in columns})
+        dataset = ds.dataset(files, format="parquet", schema=_schema())
+        condition = (ds.field("timestamp") >= pa.scalar(since, pa.timestamp("us"))) & \
+                    (ds.field("timestamp") < pa.scalar(until, pa.timestamp("us")))
+        if where is not None:
+            condition = condition & where
+        return dataset.to_table(columns=list(columns), filter=condition)
+
+    def size(self):
+        total = 0
+        for directory, _, files in os.walk(self.root):
+            total += sum(os.path.getsize(os.path.join(directory, name)) for name in files)
+        return total
+
+
+def archivable_days(conn, older_than_days, now=None):
+    """Días completos de `predictions` anteriores al corte, del más antiguo al más reciente."""
+    cutoff = ((now or datetime.utcnow()) - timedelta(days=older_than_days)).strftime(DAY_FORMAT)
+    rows = conn.execute(
+        "SELECT DISTINCT substr(minute_bucket, 1, 10) FROM predictions WHERE timestamp < ? ORDER BY 1",
+        (cutoff,),
+    ).fetchall()
+    return [day for day, in rows if day]
+
+
+def read_day(conn, day):
+    start = datetime.strptime(day, DAY_FORMAT)
+    return conn.execute(
+        f"SELECT {', '.join(COLUMNS)} FROM predictions WHERE timestamp >= ? AND timestamp < ? ORDER BY id",
+        (start.strftime("%Y-%m-%d %H:%M:%S"), (start + timedelta(days=1)).strftime("%Y-%m-%d %H:%M:%S")),
+    ).fetchall()
+
+
+def delete_day(conn, day, first_id, last_id):
+    """Borra de `predictions` las filas ya archivadas de un día. No hace commit."""
+    start = datetime.strptime(day, DAY_FORMAT)
+    conn.execute(
+        "DELETE FROM predictions WHERE timestamp >= ? AND timestamp < ? AND id BETWEEN ? AND ?",
+        (start.strftime("%Y-%m-%d %H:%M:%S"), (start + timedelta(days=1)).strftime("%Y-%m-%d %H:%M:%S"),
+         first_id, last_id),
+    )
+
+
+def archive_predictions(conn, archive, older_than_days, now=None):
+    """Archiva en una sola conexión todos los días anteriores al corte. Devuelve las filas movidas."""
+    moved = 0
+    for day in archivable_days(conn, older_than_days, now):
+        rows = read_day(conn, day)
+        if not rows:
+            continue
+        archive.write_day(day, rows)
+        delete_day(conn, day, rows[0][0], rows[-1][0])
+        conn.commit()
+        moved += len(rows)
+    return moved
+
+
+def _bucket_sql(grain):
+    return f"substr(minute_bucket, 1, {BUCKET_PREFIX[grain]}) || '{BUCKET_SUFFIX[grain]}'"
+
+
+def _archive_buckets(table, grain):
+    import pyarrow.compute as pc
+
+    prefix = pc.utf8_slice_codeunits(table["minute_bucket"], 0, BUCKET_PREFIX[grain])
+    return pc.binary_join_element_wise(prefix, BUCKET_SUFFIX[grain], "")
+
+
+def _range(since, until, grain):
+    # Igual que las consultas de agregados: desde el inicio del bucket que contiene `since`
+    return datetime.strptime(bucket_start(since, grain), GRAIN_FORMATS[grain]), until
+
+
+def _archive_until(conn, until):
+    """
+    Fin del tramo que se lee del archivo. Mientras se archiva un día sus filas
+    están en ambos sitios; como se archiva del más antiguo al más reciente y
+    por días completos, del archivo solo se leen los días anteriores al
+    primero que sigue en la tabla.
+    """
+    first, = conn.execute("SELECT min(timestamp) FROM predictions").fetchone()
+    if first is None:
+        return until
+    return min(until, datetime.strptime(first[:10], DAY_FORMAT))
+
+
+def query_raw_emotions(conn, archive, since, until, grain):
+    """[(emotion, count, bucket)] de las filas en bruto (tabla caliente + archivo) entre since y until."""
+    start, end = _range(since, until, grain)
+    counts = defaultdict(int)
+    for emotion, count, bucket in conn.execute(
+        f"SELECT emotion, count(*), {_bucket_sql(grain)} AS bucket FROM predictions "
+        "WHERE timestamp >= ? AND timestamp < ? AND emotion IS NOT NULL GROUP BY bucket, emotion",
+        (str(start), str(end)),
+    ):
+        counts[(emotion, bucket)] += count
+    if archive is not None:
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        table = archive.scan(["emotion", "minute_bucket"], start, _archive_until(conn, end), ds.field("emotion").is_valid())
+        grouped = pa.table({"emotion": table["emotion"], "bucket": _archive_buckets(table, grain)}) \
+            .group_by(["emotion", "bucket"]).aggregate([([], "count_all")])
+        for emotion, bucket, count in zip(*(grouped[column].to_pylist() for column in ("emotion", "bucket", "count_all"))):
+            counts[(emotion, bucket)] += count
+    return sorted(((emotion, count, bucket) for (emotion, bucket), count in counts.items()), key=lambda row: (row[2], row[0]))
+
+
+def query_raw_sectors(conn, archive, since, until, grain):
+    """[(sector, average_suicide_probability, bucket)] de las filas en bruto entre since y until."""
+    start, end = _range(since, until, grain)
+    sums = defaultdict(lambda: [0, 0.0])
+    for sector, value_count, total, bucket in conn.execute(
+        f"SELECT sector, count(suicide_probability), coalesce(sum(suicide_probability), 0.0), {_bucket_sql(grain)} AS bucket "
+        "FROM predictions WHERE timestamp >= ? AND timestamp < ? AND sector IS NOT NULL GROUP BY bucket, sector",
+        (str(start), str(end)),
+    ):
+        sums[(sector, bucket)][0] += value_count
+        sums[(sector, bucket)][1] += total
+    if archive is not None:
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        table = archive.scan(["sector", "suicide_probability", "minute_bucket"], start, _archive_until(conn, end),
+                             ds.field("sector").is_valid())
+        grouped = pa.table({
+            "sector": table["sector"],
+            "bucket": _archive_buckets(table, grain),
+            "suicide_probability": table["suicide_probability"],
+        }).group_by(["sector", "bucket"]).aggregate([("suicide_probability", "count"), ("suicide_probability", "sum")])
+        for sector, bucket, value_count, total in zip(*(grouped[column].to_pylist() for column in (
+            "sector", "bucket", "suicide_probability_count", "suicide_probability_sum",
+        ))):
+            sums[(sector, bucket)][0] += value_count
+            sums[(sector, bucket)][1] += total or 0.0
+    return sorted(
+        ((sector, total / value_count, bucket) for (sector, bucket), (value_count, total) in sums.items() if value_count),
+        key=lambda row: (row[2], row[0]),
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mueve las predicciones antiguas a Parquet particionado por día.")
+    parser.add_argument("database", nargs="?", default="./test.db")
+    parser.add_argument("archive", nargs="?", default="./archive")
+    parser.add_argument("--older-than-days", type=int, default=30)
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.database)
+    try:
+        moved = archive_predictions(conn, PredictionArchive(args.archive), args.older_than_days)
+    finally:
+        conn.close()
+    print(f"{moved} filas archivadas en {args.archive}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
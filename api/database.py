@@ -0,0 +1,119 @@
+"""
+Acceso asíncrono a SQLite con hilos dedicados.
+
+Las consultas nunca se ejecutan en el event loop:
+  - un solo hilo escritor con su propia conexión (SQLite admite un escritor a
+    la vez); las escrituras van en una transacción;
+  - un pool acotado de `readers` conexiones de solo lectura, cada una usada
+    por un hilo a la vez. Con WAL leen una instantánea confirmada sin
+    bloquear al escritor ni esperar por él.
+
+Cada consulta tiene un plazo: si se supera, la que está en ejecución se
+interrumpe con `sqlite3.Connection.interrupt()` (una escritura se deshace) y
+la que aún no ha empezado se descarta. El llamador recibe QueryTimeoutError.
+"""
+import asyncio
+import queue
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from api.storage import apply_pragmas
+
+
+class QueryTimeoutError(Exception):
+    """La consulta no terminó dentro de su plazo."""
+
+
+class Database:
+    def __init__(self, path, readers=4, read_timeout=5.0, write_timeout=30.0):
+        self.path = path
+        self.readers = readers
+        self.read_timeout = read_timeout
+        self.write_timeout = write_timeout
+        # Hilos: uno para escribir y `readers` para leer
+        self.write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        self.read_executor = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="db-reader")
+        self.writer = None
+        self._readers = queue.Queue()
+
+    def open(self):
+        """
+        Abre las conexiones. Se llama al arrancar la aplicación, después de
+        crear los workers de inferencia con fork, para que no las hereden.
+        """
+        if self.writer is not None:
+            return
+        self.writer = self._connect()
+        for _ in range(self.readers):
+            conn = self._connect()
+            conn.execute("PRAGMA query_only=1")
+            self._readers.put(conn)
+
+    def close(self):
+        self.write_executor.shutdown(wait=True)
+        self.read_executor.shutdown(wait=True)
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        while not self._readers.empty():
+            self._readers.get_nowait().close()
+
+    def _connect(self):
+        # Cada conexión la usa un solo hilo a la vez, aunque no siempre el mismo
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        apply_pragmas(conn)
+        return conn
+
+    async def read(self, function, *args, timeout=None, **kwargs):
+        """Ejecuta `function(conn, *args, **kwargs)` con una conexión de lectura."""
+        return await self._run(
+            self.read_executor, self._readers.get, self._readers.put,
+            lambda conn: function(conn, *args, **kwargs), timeout or self.read_timeout,
+        )
+
+    async def write(self, function, *args, timeout=None, **kwargs):
+        """Ejecuta `function(conn, *args, **kwargs)` en una transacción del escritor."""
+        return await self._run(
+            self.write_executor, lambda: self.writer, lambda conn: None,
+            lambda conn: self.in_transaction(lambda conn: function(conn, *args, **kwargs)),
+            timeout or self.write_timeout,
+        )
+
+    def in_transaction(self, function):
+        """Ejecuta `function(conn)` con el escritor. Solo desde el hilo escritor."""
+        with self.writer:
+            return function(self.writer)
+
+    async def _run(self, executor, acquire, release, function, timeout):
+        # `conn` solo está definida mientras `function` se ejecuta. Se borra bajo
+        # el lock antes de devolver la conexión, así que el plazo nunca
+        # interrumpe una conexión que ya usa otra petición.
+        state = {"conn": None, "expired": False}
+        lock = threading.Lock()
+
+        def call():
+            conn = acquire()
+            try:
+                with lock:
+                    if state["expired"]:
+                        raise QueryTimeoutError()
+                    state["conn"] = conn
+                try:
+                    return function(conn)
+                finally:
+                    with lock:
+                        state["conn"] = None
+            finally:
+                release(conn)
+
+        future = asyncio.get_event_loop().run_in_executor(executor, call)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            # Si está en ejecución se interrumpe; si no ha empezado, no llegará a ejecutarse
+            with lock:
+                state["expired"] = True
+                if state["conn"] is not None:
+                    state["conn"].interrupt()
+            raise QueryTimeoutError(f"La consulta superó el plazo de {timeout:g}s")
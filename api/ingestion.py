@@ -0,0 +1,112 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from app.metrics import warn
+
+
+class QueueFullError(Exception):
+    """La cola de escritura sigue llena después de esperar `put_timeout`."""
+
+
+class WriteBatcher:
+    """
+    Acumula filas en memoria y las escribe en bloque (un executemany en una
+    sola transacción) cuando se llega a `max_batch_size` filas o pasan
+    `max_wait_ms` desde la primera fila pendiente.
+
+    Modos de durabilidad:
+      - "group": `submit` espera a que su bloque se haya confirmado en disco
+        (commit en grupo: un solo fsync para todas las filas del bloque).
+      - "async": `submit` vuelve en cuanto la fila está en cola; se pueden
+        perder las filas pendientes si el proceso muere.
+    """
+
+    def __init__(self, write_rows, max_batch_size=500, max_wait_ms=50.0,
+                 max_queue_size=10_000, put_timeout=1.0, durability="group", executor=None):
+        if durability not in ("group", "async"):
+            raise ValueError(f"Modo de durabilidad desconocido: {durability}")
+        self.write_rows = write_rows
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_queue_size = max_queue_size
+        self.put_timeout = put_timeout
+        self.durability = durability
+        # Un solo hilo escritor: SQLite admite un escritor a la vez. Si se
+        # recibe uno (p. ej. el de la base de datos), no se detiene al parar
+        self._owns_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_workers=1)
+        self._queue = None
+        self._worker = None
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._worker = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        """Escribe lo que quede en cola y detiene el escritor."""
+        if self._worker is not None:
+            # El marcador None se encola detrás de las filas pendientes
+            await self._queue.put(None)
+            await self._worker
+            self._worker = None
+        if self._owns_executor:
+            self.executor.shutdown(wait=True)
+
+    def qsize(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def submit(self, row):
+        """Encola una fila; con durabilidad "group" espera a que esté escrita."""
+        if self._queue is None:
+            raise RuntimeError("WriteBatcher no iniciado")
+        future = asyncio.get_event_loop().create_future() if self.durability == "group" else None
+        try:
+            await asyncio.wait_for(self._queue.put((row, future)), self.put_timeout)
+        except asyncio.TimeoutError:
+            raise QueueFullError(f"Cola de escritura llena ({self.max_queue_size} filas)")
+        if future is not None:
+            await future
+
+    async def _collect(self):
+        """Devuelve (bloque, detener)."""
+        loop = asyncio.get_event_loop()
+        item = await self._queue.get()
+        if item is None:
+            return [], True
+        batch = [item]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    async def _flush(self, batch):
+        loop = asyncio.get_event_loop()
+        rows = [row for row, _ in batch]
+        try:
+            await loop.run_in_executor(self.executor, self.write_rows, rows)
+        except Exception as e:
+            warn(f"no se pudieron escribir {len(rows)} filas: {e}", level="error", rows=len(rows))
+            for _, future in batch:
+                if future is not None and not future.done():
+                    future.set_exception(e)
+            return
+        for _, future in batch:
+            if future is not None and not future.done():
+                future.set_result(None)
+
+    async def _run(self):
+        while True:
+            batch, stopping = await self._collect()
+            if batch:
+                await self._flush(batch)
+            if stopping:
+                return
@@ -0,0 +1,110 @@
+"""
+Trabajos de análisis asíncronos: el cliente recibe un id al instante y sigue
+el progreso ("queued", "preprocessing", "scoring", "scored", "stored" o
+"failed") consultando el trabajo o suscribiéndose a sus eventos.
+
+Todas las modificaciones se hacen en el hilo del event loop; desde los
+hilos de trabajo se usa `update_threadsafe`.
+"""
+import asyncio
+import time
+import uuid
+
+FINAL_STATUSES = ("stored", "failed")
+
+
+class TooManyJobsError(Exception):
+    """Hay `max_jobs` trabajos sin terminar y no se puede descartar ninguno."""
+
+
+class JobStore:
+    """
+    Trabajos en memoria; los terminados se descartan pasados `ttl` segundos,
+    o antes si hay más de `max_jobs`. Los que siguen en curso nunca se descartan.
+    """
+
+    def __init__(self, ttl=600.0, max_jobs=10_000):
+        self.ttl = ttl
+        self.max_jobs = max_jobs
+        self.jobs = {}
+        self._changed = {}
+        self._tasks = set()
+        self._loop = None
+
+    def create(self):
+        self._loop = asyncio.get_event_loop()
+        self._expire()
+        if len(self.jobs) >= self.max_jobs:
+            raise TooManyJobsError(f"Hay {len(self.jobs)} trabajos en curso")
+        job_id = uuid.uuid4().hex
+        self.jobs[job_id] = {"job_id": job_id, "status": "queued", "result": None, "error": None,
+                             "updated": time.time()}
+        self._changed[job_id] = asyncio.Event()
+        return job_id
+
+    def run(self, coroutine):
+        """
+        Ejecuta el trabajo en una tarea. Se guarda una referencia hasta que
+        termina: el event loop solo guarda referencias débiles a las tareas.
+        """
+        task = asyncio.ensure_future(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def stop(self):
+        """Cancela los trabajos en curso y espera a que terminen."""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def get(self, job_id):
+        job = self.jobs.get(job_id)
+        return dict(job) if job is not None else None
+
+    def update(self, job_id, status, **fields):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return
+        job.update(fields, status=status, updated=time.time())
+        # Despierta a los que esperaban este cambio y prepara el siguiente
+        self._changed[job_id].set()
+        self._changed[job_id] = asyncio.Event()
+
+    def update_threadsafe(self, job_id, status, **fields):
+        self._loop.call_soon_threadsafe(lambda: self.update(job_id, status, **fields))
+
+    async def events(self, job_id, timeout=30.0):
+        """Genera el estado del trabajo en cada cambio hasta que termina."""
+        while True:
+            job = self.get(job_id)
+            if job is None:
+                return
+            changed = self._changed[job_id]
+            yield job
+            if job["status"] in FINAL_STATUSES:
+                return
+            try:
+                await asyncio.wait_for(changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _expire(self):
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self.jobs.items()
+            if job["status"] in FINAL_STATUSES and now - job["updated"] > self.ttl
+        ]
+        # Si aun así hay demasiados, se descartan los terminados más antiguos
+        overflow = len(self.jobs) - len(expired) - self.max_jobs + 1
+        if overflow > 0:
+            expired_set = set(expired)
+            oldest = sorted(
+                (job["updated"], job_id) for job_id, job in self.jobs.items()
+                if job["status"] in FINAL_STATUSES and job_id not in expired_set
+            )
+            expired.extend(job_id for _, job_id in oldest[:overflow])
+        for job_id in expired:
+            self.jobs.pop(job_id, None)
+            self._changed.pop(job_id, None)
@@ -0,0 +1,86 @@
+"""
+Listado paginado de `predictions` para las páginas de administración.
+
+Paginación por clave (keyset) sobre (timestamp, id), de la más reciente a la
+más antigua: cada página continúa desde el cursor de la anterior con
+`(timestamp, id) < (?, ?)`, así que su coste no depende de la posición en la
+tabla (nada de OFFSET). Los filtros por sector y emoción usan los índices
+(sector, timestamp, id) y (emotion, timestamp, id); edad y probabilidad se
+filtran sobre las filas que recorre el índice.
+
+Las funciones trabajan sobre conexiones DB-API de sqlite3.
+"""
+import base64
+from datetime import datetime
+
+# Columnas que se pueden pedir en `fields`
+USER_COLUMNS = ("id", "name", "age", "gender", "sector", "text", "result", "emotion", "suicide_probability", "timestamp")
+DEFAULT_USER_COLUMNS = tuple(column for column in USER_COLUMNS if column != "text")
+
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(timestamp, row_id):
+    return base64.urlsafe_b64encode(f"{timestamp}|{row_id}".encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    """Devuelve (timestamp, id) tal como están guardados; ValueError si el cursor no es válido."""
+    try:
+        timestamp, row_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").rsplit("|", 1)
+        return timestamp, int(row_id)
+    except Exception:
+        raise ValueError(f"Cursor no válido: {cursor}")
+
+
+def parse_fields(fields):
+    """Lista de columnas a partir de "id,name,..."; ValueError si alguna no existe."""
+    if not fields:
+        return list(DEFAULT_USER_COLUMNS)
+    columns = [column.strip() for column in fields.split(",") if column.strip()]
+    unknown = [column for column in columns if column not in USER_COLUMNS]
+    if unknown:
+        raise ValueError(f"Columnas desconocidas: {unknown}; disponibles: {list(USER_COLUMNS)}")
+    return columns
+
+
+def query_users(conn, columns, limit=50, cursor=None, sector=None, emotion=None,
+                min_age=None, max_age=None, min_probability=None):
+    """
+    Una página de filas como dicts con `columns` y el cursor de la siguiente
+    (None si no hay más): (filas, next_cursor).
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    conditions, params = ["timestamp IS NOT NULL"], []
+    for column, value in (("sector", sector), ("emotion", emotion)):
+        if value is not None:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+    for condition, value in (("age >= ?", min_age), ("age <= ?", max_age), ("suicide_probability >= ?", min_probability)):
+        if value is not None:
+            conditions.append(condition)
+            params.append(value)
+    if cursor is not None:
+        conditions.append("(timestamp, id) < (?, ?)")
+        params.extend(decode_cursor(cursor))
+
+    # id y timestamp siempre se leen: forman el cursor
+    selected = ["id", "timestamp"] + [column for column in columns if column not in ("id", "timestamp")]
+    rows = conn.execute(
+        f"SELECT {', '.join(selected)} FROM predictions WHERE {' AND '.join(conditions)} "
+        "ORDER BY timestamp DESC, id DESC LIMIT ?",
+        (*params, limit + 1),
+    ).fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][1], rows[-1][0])
+
+    users = []
+    for row in rows:
+        values = dict(zip(selected, row))
+        if "timestamp" in columns:
+            values["timestamp"] = datetime.fromisoformat(values["timestamp"]).isoformat()
+        users.append({column: values[column] for column in columns})
+    return users, next_cursor
@@ -0,0 +1,229 @@
+"""
+Agregador en memoria con ventanas deslizantes para el dashboard en vivo.
+
+Para cada emoción y cada sector se guarda un buffer circular de buckets por
+minuto con conteo, conteo de probabilidades, suma y suma de cuadrados. Cada
+predicción escrita se suma aquí, así que las consultas de las últimas horas se
+responden recorriendo solo los buckets de la ventana, sin tocar SQLite. Los
+promedios (y la varianza) salen de los pares conteo/suma, por lo que
+cualquier ventana es exacta.
+
+Además se anotan los buckets que cambian para que `drain_changes` devuelva
+solo esos buckets, que es lo que se envía a los dashboards suscritos.
+
+La ventana vive en la memoria de un proceso y solo ve las predicciones que
+escribe ese proceso. Con varios workers de uvicorn cada uno tendría solo su
+parte, así que se crea con `enabled=False`: `covers` devuelve False y las
+consultas van a las tablas de agregados compartidas.
+"""
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from api.rollups import GRAIN_FORMATS, GRAIN_MINUTES
+
+EPOCH = datetime(1970, 1, 1)
+ONE_MINUTE = timedelta(minutes=1)
+
+
+def epoch_minute(timestamp):
+    return (timestamp - EPOCH) // ONE_MINUTE
+
+
+class _RingSeries:
+    """Buckets por minuto de una emoción o un sector."""
+
+    def __init__(self, size):
+        self.minute = np.full(size, -1, dtype=np.int64)  # minuto absoluto de cada posición
+        self.count = np.zeros(size, dtype=np.int64)
+        self.value_count = np.zeros(size, dtype=np.int64)
+        self.sum = np.zeros(size)
+        self.sumsq = np.zeros(size)
+
+    def add(self, minute, count, value_count=0, total=0.0, total_sq=0.0):
+        slot = minute % len(self.minute)
+        if self.minute[slot] != minute:
+            if self.minute[slot] > minute:
+                return  # más antiguo que la ventana
+            self.minute[slot] = minute
+            self.count[slot] = self.value_count[slot] = 0
+            self.sum[slot] = self.sumsq[slot] = 0.0
+        self.count[slot] += count
+        self.value_count[slot] += value_count
+        self.sum[slot] += total
+        self.sumsq[slot] += total_sq
+
+    def window(self, first, last):
+        """Arrays (minutos, conteo, conteo de valores, suma, suma de cuadrados) con datos en [first, last]."""
+        minutes = np.arange(first, last + 1, dtype=np.int64)
+        slots = minutes % len(self.minute)
+        valid = (self.minute[slots] == minutes) & (self.count[slots] > 0)
+        slots = slots[valid]
+        return minutes[valid], self.count[slots], self.value_count[slots], self.sum[slots], self.sumsq[slots]
+
+
+class SlidingWindowAggregator:
+    """Series por minuto de las últimas `minutes` por emoción y por sector."""
+
+    def __init__(self, minutes=24 * 60, enabled=True):
+        # Una hora extra para que el bucket horario que contiene el inicio de
+        # la ventana también esté completo
+        self.minutes = minutes
+        self.enabled = enabled
+        self.size = minutes + 60
+        self.emotions = {}
+        self.sectors = {}
+        # (clave, minuto) modificados desde el último drain_changes
+        self._changed_emotions = set()
+        self._changed_sectors = set()
+        self._lock = threading.Lock()
+
+    def covers(self, time_interval, grain):
+        return self.enabled and grain in ("minute", "hour") and time_interval <= self.minutes
+
+    def add_rows(self, rows):
+        """Suma un bloque de predicciones (dicts con timestamp, emotion, sector, suicide_probability)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            for row in rows:
+                timestamp = row.get("timestamp")
+                if timestamp is None:
+                    continue
+                minute = epoch_minute(timestamp)
+                if row.get("emotion") is not None:
+                    self._series(self.emotions, row["emotion"]).add(minute, 1)
+                    self._changed_emotions.add((row["emotion"], minute))
+                if row.get("sector") is not None:
+                    self._changed_sectors.add((row["sector"], minute))
+                    probability = row.get("suicide_probability")
+                    if probability is None:
+                        self._series(self.sectors, row["sector"]).add(minute, 1)
+                    else:
+                        self._series(self.sectors, row["sector"]).add(
+                            minute, 1, 1, probability, probability * probability
+                        )
+
+    def load(self, conn, now=None):
+        """Reconstruye la ventana desde la tabla `predictions` (conexión sqlite3)."""
+        if not self.enabled:
+            return
+        now = now or datetime.utcnow()
+        since = (now - timedelta(minutes=self.size)).strftime(GRAIN_FORMATS["minute"])
+        emotions = conn.execute(
+            "SELECT minute_bucket, emotion, count(*) FROM predictions "
+            "WHERE timestamp >= ? AND emotion IS NOT NULL GROUP BY minute_bucket, emotion",
+            (since,),
+        ).fetchall()
+        sectors = conn.execute(
+            "SELECT minute_bucket, sector, count(*), count(suicide_probability), "
+            "coalesce(sum(suicide_probability), 0.0), "
+            "coalesce(sum(suicide_probability * suicide_probability), 0.0) FROM predictions "
+            "WHERE timestamp >= ? AND sector IS NOT NULL GROUP BY minute_bucket, sector",
+            (since,),
+        ).fetchall()
+        with self._lock:
+            self.emotions.clear()
+            self.sectors.clear()
+            self._changed_emotions.clear()
+            self._changed_sectors.clear()
+            for bucket, emotion, count in emotions:
+                minute = epoch_minute(datetime.strptime(bucket, "%Y-%m-%d %H:%M:%S"))
+                self._series(self.emotions, emotion).add(minute, count)
+            for bucket, sector, count, value_count, total, total_sq in sectors:
+                minute = epoch_minute(datetime.strptime(bucket, "%Y-%m-%d %H:%M:%S"))
+                self._series(self.sectors, sector).add(minute, count, value_count, total, total_sq)
+
+    def query_emotions(self, since, grain, now=None):
+        """[(emotion, count, bucket)], con el mismo formato que api.rollups.query_emotions."""
+        result = []
+        for emotion, buckets in self._query(self.emotions, since, grain, now):
+            for bucket, count, _, _, _ in buckets:
+                result.append((emotion, count, bucket))
+        return sorted(result, key=lambda row: (row[2], row[0]))
+
+    def query_sectors(self, since, grain, now=None):
+        """[(sector, average_suicide_probability, bucket)] con el formato de api.rollups.query_sectors."""
+        result = []
+        for sector, buckets in self._query(self.sectors, since, grain, now):
+            for bucket, _, value_count, total, _ in buckets:
+                if value_count:
+                    result.append((sector, total / value_count, bucket))
+        return sorted(result, key=lambda row: (row[2], row[0]))
+
+    def sector_stats(self, since, grain, now=None):
+        """Promedio y desviación típica por sector y bucket, a partir de conteo, suma y suma de cuadrados."""
+        result = []
+        for sector, buckets in self._query(self.sectors, since, grain, now):
+            for bucket, _, value_count, total, total_sq in buckets:
+                if value_count:
+                    mean = total / value_count
+                    variance = max(total_sq / value_count - mean * mean, 0.0)
+                    result.append({"sector": sector, "time": bucket, "count": value_count,
+                                   "mean": mean, "std": variance ** 0.5})
+        return result
+
+    def drain_changes(self, grains=("minute", "hour")):
+        """
+        Valores actuales de los buckets modificados desde la llamada anterior:
+        {grano: {"emotions": [(emotion, count, bucket)], "sectors": [(sector, average, bucket)]}}.
+        Cada bucket se devuelve completo, así que el cliente solo tiene que
+        sustituir el que tenga con la misma clave y el mismo bucket.
+        """
+        with self._lock:
+            emotions, self._changed_emotions = self._changed_emotions, set()
+            sectors, self._changed_sectors = self._changed_sectors, set()
+            changes = {}
+            for grain in grains:
+                changes[grain] = {
+                    "emotions": [
+                        (emotion, count, bucket)
+                        for emotion, bucket, count, _, _ in self._buckets(self.emotions, emotions, grain)
+                    ],
+                    "sectors": [
+                        (sector, total / value_count, bucket)
+                        for sector, bucket, _, value_count, total in self._buckets(self.sectors, sectors, grain)
+                        if value_count
+                    ],
+                }
+        return changes
+
+    def _buckets(self, table, changed, grain):
+        step = GRAIN_MINUTES[grain]
+        for key, first in sorted({(key, minute // step * step) for key, minute in changed}):
+            series = table.get(key)
+            if series is None:
+                continue
+            _, count, value_count, total, _ = series.window(first, first + step - 1)
+            if count.sum():
+                bucket = (EPOCH + timedelta(minutes=int(first))).strftime(GRAIN_FORMATS[grain])
+                yield key, bucket, int(count.sum()), int(value_count.sum()), float(total.sum())
+
+    def _series(self, table, key):
+        series = table.get(key)
+        if series is None:
+            series = table[key] = _RingSeries(self.size)
+        return series
+
+    def _query(self, table, since, grain, now):
+        now = now or datetime.utcnow()
+        step = GRAIN_MINUTES[grain]
+        # Desde el inicio del bucket que contiene `since`, igual que los agregados en SQLite
+        first = epoch_minute(since) // step * step
+        last = epoch_minute(now)
+        with self._lock:
+            windows = [(key, series.window(first, last)) for key, series in table.items()]
+        for key, (minutes, count, value_count, total, total_sq) in windows:
+            if not len(minutes):
+                continue
+            buckets, inverse = np.unique(minutes // step, return_inverse=True)
+            sums = [np.bincount(inverse, weights=values, minlength=len(buckets))
+                    for values in (count, value_count, total, total_sq)]
+            yield key, [
+                (
+                    (EPOCH + timedelta(minutes=int(bucket) * step)).strftime(GRAIN_FORMATS[grain]),
+                    int(sums[0][i]), int(sums[1][i]), float(sums[2][i]), float(sums[3][i]),
+                )
+                for i, bucket in enumerate(buckets)
+            ]
@@ -0,0 +1,103 @@
+"""
+Difusión de los cambios del dashboard en vivo por Server-Sent Events.
+
+Un único publicador recoge cada `interval` segundos los buckets modificados
+en el agregador en memoria (una sola agregación, haya los suscriptores que
+haya) y los reparte a todas las suscripciones. Cada suscripción fusiona los
+cambios pendientes por (clave, bucket), así que un cliente lento nunca
+acumula más de un valor por bucket, y se envían como mucho a un ritmo de uno
+cada `client_interval` segundos.
+"""
+import asyncio
+import json
+
+from app.metrics import warn
+
+
+class _Subscription:
+    """Cambios pendientes de un cliente, fusionados por grano, tabla, clave y bucket."""
+
+    def __init__(self):
+        self.pending = {}
+        self.ready = asyncio.Event()
+
+    def merge(self, changes):
+        for grain, tables in changes.items():
+            for table, rows in tables.items():
+                target = self.pending.setdefault(grain, {}).setdefault(table, {})
+                for row in rows:
+                    # (clave, bucket) -> fila más reciente
+                    target[(row[0], row[2])] = row
+        if self.pending:
+            self.ready.set()
+
+    def take(self):
+        pending, self.pending = self.pending, {}
+        self.ready.clear()
+        return {
+            grain: {table: list(rows.values()) for table, rows in tables.items()}
+            for grain, tables in pending.items()
+        }
+
+
+class DashboardBroadcaster:
+    """Publica los deltas de `SlidingWindowAggregator` a los clientes suscritos."""
+
+    def __init__(self, aggregator, interval=1.0, client_interval=1.0, heartbeat=15.0):
+        self.aggregator = aggregator
+        self.interval = interval
+        self.client_interval = client_interval
+        self.heartbeat = heartbeat
+        self.subscriptions = set()
+        self._task = None
+
+    async def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def publish_once(self):
+        changes = self.aggregator.drain_changes()
+        if not self.subscriptions:
+            return
+        if not any(rows for tables in changes.values() for rows in tables.values()):
+            return
+        for subscription in self.subscriptions:
+            subscription.merge(changes)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.publish_once()
+            except Exception as e:
+                warn(f"no se pudieron publicar los cambios del dashboard: {e}", level="error")
+
+    async def stream(self, formatter):
+        """
+        Generador de eventos SSE para un cliente. `formatter` convierte el
+        delta {grano: {"emotions": [...], "sectors": [...]}} en un dict serializable.
+        """
+        subscription = _Subscription()
+        self.subscriptions.add(subscription)
+        try:
+            yield ": subscribed\n\n"
+            while True:
+                try:
+                    await asyncio.wait_for(subscription.ready.wait(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    # Comentario SSE: mantiene viva la conexión y detecta clientes caídos
+                    yield ": ping\n\n"
+                    continue
+                payload = formatter(subscription.take())
+                yield f"event: delta\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+                await asyncio.sleep(self.client_interval)
+        finally:
+            self.subscriptions.discard(subscription)
@@ -1,12 +1,28 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime
+from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Index
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy import func
 from datetime import datetime, timedelta
 from typing import List
+import asyncio
+import json
+import os
+
+from api.archive import PredictionArchive, archivable_days, delete_day, query_raw_emotions, query_raw_sectors, read_day
+from api.batching import MicroBatcher
+from api.database import Database, QueryTimeoutError
+from api.ingestion import QueueFullError, WriteBatcher
+from api.jobs import JobStore, TooManyJobsError
+from api.live_aggregates import SlidingWindowAggregator
+from api.listing import parse_fields, query_users
+from api.live_updates import DashboardBroadcaster
+from api.rollups import GRAIN_FORMATS, RETENTION, bucket_start, choose_grain, compact_rollups, query_emotions, query_sectors, update_rollups
+from api.storage import INDEXES, MINUTE_BUCKET_FORMAT, configure_sqlite, migrate
+from app.inference_pool import InferencePool
+from app.metrics import BATCH_SIZE, REGISTRY, STAGE_SECONDS, log_event, warn
+from app.prueba import cache as prediction_cache, calentar_modelos, probar_prediccion_lote, puntuar_textos, version_modelos
 
 app = FastAPI()
 
@@ -19,14 +35,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Configuración de la base de datos (como antes)
-DATABASE_URL = "sqlite:///./test.db"
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Configuración de la base de datos. SQLAlchemy solo crea y migra el esquema;
+# las consultas pasan por `database`, con sus propios hilos y conexiones.
+DATABASE_PATH = os.getenv("DATABASE_PATH", "./test.db")
+DATABASE_URL = f"sqlite:///{DATABASE_PATH}"
+engine = configure_sqlite(create_engine(DATABASE_URL, connect_args={"check_same_thread": False}))
 Base = declarative_base()
 
 class Prediction(Base):
     __tablename__ = "predictions"
+    __table_args__ = tuple(Index(name, *columns) for name, columns in INDEXES.items())
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
     age = Column(Integer)
@@ -37,8 +55,34 @@ class Prediction(Base):
     emotion = Column(String)
     suicide_probability = Column(Float)
     timestamp = Column(DateTime, default=datetime.utcnow)  # Add timestamp
+    minute_bucket = Column(String)  # Timestamp truncado al minuto ('%Y-%m-%d %H:%M:00')
 
 Base.metadata.create_all(bind=engine)
+migrate(engine)
+engine.dispose()
+
+DB_READERS = int(os.getenv("DB_READERS", "4"))  # conexiones de lectura
+DB_READ_TIMEOUT = float(os.getenv("DB_READ_TIMEOUT", "5"))  # segundos por consulta
+DB_WRITE_TIMEOUT = float(os.getenv("DB_WRITE_TIMEOUT", "30"))  # segundos por transacción
+database = Database(DATABASE_PATH, readers=DB_READERS, read_timeout=DB_READ_TIMEOUT, write_timeout=DB_WRITE_TIMEOUT)
+
+@app.exception_handler(QueryTimeoutError)
+async def query_timeout_handler(request: Request, exc: QueryTimeoutError):
+    # Igual que con la cola de escritura llena: el cliente puede reintentar
+    return JSONResponse(status_code=503, content={"detail": str(exc)})
+
+# Columnas que se insertan; el timestamp se guarda como lo guardaba SQLAlchemy
+PREDICTION_COLUMNS = ("name", "age", "gender", "sector", "text", "result", "emotion",
+                      "suicide_probability", "timestamp", "minute_bucket")
+INSERT_PREDICTION = (
+    f"INSERT INTO predictions ({', '.join(PREDICTION_COLUMNS)}) "
+    f"VALUES ({', '.join('?' * len(PREDICTION_COLUMNS))})"
+)
+
+def _prediction_values(row):
+    values = [row.get(column) for column in PREDICTION_COLUMNS]
+    values[PREDICTION_COLUMNS.index("timestamp")] = row["timestamp"].strftime("%Y-%m-%d %H:%M:%S.%f")
+    return values
 
 class PredictionRequest(BaseModel):
     name: str
@@ -50,54 +94,412 @@ class PredictionRequest(BaseModel):
     emotion: str = None
     suicide_probability: float = None
 
-# Dependency to get the database session
-def get_db():
-    db = SessionLocal()
+# Procesos de inferencia (0 = puntuar en el propio proceso). Se crean desde un
+# servidor de fork de un solo hilo y cargan los modelos al arrancar; los arrays
+# grandes se comparten por mmap. INFERENCE_POOL_TIMEOUT es el máximo de
+# segundos por fragmento: pasado ese tiempo el worker se mata y se reemplaza.
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "0"))
+INFERENCE_POOL_TIMEOUT = float(os.getenv("INFERENCE_POOL_TIMEOUT", "60"))
+inference_pool = (
+    InferencePool(puntuar_textos, INFERENCE_WORKERS, warmup=calentar_modelos, version=version_modelos,
+                  timeout=INFERENCE_POOL_TIMEOUT)
+    if INFERENCE_WORKERS > 0 else None
+)
+
+def score_texts(textos, progreso=None, exacto=None):
+    puntuar = inference_pool.score if inference_pool is not None else None
+    return probar_prediccion_lote(textos, progreso, puntuar, exacto)
+
+# Trabajos de análisis en curso (POST /jobs)
+jobs = JobStore(ttl=float(os.getenv("JOB_TTL_SECONDS", "600")))
+
+def score_batch(items):
+    """
+    Puntúa un micro-lote de (texto, job_id, exacto). Los elementos que vienen
+    de un trabajo informan de cada etapa; los de /predict llevan job_id None.
+    Los que piden el modo exacto se puntúan aparte de los de la cascada.
+    """
+    BATCH_SIZE.observe(len(items), batch="predict")
+    results = [None] * len(items)
+    for exacto in {item[2] for item in items}:
+        positions = [i for i, item in enumerate(items) if item[2] == exacto]
+        job_ids = [items[i][1] for i in positions if items[i][1] is not None]
+
+        def progreso(etapa, job_ids=job_ids):
+            for job_id in job_ids:
+                jobs.update_threadsafe(job_id, etapa)
+
+        scored = score_texts([items[i][0] for i in positions], progreso if job_ids else None, exacto)
+        for i, result in zip(positions, scored):
+            results[i] = result
+    return results
+
+# Cola de micro-lotes para las predicciones
+PREDICT_MAX_BATCH = int(os.getenv("PREDICT_MAX_BATCH", "64"))
+PREDICT_MAX_WAIT_MS = float(os.getenv("PREDICT_MAX_WAIT_MS", "5"))
+predict_batcher = MicroBatcher(
+    score_batch,
+    max_batch_size=PREDICT_MAX_BATCH,
+    max_wait_ms=PREDICT_MAX_WAIT_MS,
+)
+
+@app.on_event("startup")
+async def start_predict_batcher():
+    if inference_pool is not None:
+        # Espera a que los workers carguen los modelos antes de aceptar peticiones
+        inference_pool.start()
+    else:
+        # Sin pool se puntúa en este proceso: los motores se compilan aquí y no en la primera petición
+        calentar_modelos()
+    await predict_batcher.start()
+
+@app.on_event("shutdown")
+async def stop_predict_batcher():
+    # Los trabajos pendientes esperan al batcher; se cancelan antes de pararlo
+    await jobs.stop()
+    await predict_batcher.stop()
+    if inference_pool is not None:
+        inference_pool.stop()
+
+class PredictRequest(BaseModel):
+    text: str
+    # False evalúa en cascada (más rápido, probabilidad parcial); por defecto, INFERENCE_EXACT
+    exact: bool = None
+
+class PredictResponse(BaseModel):
+    prediccion_suicidio: str
+    probabilidad_suicidio: float
+    emocion: str
+    miembros: List[str] = []  # Miembros del ensemble evaluados para este texto
+
+@app.post("/predict", response_model=PredictResponse)
+async def predict(data: PredictRequest):
+    """
+    Ejecuta el ensemble de modelos sobre un texto. Las peticiones concurrentes
+    se agrupan en lotes para vectorizar y evaluar cada modelo una sola vez.
+    """
+    return await predict_batcher.submit((data.text, None, data.exact))
+
+@app.get("/predict/cache")
+async def predict_cache_stats():
+    """Aciertos y fallos de la caché de predicciones."""
+    return prediction_cache.stats()
+
+PREDICT_BATCH_CHUNK = int(os.getenv("PREDICT_BATCH_CHUNK", "1000"))
+# Tamaño máximo del cuerpo de /predict/batch; por encima se responde 413
+PREDICT_BATCH_MAX_BYTES = int(os.getenv("PREDICT_BATCH_MAX_BYTES", str(16 * 2**20)))
+
+def _batch_text(item):
+    # Acepta strings sueltos u objetos con el campo "text"
+    if isinstance(item, dict):
+        item = item.get("text")
+    if not isinstance(item, str):
+        raise ValueError("Cada elemento debe ser un texto o un objeto con 'text'")
+    return item
+
+def _too_large():
+    return HTTPException(status_code=413, detail=f"El cuerpo supera {PREDICT_BATCH_MAX_BYTES} bytes")
+
+async def _read_batch_texts(request: Request, ndjson: bool) -> List[str]:
+    """
+    Lee el cuerpo por partes sin pasar de PREDICT_BATCH_MAX_BYTES. El NDJSON
+    se decodifica línea a línea según llega, sin guardar el cuerpo entero.
+    """
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > PREDICT_BATCH_MAX_BYTES:
+        raise _too_large()
+    received = 0
+    pending = bytearray()
+    texts = []
+    async for part in request.stream():
+        received += len(part)
+        if received > PREDICT_BATCH_MAX_BYTES:
+            raise _too_large()
+        pending += part
+        if ndjson:
+            *lines, rest = bytes(pending).split(b"\n")
+            pending = bytearray(rest)
+            texts.extend(_batch_text(json.loads(line)) for line in lines if line.strip())
+    if ndjson:
+        if pending.strip():
+            texts.append(_batch_text(json.loads(bytes(pending))))
+        return texts
+    items = json.loads(bytes(pending))
+    if not isinstance(items, list):
+        raise ValueError("Se esperaba un array JSON")
+    return [_batch_text(item) for item in items]
+
+@app.post("/predict/batch")
+async def predict_batch(request: Request, exact: bool = None):
+    """
+    Puntúa muchos textos de una vez. Acepta un array JSON o NDJSON
+    (Content-Type: application/x-ndjson) de hasta PREDICT_BATCH_MAX_BYTES
+    y procesa por bloques de PREDICT_BATCH_CHUNK textos. Con NDJSON la
+    respuesta también es NDJSON y se envía bloque a bloque. `?exact=false`
+    evalúa en cascada (ver /predict).
+    """
+    ndjson = "ndjson" in request.headers.get("content-type", "")
     try:
-        yield db
-    finally:
-        db.close()
+        texts = await _read_batch_texts(request, ndjson)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
 
-@app.post("/predecir")
-async def predecir(data: PredictionRequest, db: Session = Depends(get_db)):
-    # Guardar los datos en la base de datos
-    prediction = Prediction(
-        name=data.name,
-        age=data.age,
-        gender=data.gender,
-        sector=data.sector,
-        text=data.text,
-        result=data.result,
-        emotion=data.emotion,
-        suicide_probability=data.suicide_probability,
+    loop = asyncio.get_event_loop()
+
+    async def score_chunks():
+        for start in range(0, len(texts), PREDICT_BATCH_CHUNK):
+            chunk = texts[start:start + PREDICT_BATCH_CHUNK]
+            yield await loop.run_in_executor(None, score_texts, chunk, None, exact)
+
+    if ndjson:
+        async def stream():
+            async for results in score_chunks():
+                yield "".join(json.dumps(result, ensure_ascii=False) + "\n" for result in results)
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    results = []
+    async for chunk_results in score_chunks():
+        results.extend(chunk_results)
+    return results
+
+# Escritura por bloques de las predicciones recibidas en /predecir
+INGEST_MAX_BATCH = int(os.getenv("INGEST_MAX_BATCH", "500"))
+INGEST_MAX_WAIT_MS = float(os.getenv("INGEST_MAX_WAIT_MS", "50"))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "10000"))
+INGEST_DURABILITY = os.getenv("INGEST_DURABILITY", "group")  # "group" o "async"
+
+# Ventana en memoria (minutos) que sirve el dashboard en vivo sin tocar SQLite.
+# Es de cada proceso y solo ve lo que escribe ese proceso, así que solo se usa
+# con un único worker. uvicorn toma --workers por defecto de WEB_CONCURRENCY;
+# con más de uno, los dashboards leen de las tablas de agregados compartidas y
+# /sentiment_by_sector/stats y /dashboard/stream no están disponibles.
+LIVE_WINDOW_MINUTES = int(os.getenv("LIVE_WINDOW_MINUTES", "1440"))
+API_WORKERS = int(os.getenv("API_WORKERS") or os.getenv("WEB_CONCURRENCY") or "1")
+live_aggregates = SlidingWindowAggregator(LIVE_WINDOW_MINUTES, enabled=API_WORKERS == 1)
+
+def _require_live_aggregates():
+    if not live_aggregates.enabled:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Solo disponible con un único worker (API_WORKERS={API_WORKERS})",
+        )
+
+# Deltas del dashboard por SSE: una agregación por intervalo para todos los clientes
+LIVE_PUSH_INTERVAL = float(os.getenv("LIVE_PUSH_INTERVAL", "1"))  # segundos
+LIVE_CLIENT_MIN_INTERVAL = float(os.getenv("LIVE_CLIENT_MIN_INTERVAL", "1"))  # segundos entre envíos a un cliente
+dashboard_broadcaster = DashboardBroadcaster(
+    live_aggregates, interval=LIVE_PUSH_INTERVAL, client_interval=LIVE_CLIENT_MIN_INTERVAL
+)
+
+def insert_predictions(conn, rows):
+    conn.executemany(INSERT_PREDICTION, [_prediction_values(row) for row in rows])
+    update_rollups(conn, rows)
+
+def write_predictions(rows):
+    # Un solo executemany dentro de una transacción, junto con los agregados.
+    # Se ejecuta en el hilo escritor de `database`.
+    BATCH_SIZE.observe(len(rows), batch="write")
+    with STAGE_SECONDS.time(stage="db_write"):
+        database.in_transaction(lambda conn: insert_predictions(conn, rows))
+    live_aggregates.add_rows(rows)
+
+ROLLUP_COMPACT_INTERVAL = float(os.getenv("ROLLUP_COMPACT_INTERVAL", "3600"))  # segundos
+
+async def rollup_compactor():
+    # Borra periódicamente los buckets por minuto/hora que ya no se consultan
+    while True:
+        await asyncio.sleep(ROLLUP_COMPACT_INTERVAL)
+        try:
+            await database.write(compact_rollups)
+        except Exception as e:
+            warn(f"no se pudieron compactar los agregados: {e}", level="error", task="rollup_compactor")
+
+# Archivo en Parquet de las predicciones antiguas (0 días = no se archiva). Se
+# guardan al menos los días de la ventana en vivo, que se reconstruye desde la tabla.
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "./archive")
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", "3600"))  # segundos
+ARCHIVE_QUERY_TIMEOUT = float(os.getenv("ARCHIVE_QUERY_TIMEOUT", "60"))  # segundos
+try:
+    import pyarrow  # noqa: F401
+    prediction_archive = PredictionArchive(ARCHIVE_DIR)
+except ImportError:
+    warn("pyarrow no está instalado; no se archivarán las predicciones antiguas")
+    prediction_archive = None
+
+async def archive_old_predictions():
+    """Mueve al archivo, día a día, las predicciones más antiguas que ARCHIVE_AFTER_DAYS."""
+    loop = asyncio.get_event_loop()
+    older_than_days = max(ARCHIVE_AFTER_DAYS, LIVE_WINDOW_MINUTES // 1440 + 1)
+    moved = 0
+    for day in await database.read(archivable_days, older_than_days, timeout=ARCHIVE_QUERY_TIMEOUT):
+        rows = await database.read(read_day, day, timeout=ARCHIVE_QUERY_TIMEOUT)
+        if not rows:
+            continue
+        # Primero el archivo y después el borrado: si algo falla, el día se vuelve a archivar entero
+        await loop.run_in_executor(None, prediction_archive.write_day, day, rows)
+        await database.write(delete_day, day, rows[0][0], rows[-1][0])
+        moved += len(rows)
+    return moved
+
+async def prediction_archiver():
+    while True:
+        try:
+            moved = await archive_old_predictions()
+            if moved:
+                log_event("archive", rows=moved, archive=ARCHIVE_DIR)
+        except Exception as e:
+            warn(f"no se pudieron archivar las predicciones: {e}", level="error", task="prediction_archiver")
+        await asyncio.sleep(ARCHIVE_INTERVAL)
+
+prediction_writer = WriteBatcher(
+    write_predictions,
+    max_batch_size=INGEST_MAX_BATCH,
+    max_wait_ms=INGEST_MAX_WAIT_MS,
+    max_queue_size=INGEST_QUEUE_SIZE,
+    durability=INGEST_DURABILITY,
+    executor=database.write_executor,
+)
+
+@app.on_event("startup")
+async def start_prediction_writer():
+    database.open()
+    # La ventana en vivo se reconstruye antes de aceptar escrituras nuevas
+    await database.read(live_aggregates.load, timeout=max(DB_READ_TIMEOUT, 300))
+    await prediction_writer.start()
+    await dashboard_broadcaster.start()
+    app.state.rollup_compactor = asyncio.ensure_future(rollup_compactor())
+    app.state.prediction_archiver = (
+        asyncio.ensure_future(prediction_archiver()) if prediction_archive is not None and ARCHIVE_AFTER_DAYS > 0 else None
     )
-    db.add(prediction)
-    db.commit()
-    db.refresh(prediction)
+
+@app.on_event("shutdown")
+async def stop_prediction_writer():
+    app.state.rollup_compactor.cancel()
+    if app.state.prediction_archiver is not None:
+        app.state.prediction_archiver.cancel()
+    await dashboard_broadcaster.stop()
+    await prediction_writer.stop()
+    database.close()
+
+@app.post("/predecir")
+async def predecir(data: PredictionRequest):
+    # Guardar los datos en la base de datos (en bloque, fuera del event loop)
+    row = data.dict()
+    row["timestamp"] = datetime.utcnow()
+    row["minute_bucket"] = row["timestamp"].strftime(MINUTE_BUCKET_FORMAT)
+    try:
+        await prediction_writer.submit(row)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
     return {"message": "Data received", "data": data.dict()}
 
+@app.get("/users")
+async def list_users(limit: int = 50, cursor: str = None, sector: str = None, emotion: str = None,
+               min_age: int = None, max_age: int = None, min_probability: float = None, fields: str = None):
+    """
+    Predicciones guardadas, de la más reciente a la más antigua, una página
+    cada vez. `next_cursor` se pasa como `cursor` para pedir la siguiente;
+    `fields` ("id,name,...") limita las columnas devueltas.
+    """
+    try:
+        columns = parse_fields(fields)
+        users, next_cursor = await database.read(
+            query_users, columns, limit=limit, cursor=cursor, sector=sector, emotion=emotion,
+            min_age=min_age, max_age=max_age, min_probability=min_probability,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {"users": users, "next_cursor": next_cursor}
+
+async def run_job(job_id, data: PredictionRequest):
+    try:
+        # Se guarda en `predictions`: siempre con todos los miembros, nunca la
+        # media parcial de la cascada
+        resultado = await predict_batcher.submit((data.text, job_id, True))
+        row = {
+            **data.dict(),
+            "result": resultado["prediccion_suicidio"],
+            "emotion": resultado["emocion"],
+            "suicide_probability": resultado["probabilidad_suicidio"],
+        }
+        jobs.update(job_id, "scored", result=row)
+        row = {**row, "timestamp": datetime.utcnow()}
+        row["minute_bucket"] = row["timestamp"].strftime(MINUTE_BUCKET_FORMAT)
+        await prediction_writer.submit(row)
+        jobs.update(job_id, "stored")
+    except Exception as e:
+        warn(f"falló el trabajo {job_id}: {e}", level="error", job_id=job_id)
+        jobs.update(job_id, "failed", error=str(e))
+
+@app.post("/jobs")
+async def create_job(data: PredictionRequest):
+    """
+    Analiza y guarda un texto en segundo plano. Devuelve enseguida el id del
+    trabajo; el progreso se consulta en /jobs/{job_id} o /jobs/{job_id}/events.
+    """
+    try:
+        job_id = jobs.create()
+    except TooManyJobsError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    jobs.run(run_job(job_id, data))
+    return {"job_id": job_id, "status": "queued"}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return job
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-Sent Events con el estado del trabajo en cada cambio, hasta "stored" o "failed"."""
+    if jobs.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+
+    async def stream():
+        async for job in jobs.events(job_id):
+            yield f"event: job\ndata: {json.dumps(job, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+async def read_aggregates(query, raw_query, since, grain):
+    """
+    Agregados desde `since`. La parte más antigua que la retención del grano
+    (ya compactada en los agregados) se calcula con las filas en bruto de la
+    tabla y del archivo; el resto, de los agregados.
+    """
+    retention = RETENTION.get(grain)
+    limit = bucket_start(datetime.utcnow() - retention, grain) if retention else None
+    if limit is None or bucket_start(since, grain) >= limit:
+        return await database.read(query, since, grain)
+    limit = datetime.strptime(limit, GRAIN_FORMATS[grain])
+    older = await database.read(raw_query, prediction_archive, since, limit, grain, timeout=ARCHIVE_QUERY_TIMEOUT)
+    return older + await database.read(query, limit, grain)
+
 class EmotionData(BaseModel):
     emotion: str
     count: int
     time: datetime
 
 @app.get("/emotions_over_time", response_model=list[EmotionData])
-async def get_emotions_over_time(time_interval: int = 60, db: Session = Depends(get_db)):  # time_interval in minutes
+async def get_emotions_over_time(time_interval: int = 60, grain: str = None):  # time_interval in minutes
     """
     Retrieves emotion data aggregated over a specified time interval.
+    Las ventanas recientes se sirven desde memoria; el resto, de los agregados pre-calculados, con el grano más fino que mantiene
+    la ventana en un número acotado de buckets (o el indicado en `grain`).
     """
+    grain = grain or choose_grain(time_interval)
+    if grain not in GRAIN_FORMATS:
+        raise HTTPException(status_code=422, detail=f"grain debe ser uno de {list(GRAIN_FORMATS)}")
     time_threshold = datetime.utcnow() - timedelta(minutes=time_interval)
 
-    # Query to count emotions within the time interval
-    emotions_data = db.query(
-        Prediction.emotion,
-        func.count(Prediction.emotion),
-        func.strftime('%Y-%m-%d %H:%M:00', Prediction.timestamp)  # Truncate to minute
-    ).filter(Prediction.timestamp >= time_threshold).group_by(
-        Prediction.emotion,
-        func.strftime('%Y-%m-%d %H:%M', Prediction.timestamp)  # Group by minute
-    ).all()
+    if live_aggregates.covers(time_interval, grain):
+        emotions_data = live_aggregates.query_emotions(time_threshold, grain)
+    else:
+        emotions_data = await read_aggregates(query_emotions, query_raw_emotions, time_threshold, grain)
 
     # Format the results
     result = []
@@ -112,21 +514,20 @@ class SectorSentiment(BaseModel):
     time: datetime
 
 @app.get("/sentiment_by_sector", response_model=list[SectorSentiment])
-async def get_sentiment_by_sector(time_interval: int = 60, db: Session = Depends(get_db)):
+async def get_sentiment_by_sector(time_interval: int = 60, grain: str = None):
     """
     Retrieves the average sentiment (suicide probability) by sector over a specified time interval.
+    El promedio se calcula como suma / conteo de los agregados pre-calculados.
     """
+    grain = grain or choose_grain(time_interval)
+    if grain not in GRAIN_FORMATS:
+        raise HTTPException(status_code=422, detail=f"grain debe ser uno de {list(GRAIN_FORMATS)}")
     time_threshold = datetime.utcnow() - timedelta(minutes=time_interval)
 
-    # Query to calculate the average suicide probability by sector
-    sector_sentiment_data = db.query(
-        Prediction.sector,
-        func.avg(Prediction.suicide_probability),
-        func.strftime('%Y-%m-%d %H:%M:00', Prediction.timestamp)  # Truncate to minute
-    ).filter(Prediction.timestamp >= time_threshold).group_by(
-        Prediction.sector,
-        func.strftime('%Y-%m-%d %H:%M', Prediction.timestamp)  # Group by minute
-    ).all()
+    if live_aggregates.covers(time_interval, grain):
+        sector_sentiment_data = live_aggregates.query_sectors(time_threshold, grain)
+    else:
+        sector_sentiment_data = await read_aggregates(query_sectors, query_raw_sectors, time_threshold, grain)
 
     # Format the results
     result = []
@@ -137,4 +538,82 @@ async def get_sentiment_by_sector(time_interval: int = 60, db: Session = Depends
             "time": datetime.strptime(time, '%Y-%m-%d %H:%M:%S')
         })
 
-    return result
\ No newline at end of file
+    return result
+
+@app.get("/sentiment_by_sector/stats")
+async def get_sector_stats(time_interval: int = 60, grain: str = None):
+    """
+    Conteo, promedio y desviación típica de la probabilidad por sector,
+    calculados en memoria a partir de conteo, suma y suma de cuadrados.
+    """
+    _require_live_aggregates()
+    grain = grain or choose_grain(time_interval)
+    if not live_aggregates.covers(time_interval, grain):
+        raise HTTPException(
+            status_code=422,
+            detail=f"Solo disponible para ventanas de hasta {LIVE_WINDOW_MINUTES} minutos con grano minute u hour",
+        )
+    time_threshold = datetime.utcnow() - timedelta(minutes=time_interval)
+    return live_aggregates.sector_stats(time_threshold, grain)
+
+
+def _format_dashboard_delta(changes):
+    # Mismo formato que /emotions_over_time y /sentiment_by_sector
+    def iso(bucket):
+        return datetime.strptime(bucket, '%Y-%m-%d %H:%M:%S').isoformat()
+
+    return {
+        grain: {
+            "emotions": [
+                {"emotion": emotion, "count": count, "time": iso(time)}
+                for emotion, count, time in tables.get("emotions", [])
+            ],
+            "sectors": [
+                {"sector": sector, "average_suicide_probability": float(average), "time": iso(time)}
+                for sector, average, time in tables.get("sectors", [])
+            ],
+        }
+        for grain, tables in changes.items()
+    }
+
+@app.get("/dashboard/stream")
+async def dashboard_stream():
+    """
+    Server-Sent Events con los buckets del dashboard que cambian, por grano
+    (minute y hour). Cada evento `delta` trae el valor completo de cada bucket
+    modificado: el cliente sustituye el que tenga con la misma clave y hora.
+    """
+    _require_live_aggregates()
+    return StreamingResponse(
+        dashboard_broadcaster.stream(_format_dashboard_delta),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# Métricas que se leen en el momento del scrape
+REGISTRY.gauge(
+    "favfix_queue_depth", "Elementos esperando en cada cola.", ("queue",),
+    function=lambda: {"predict": predict_batcher.qsize(), "write": prediction_writer.qsize()},
+)
+
+def _cache_lookups():
+    stats = prediction_cache.stats()
+    return {"memory": stats["hits"] - stats["disk_hits"], "disk": stats["disk_hits"], "miss": stats["misses"]}
+
+REGISTRY.counter(
+    "favfix_prediction_cache_lookups_total", "Consultas a la caché de predicciones por resultado.", ("result",),
+    function=_cache_lookups,
+)
+REGISTRY.gauge(
+    "favfix_prediction_cache_hit_ratio", "Proporción de aciertos de la caché de predicciones.",
+    function=lambda: prediction_cache.stats()["hit_rate"],
+)
+REGISTRY.gauge(
+    "favfix_dashboard_subscribers", "Clientes suscritos a /dashboard/stream.",
+    function=lambda: len(dashboard_broadcaster.subscriptions),
+)
+
+@app.get("/metrics")
+async def metrics():
+    """Métricas en formato de texto de Prometheus."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,160 @@
+"""
+Tablas de agregados pre-calculados para el dashboard.
+
+Cada predicción suma en tres granos (minuto, hora y día) a dos tablas:
+conteos por emoción, y conteo y suma de `suicide_probability` por sector.
+Se actualizan en la misma transacción que inserta las predicciones, así que
+los endpoints responden leyendo solo los buckets de la ventana pedida, sin
+importar el tamaño de `predictions`.
+
+Todas las funciones trabajan sobre conexiones DB-API de sqlite3.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+GRAIN_FORMATS = {
+    "minute": "%Y-%m-%d %H:%M:00",
+    "hour": "%Y-%m-%d %H:00:00",
+    "day": "%Y-%m-%d 00:00:00",
+}
+GRAIN_MINUTES = {"minute": 1, "hour": 60, "day": 1440}
+
+# Máximo de buckets por serie: se usa el grano más fino que no lo supere
+MAX_BUCKETS = 180
+
+# Retención de los granos finos; el compactador borra lo más antiguo
+RETENTION = {"minute": timedelta(days=2), "hour": timedelta(days=90)}
+
+ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS emotion_rollups (
+    grain VARCHAR NOT NULL,
+    bucket VARCHAR NOT NULL,
+    emotion VARCHAR NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (grain, bucket, emotion)
+);
+CREATE TABLE IF NOT EXISTS sector_rollups (
+    grain VARCHAR NOT NULL,
+    bucket VARCHAR NOT NULL,
+    sector VARCHAR NOT NULL,
+    count INTEGER NOT NULL,
+    probability_count INTEGER NOT NULL,
+    probability_sum FLOAT NOT NULL,
+    PRIMARY KEY (grain, bucket, sector)
+);
+"""
+
+UPSERT_EMOTION = (
+    "INSERT INTO emotion_rollups (grain, bucket, emotion, count) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT (grain, bucket, emotion) DO UPDATE SET count = count + excluded.count"
+)
+UPSERT_SECTOR = (
+    "INSERT INTO sector_rollups (grain, bucket, sector, count, probability_count, probability_sum) "
+    "VALUES (?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT (grain, bucket, sector) DO UPDATE SET "
+    "count = count + excluded.count, "
+    "probability_count = probability_count + excluded.probability_count, "
+    "probability_sum = probability_sum + excluded.probability_sum"
+)
+
+
+def choose_grain(time_interval):
+    """Grano más fino con el que la ventana no supera MAX_BUCKETS buckets."""
+    for grain in ("minute", "hour"):
+        if time_interval / GRAIN_MINUTES[grain] <= MAX_BUCKETS:
+            return grain
+    return "day"
+
+
+def bucket_start(timestamp, grain):
+    return timestamp.strftime(GRAIN_FORMATS[grain])
+
+
+def ensure_rollups(conn):
+    """Crea las tablas si no existen y, si estaban vacías, las rellena desde `predictions`."""
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    conn.executescript(ROLLUP_SCHEMA)
+    if {"emotion_rollups", "sector_rollups"} <= existing or "predictions" not in existing:
+        return
+    rebuild_rollups(conn)
+
+
+def rebuild_rollups(conn):
+    """Recalcula todos los agregados a partir de las filas de `predictions`."""
+    conn.execute("DELETE FROM emotion_rollups")
+    conn.execute("DELETE FROM sector_rollups")
+    for grain, fmt in GRAIN_FORMATS.items():
+        conn.execute(
+            "INSERT INTO emotion_rollups (grain, bucket, emotion, count) "
+            "SELECT ?, strftime(?, timestamp) AS bucket, emotion, count(*) FROM predictions "
+            "WHERE emotion IS NOT NULL AND timestamp IS NOT NULL GROUP BY bucket, emotion",
+            (grain, fmt),
+        )
+        conn.execute(
+            "INSERT INTO sector_rollups (grain, bucket, sector, count, probability_count, probability_sum) "
+            "SELECT ?, strftime(?, timestamp) AS bucket, sector, count(*), "
+            "count(suicide_probability), coalesce(sum(suicide_probability), 0.0) FROM predictions "
+            "WHERE sector IS NOT NULL AND timestamp IS NOT NULL GROUP BY bucket, sector",
+            (grain, fmt),
+        )
+    conn.commit()
+
+
+def update_rollups(conn, rows):
+    """
+    Suma un bloque de predicciones (dicts con timestamp, emotion, sector y
+    suicide_probability) a los agregados. No hace commit: se llama dentro de
+    la transacción que inserta las filas.
+    """
+    emotions = defaultdict(int)
+    sectors = defaultdict(lambda: [0, 0, 0.0])
+    for row in rows:
+        timestamp = row.get("timestamp")
+        if timestamp is None:
+            continue
+        for grain in GRAIN_FORMATS:
+            bucket = bucket_start(timestamp, grain)
+            if row.get("emotion") is not None:
+                emotions[(grain, bucket, row["emotion"])] += 1
+            if row.get("sector") is not None:
+                totals = sectors[(grain, bucket, row["sector"])]
+                totals[0] += 1
+                if row.get("suicide_probability") is not None:
+                    totals[1] += 1
+                    totals[2] += row["suicide_probability"]
+    cursor = conn.cursor()
+    try:
+        if emotions:
+            cursor.executemany(UPSERT_EMOTION, [(*key, count) for key, count in emotions.items()])
+        if sectors:
+            cursor.executemany(UPSERT_SECTOR, [(*key, *totals) for key, totals in sectors.items()])
+    finally:
+        cursor.close()
+
+
+def compact_rollups(conn, now=None):
+    """Borra los buckets de grano fino más antiguos que su retención."""
+    now = now or datetime.utcnow()
+    for grain, retention in RETENTION.items():
+        limit = bucket_start(now - retention, grain)
+        conn.execute("DELETE FROM emotion_rollups WHERE grain = ? AND bucket < ?", (grain, limit))
+        conn.execute("DELETE FROM sector_rollups WHERE grain = ? AND bucket < ?", (grain, limit))
+    conn.commit()
+
+
+def query_emotions(conn, since, grain):
+    """[(emotion, count, bucket)] desde el bucket que contiene `since`."""
+    return conn.execute(
+        "SELECT emotion, count, bucket FROM emotion_rollups WHERE grain = ? AND bucket >= ? "
+        "ORDER BY bucket, emotion",
+        (grain, bucket_start(since, grain)),
+    ).fetchall()
+
+
+def query_sectors(conn, since, grain):
+    """[(sector, average_suicide_probability, bucket)] desde el bucket que contiene `since`."""
+    return conn.execute(
+        "SELECT sector, probability_sum / probability_count, bucket FROM sector_rollups "
+        "WHERE grain = ? AND bucket >= ? AND probability_count > 0 ORDER BY bucket, sector",
+        (grain, bucket_start(since, grain)),
+    ).fetchall()
@@ -0,0 +1,112 @@
+"""
+Perfil de SQLite y migraciones de la tabla `predictions`.
+
+    python -m api.storage migrate [ruta/a/test.db]
+
+aplica la migración a una base existente (por defecto ./test.db).
+"""
+import os
+import sqlite3
+import sys
+
+from api.rollups import ensure_rollups
+
+# Perfil de rendimiento; se puede ajustar por variables de entorno
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    # Valor negativo = tamaño en KiB (64 MiB)
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", str(-64 * 1024))),
+    "temp_store": "MEMORY",
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+}
+
+# Formato del bucket por minuto, igual al que devuelven los endpoints
+MINUTE_BUCKET_FORMAT = "%Y-%m-%d %H:%M:00"
+
+# Índices compuestos que cubren las consultas del dashboard
+INDEXES = {
+    "ix_predictions_timestamp_emotion": ("timestamp", "emotion", "minute_bucket"),
+    "ix_predictions_timestamp_sector": ("timestamp", "sector", "minute_bucket", "suicide_probability"),
+    # Paginación por (timestamp, id) del listado /users, sin filtros o filtrado por sector o emoción
+    "ix_predictions_timestamp_id": ("timestamp", "id"),
+    "ix_predictions_sector_timestamp_id": ("sector", "timestamp", "id"),
+    "ix_predictions_emotion_timestamp_id": ("emotion", "timestamp", "id"),
+}
+
+
+def apply_pragmas(dbapi_connection):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def configure_sqlite(engine):
+    """Aplica el perfil de PRAGMAs a cada conexión nueva del engine."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        apply_pragmas(dbapi_connection)
+
+    return engine
+
+
+def migrate_connection(conn):
+    """
+    Migra una conexión sqlite3: añade y rellena la columna `minute_bucket`,
+    crea los índices compuestos y las tablas de agregados. Es idempotente.
+    """
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if "predictions" not in tables:
+        return
+    _migrate_predictions(conn)
+    ensure_rollups(conn)
+
+
+def _migrate_predictions(conn):
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(predictions)")}
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    if "minute_bucket" in columns and indexes.issuperset(INDEXES):
+        return
+    if "minute_bucket" not in columns:
+        conn.execute("ALTER TABLE predictions ADD COLUMN minute_bucket VARCHAR")
+        conn.execute(
+            "UPDATE predictions SET minute_bucket = strftime(?, timestamp) WHERE timestamp IS NOT NULL",
+            (MINUTE_BUCKET_FORMAT,),
+        )
+    for name, index_columns in INDEXES.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON predictions ({', '.join(index_columns)})")
+    conn.execute("ANALYZE predictions")
+    conn.commit()
+
+
+def migrate(engine):
+    """Migra la base de datos de un engine de SQLAlchemy."""
+    raw = engine.raw_connection()
+    try:
+        migrate_connection(raw.connection if hasattr(raw, "connection") else raw)
+    finally:
+        raw.close()
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] != "migrate":
+        print("Uso: python -m api.storage migrate [ruta/a/test.db]")
+        return 2
+    path = argv[1] if len(argv) > 1 else "./test.db"
+    conn = sqlite3.connect(path)
+    try:
+        apply_pragmas(conn)
+        migrate_connection(conn)
+    finally:
+        conn.close()
+    print(f"Migración aplicada a {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,114 @@
+"""
+Cliente HTTP compartido del frontend para hablar con la API.
+
+Todas las peticiones de los estados de Reflex pasan por aquí:
+  - un único `httpx.AsyncClient` por proceso, con pool de conexiones y keep-alive;
+  - URL base configurable con API_URL;
+  - timeout por endpoint (ENDPOINT_TIMEOUTS);
+  - reintentos con backoff exponencial y jitter;
+  - las GET idénticas que coinciden en el tiempo comparten una sola petición.
+
+Las GET se reintentan ante errores de red y respuestas 502/503/504. El resto
+de métodos solo si la petición no llegó a enviarse (error de conexión) o si
+la API la rechazó con 503 sin procesarla (cola de escritura llena).
+"""
+import asyncio
+import os
+import random
+from contextlib import asynccontextmanager
+
+import httpx
+
+API_URL = os.getenv("API_URL", "http://localhost:8000")
+
+DEFAULT_TIMEOUT = float(os.getenv("API_TIMEOUT", "10"))
+# Segundos por endpoint; /predict puede esperar a que se forme un micro-lote
+ENDPOINT_TIMEOUTS = {
+    "/predict": 15.0,
+    "/predecir": 5.0,
+    "/jobs": 5.0,
+    "/users": 5.0,
+    "/emotions_over_time": 5.0,
+    "/sentiment_by_sector": 5.0,
+}
+
+MAX_RETRIES = int(os.getenv("API_MAX_RETRIES", "3"))
+RETRY_BASE_DELAY = float(os.getenv("API_RETRY_BASE_DELAY", "0.1"))  # segundos
+RETRY_MAX_DELAY = 2.0
+RETRY_STATUS = {502, 503, 504}
+
+_client = None
+_in_flight = {}
+
+
+def get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            base_url=API_URL,
+            timeout=httpx.Timeout(DEFAULT_TIMEOUT),
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        )
+    return _client
+
+
+async def close():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def timeout_for(path):
+    return httpx.Timeout(ENDPOINT_TIMEOUTS.get(path, DEFAULT_TIMEOUT))
+
+
+def _backoff(attempt):
+    # Full jitter: aleatorio entre 0 y el backoff exponencial
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+
+async def request(method, path, **kwargs) -> httpx.Response:
+    """Petición con timeout del endpoint y reintentos; lanza httpx.HTTPError si se agotan."""
+    kwargs.setdefault("timeout", timeout_for(path))
+    idempotent = method.upper() == "GET"
+    for attempt in range(MAX_RETRIES + 1):
+        last = attempt == MAX_RETRIES
+        try:
+            response = await get_client().request(method, path, **kwargs)
+        except (httpx.ConnectError, httpx.ConnectTimeout):
+            if last:
+                raise
+        except httpx.TransportError:
+            if last or not idempotent:
+                raise
+        else:
+            if response.status_code not in RETRY_STATUS or last:
+                return response
+            if not idempotent and response.status_code != 503:
+                return response
+        await asyncio.sleep(_backoff(attempt))
+
+
+async def get(path, params=None) -> httpx.Response:
+    """GET con coalescencia: si ya hay una idéntica en curso, se espera a esa."""
+    key = (path, tuple(sorted((params or {}).items())))
+    task = _in_flight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(request("GET", path, params=params))
+        _in_flight[key] = task
+        task.add_done_callback(lambda _: _in_flight.pop(key, None))
+    # shield: si un llamador se cancela, los demás siguen esperando la misma petición
+    return await asyncio.shield(task)
+
+
+async def post(path, json=None) -> httpx.Response:
+    return await request("POST", path, json=json)
+
+
+@asynccontextmanager
+async def stream(path, params=None):
+    """Respuesta en streaming sin timeout de lectura (Server-Sent Events)."""
+    timeout = httpx.Timeout(DEFAULT_TIMEOUT, read=None)
+    async with get_client().stream("GET", path, params=params, timeout=timeout) as response:
+        yield response
@@ -0,0 +1,82 @@
+"""
+Evaluación en cascada del ensemble con salida anticipada.
+
+Los miembros se evalúan del más barato al más caro y, después de cada uno,
+se retiran del lote las filas cuya decisión ya no puede cambiar:
+
+  - suicidio: con `k` de `M` probabilidades sumadas (suma S), la media final
+    está en [S / M, (S + M - k) / M]; si el intervalo queda entero a un lado
+    de `umbral`, la predicción ya es la misma que con todos los miembros;
+  - emoción: con `r` votos pendientes, la emoción en cabeza gana seguro si
+    ninguna otra puede alcanzarla (o empatar por delante de ella, ya que
+    argmax desempata por la primera).
+
+Las decisiones son siempre idénticas a las del modo exacto. Lo que cambia es
+`probabilidad_suicidio`: en las filas que salen antes es la media de los
+miembros evaluados, por eso cada resultado indica qué miembros se usaron.
+
+    python -m app.cascade
+
+compara ambos modos sobre un corpus sintético.
+"""
+import time
+
+import numpy as np
+
+
+def suicide_resolved(total, remaining, n_members, threshold):
+    """Filas cuya decisión media >= threshold ya no depende de los miembros que faltan."""
+    limit = threshold * n_members
+    return (total >= limit) | (total + remaining < limit)
+
+
+def vote_resolved(votes, remaining):
+    """Filas cuya emoción ganadora (argmax, primera en caso de empate) ya no puede cambiar."""
+    if remaining == 0:
+        return np.ones(len(votes), dtype=bool)
+    leader = votes.argmax(axis=1)
+    margin = votes[np.arange(len(votes)), leader][:, np.newaxis] - votes - remaining
+    columns = np.arange(votes.shape[1])[np.newaxis, :]
+    # Las emociones anteriores a la líder ganan los empates; las posteriores no
+    safe = np.where(columns < leader[:, np.newaxis], margin > 0, margin >= 0)
+    safe[np.arange(len(votes)), leader] = True
+    return safe.all(axis=1)
+
+
+def members_from_mask(mask, names):
+    return [name for bit, name in enumerate(names) if mask >> bit & 1]
+
+
+def main():
+    from .model_registry import SENTIMENT_MEMBERS, SUICIDE_MEMBERS
+    from .preprocessing import _synthetic_corpus
+    from .prueba import calentar_modelos, preprocessor, puntuar_textos_procesados, umbral
+
+    calentar_modelos()
+    documents = preprocessor.preprocess_batch(_synthetic_corpus(2000))
+    status = 0
+    for batch_size in (1, 64):
+        batches = [documents[i:i + batch_size] for i in range(0, 512 if batch_size == 1 else len(documents), batch_size)]
+        timings, results = {}, {}
+        for exact in (True, False):
+            start = time.perf_counter()
+            results[exact] = [puntuar_textos_procesados(batch, exacto=exact, con_miembros=True) for batch in batches]
+            timings[exact] = time.perf_counter() - start
+        exact_results, cascade_results = results[True], results[False]
+        same_decision = all(
+            np.array_equal(e[0] >= umbral, c[0] >= umbral) and np.array_equal(e[1], c[1])
+            for e, c in zip(exact_results, cascade_results)
+        )
+        masks = np.concatenate([c[2] for c in cascade_results])
+        n_members = np.array([bin(int(mask)).count("1") for mask in masks])
+        total = len(SUICIDE_MEMBERS) + len(SENTIMENT_MEMBERS)
+        print(f"lotes de {batch_size}: exacto {timings[True] * 1000:.0f}ms  cascada {timings[False] * 1000:.0f}ms  "
+              f"({timings[True] / timings[False]:.2f}x)  miembros por fila {n_members.mean():.2f}/{total}  "
+              f"decisiones iguales: {same_decision}")
+        if not same_decision:
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,493 @@
+"""
+Paquetes de modelos compactos.
+
+Escribe en otro directorio los mismos artefactos (mismos nombres de archivo y
+mismas clases de sklearn/xgboost, así que el resto del código no cambia) con:
+
+  - vocabulario podado: por tarea se quitan del TF-IDF los términos cuyo peso
+    es despreciable en todos los miembros, relativo al máximo de cada uno:
+    |coef| en la regresión logística, diferencia entre clases de las
+    log-probabilidades en Naive Bayes, importancia por impureza en el random
+    forest y ganancia total en XGBoost. Un término se conserva si supera
+    `min_weight` en algún miembro;
+  - árboles recortados: los nodos que dividen por un término podado se
+    sustituyen por el hijo que toma un documento sin ese término (valor 0.0
+    en sklearn, ausente en XGBoost), y el otro subárbol desaparece. Los
+    índices de los términos restantes se renumeran;
+  - pesos, log-probabilidades e idf en float32;
+  - sin los atributos que solo sirven para entrenar (conteos de Naive Bayes,
+    stop_words_ del vectorizador).
+
+Quitar términos cambia las puntuaciones de los documentos que los contienen.
+Sin `--min-weight`, el umbral de cada tarea se calibra: se prueba cada valor
+de CANDIDATE_WEIGHTS, de menor a mayor, y se usa el mayor con el que las
+decisiones del ensemble cambian en como mucho `--max-disagreement` de los
+documentos de calibración y, si se pasa un conjunto etiquetado de la tarea,
+la exactitud no baja más de `--max-accuracy-drop`. Los documentos de
+calibración se generan con términos del vocabulario, elegidos con la
+frecuencia que indica su idf, para que aparezcan todos los términos y no solo
+los del corpus sintético. El informe muestra la tabla de calibración y, para
+el paquete final, tamaños, tiempos de carga, acuerdo y exactitud.
+
+    python -m app.compress_models app/compact \\
+        --suicide-holdout Suicide_Detection.csv --sentiment-holdout emotions.csv
+
+El paquete se usa con MODEL_ARTIFACTS_DIR=app/compact.
+"""
+import argparse
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from .model_registry import ARTIFACTS, ARTIFACTS_DIR, SENTIMENT_MEMBERS, SUICIDE_MEMBERS, ModelRegistry
+from .tree_engine import _xgboost_json
+
+# Vectorizador y miembros de cada tarea
+TASKS = {
+    "suicide": ("tfidf_suicide", SUICIDE_MEMBERS),
+    "sentiment": ("tfidf_sentiment", SENTIMENT_MEMBERS),
+}
+# Atributos que no se usan para predecir
+TRAINING_ATTRIBUTES = ("feature_count_", "class_count_", "stop_words_")
+# Umbrales que se prueban al calibrar, de menor a mayor
+CANDIDATE_WEIGHTS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.3)
+# Raíz de un árbol de XGBoost en `parents`
+XGBOOST_NO_PARENT = 2147483647
+
+
+def _normalized(weights):
+    return weights / max(weights.max(), np.finfo(np.float64).tiny)
+
+
+def linear_importance(estimator):
+    """Peso de cada término en un miembro lineal, relativo al máximo del miembro; None si no es lineal."""
+    name = type(estimator).__name__
+    if name == "LogisticRegression":
+        weights = np.abs(estimator.coef_).max(axis=0)
+    elif name == "MultinomialNB":
+        # Solo la diferencia entre clases cambia la predicción
+        weights = np.ptp(estimator.feature_log_prob_, axis=0)
+    else:
+        return None
+    return _normalized(weights)
+
+
+def tree_importance(estimator, n_features):
+    """Importancia de cada término en un ensemble de árboles, relativa al máximo; None si no lo es."""
+    name = type(estimator).__name__
+    if name in ("RandomForestClassifier", "ExtraTreesClassifier"):
+        return _normalized(np.asarray(estimator.feature_importances_, dtype=np.float64))
+    if name == "XGBClassifier":
+        weights = np.zeros(n_features)
+        for feature, gain in estimator.get_booster().get_score(importance_type="total_gain").items():
+            weights[int(feature.lstrip("f"))] = gain
+        return _normalized(weights)
+    return None
+
+
+def member_terms(estimator, n_features, min_weight):
+    """Máscara de los términos que pesan al menos `min_weight` en un miembro."""
+    importance = linear_importance(estimator)
+    if importance is None:
+        importance = tree_importance(estimator, n_features)
+    if importance is None:
+        # Miembro desconocido: no se puede saber qué términos usa
+        return np.ones(n_features, dtype=bool)
+    return importance >= min_weight
+
+
+def select_terms(n_features, members, min_weight):
+    """Máscara de los términos que se conservan para una tarea: los que pesan en algún miembro."""
+    keep = np.zeros(n_features, dtype=bool)
+    for _, estimator in members:
+        keep |= member_terms(estimator, n_features, min_weight)
+    return keep
+
+
+def _collapse(left, right, bypass):
+    """
+    Reconstruye un árbol saltándose los nodos con `bypass[nodo] >= 0`, que es
+    el hijo al que va un documento sin el término del nodo. Devuelve los nodos
+    originales que quedan, en su orden nuevo (la raíz primero), y sus hijos
+    con la numeración nueva (-1 en las hojas).
+    """
+    def resolve(node):
+        while bypass[node] >= 0:
+            node = bypass[node]
+        return node
+
+    order, children = [resolve(0)], []
+    # `order` crece mientras se recorre: es un recorrido en anchura
+    for node in order:
+        if left[node] < 0:
+            children.append((-1, -1))
+            continue
+        children.append((len(order), len(order) + 1))
+        order.extend((resolve(left[node]), resolve(right[node])))
+    children = np.asarray(children, dtype=np.int64)
+    return np.asarray(order, dtype=np.int64), children[:, 0], children[:, 1]
+
+
+def _depth(left, right):
+    depth = np.zeros(len(left), dtype=np.int64)
+    for node in range(len(left)):
+        if left[node] >= 0:
+            depth[left[node]] = depth[right[node]] = depth[node] + 1
+    return int(depth.max())
+
+
+def _drop_training_attributes(obj):
+    for attr in TRAINING_ATTRIBUTES:
+        vars(obj).pop(attr, None)
+
+
+def prune_vectorizer(vectorizer, keep):
+    columns = np.cumsum(keep) - 1
+    vectorizer.vocabulary_ = {
+        term: int(columns[column]) for term, column in vectorizer.vocabulary_.items() if keep[column]
+    }
+    vectorizer._tfidf.idf_ = np.asarray(vectorizer._tfidf.idf_)[keep].astype(np.float32)
+    if hasattr(vectorizer._tfidf, "n_features_in_"):
+        vectorizer._tfidf.n_features_in_ = int(keep.sum())
+    _drop_training_attributes(vectorizer)
+
+
+def _prune_sklearn_tree(tree, keep, used, columns):
+    """Árbol de sklearn sin los nodos de términos fuera de `used` (un término ausente vale 0.0)."""
+    from sklearn.tree._tree import Tree
+
+    state = tree.__getstate__()
+    nodes = state["nodes"]
+    internal = nodes["left_child"] >= 0
+    dropped = internal & ~used[np.where(internal, nodes["feature"], 0)]
+    absent_goes_left = 0.0 <= nodes["threshold"]
+    bypass = np.where(dropped, np.where(absent_goes_left, nodes["left_child"], nodes["right_child"]), -1)
+    order, left, right = _collapse(nodes["left_child"], nodes["right_child"], bypass)
+    nodes = nodes[order]
+    internal = left >= 0
+    nodes["left_child"] = left
+    nodes["right_child"] = right
+    nodes["feature"][internal] = columns[nodes["feature"][internal]]
+    state.update(nodes=nodes, values=state["values"][order], node_count=len(order), max_depth=_depth(left, right))
+    pruned = Tree(int(keep.sum()), np.asarray(tree.n_classes, dtype=np.intp), tree.n_outputs)
+    pruned.__setstate__(state)
+    return pruned
+
+
+def _prune_xgboost_tree(tree, used, columns):
+    """Árbol del JSON de XGBoost sin los nodos de términos fuera de `used` (un término ausente es un valor faltante)."""
+    if tree.get("categories_nodes"):
+        raise TypeError("Árboles con divisiones categóricas no soportados")
+    left = np.asarray(tree["left_children"], dtype=np.int64)
+    right = np.asarray(tree["right_children"], dtype=np.int64)
+    features = np.asarray(tree["split_indices"], dtype=np.int64)
+    default_left = np.asarray(tree["default_left"], dtype=bool)
+    internal = left >= 0
+    dropped = internal & ~used[np.where(internal, features, 0)]
+    bypass = np.where(dropped, np.where(default_left, left, right), -1)
+    order, new_left, new_right = _collapse(left, right, bypass)
+    for field in ("base_weights", "default_left", "loss_changes", "split_conditions", "split_type", "sum_hessian"):
+        tree[field] = np.asarray(tree[field])[order].tolist()
+    features = features[order]
+    internal = new_left >= 0
+    features[internal] = columns[features[internal]]
+    parents = np.full(len(order), XGBOOST_NO_PARENT, dtype=np.int64)
+    parents[new_left[internal]] = parents[new_right[internal]] = np.flatnonzero(internal)
+    tree.update(
+        left_children=new_left.tolist(), right_children=new_right.tolist(), parents=parents.tolist(),
+        split_indices=features.tolist(),
+    )
+    tree["tree_param"]["num_nodes"] = str(len(order))
+    tree["tree_param"]["num_deleted"] = "0"
+
+
+def prune_member(estimator, keep, used=None):
+    """
+    Quita las columnas podadas de un miembro, en el mismo objeto. En los
+    árboles se recortan además los nodos de términos fuera de `used` (los que
+    pesan en ese miembro; por defecto, `keep`), que debe estar contenido en
+    `keep`.
+    """
+    used = keep if used is None else used
+    name = type(estimator).__name__
+    columns = np.cumsum(keep) - 1
+    n_kept = int(keep.sum())
+    if name == "LogisticRegression":
+        estimator.coef_ = np.ascontiguousarray(estimator.coef_[:, keep], dtype=np.float32)
+    elif name == "MultinomialNB":
+        estimator.feature_log_prob_ = np.ascontiguousarray(estimator.feature_log_prob_[:, keep], dtype=np.float32)
+        _drop_training_attributes(estimator)
+    elif name in ("RandomForestClassifier", "ExtraTreesClassifier"):
+        for tree_estimator in estimator.estimators_:
+            tree_estimator.tree_ = _prune_sklearn_tree(tree_estimator.tree_, keep, used, columns)
+            tree_estimator.n_features_in_ = n_kept
+    elif name == "XGBClassifier":
+        booster = estimator.get_booster()
+        model = _xgboost_json(booster)
+        learner = model["learner"]
+        learner["learner_model_param"]["num_feature"] = str(n_kept)
+        for tree in learner["gradient_booster"]["model"]["trees"]:
+            _prune_xgboost_tree(tree, used, columns)
+            tree["tree_param"]["num_feature"] = str(n_kept)
+        booster.load_model(bytearray(json.dumps(model).encode("utf-8")))
+    else:
+        raise TypeError(f"Estimador no soportado: {name}")
+    if name != "XGBClassifier":
+        estimator.n_features_in_ = n_kept
+
+
+def compress(source_dir, output_dir, min_weight):
+    """
+    Escribe el paquete compacto en `output_dir`. `min_weight` es un umbral o
+    {tarea: umbral}. Devuelve {tarea: (términos conservados, total)}.
+    """
+    if os.path.abspath(source_dir) == os.path.abspath(output_dir):
+        raise ValueError("El directorio de salida no puede ser el de los artefactos originales")
+    if not isinstance(min_weight, dict):
+        min_weight = dict.fromkeys(TASKS, min_weight)
+    registry = ModelRegistry(source_dir, use_mmap=False)
+    os.makedirs(output_dir, exist_ok=True)
+    vocabulary = {}
+    for task, (vectorizer_name, member_names) in TASKS.items():
+        vectorizer = registry.get(vectorizer_name)
+        members = registry.members(member_names)
+        n_features = len(vectorizer.vocabulary_)
+        keep = select_terms(n_features, members, min_weight[task])
+        prune_vectorizer(vectorizer, keep)
+        for _, estimator in members:
+            prune_member(estimator, keep, member_terms(estimator, n_features, min_weight[task]))
+        vocabulary[task] = (int(keep.sum()), len(keep))
+    for name in ARTIFACTS:
+        if not registry.available(name):
+            continue
+        target = os.path.join(output_dir, ARTIFACTS[name])
+        temporary = f"{target}.tmp-{os.getpid()}"
+        with open(temporary, "wb") as f:
+            pickle.dump(registry.get(name), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, target)
+    return vocabulary
+
+
+def score(registry, documents):
+    """
+    Salidas de cada miembro y del ensemble, como en `app.prueba` en modo exacto:
+    {"suicide": {nombre: probabilidad de suicidio}, "sentiment": {nombre: emoción}}.
+    """
+    from .features import FusedTfidfFeaturizer
+
+    X_sentiment, X_suicide = FusedTfidfFeaturizer(
+        registry.get("tfidf_sentiment"), registry.get("tfidf_suicide"),
+    ).transform(documents)
+    suicide = {name: model.predict_proba(X_suicide)[:, 1] for name, model in registry.members(SUICIDE_MEMBERS)}
+    suicide["ensemble"] = np.mean(list(suicide.values()), axis=0)
+    sentiment = {
+        name: np.asarray(model.predict(X_sentiment)).astype(np.intp)
+        for name, model in registry.members(SENTIMENT_MEMBERS)
+    }
+    votes = np.zeros((len(documents), max(labels.max() for labels in sentiment.values()) + 1), dtype=np.int64)
+    for labels in sentiment.values():
+        votes[np.arange(len(documents)), labels] += 1
+    sentiment["ensemble"] = votes.argmax(axis=1)
+    return {"suicide": suicide, "sentiment": sentiment}
+
+
+def decisions(task, outputs, threshold=0.5):
+    return outputs >= threshold if task == "suicide" else outputs
+
+
+def task_size(artifacts_dir, task):
+    """Bytes en disco del vectorizador y los miembros de una tarea."""
+    vectorizer_name, member_names = TASKS[task]
+    paths = (os.path.join(artifacts_dir, ARTIFACTS[name]) for name in (vectorizer_name, *member_names))
+    return sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+
+
+def calibration_documents(registry, n_documents=2000, min_terms=5, max_terms=60, seed=0):
+    """
+    Documentos ya preprocesados formados por términos del vocabulario de las
+    dos tareas. Cada término sale con probabilidad proporcional a su
+    frecuencia de documento, que se deduce del idf (exp(-idf)).
+    """
+    rng = np.random.default_rng(seed)
+    pools = []
+    for vectorizer_name, _ in TASKS.values():
+        vectorizer = registry.get(vectorizer_name)
+        terms = np.empty(len(vectorizer.vocabulary_), dtype=object)
+        for term, column in vectorizer.vocabulary_.items():
+            terms[column] = term
+        frequency = np.exp(-np.asarray(vectorizer._tfidf.idf_, dtype=np.float64))
+        pools.append((terms, frequency / frequency.sum()))
+    documents = []
+    for i in range(n_documents):
+        terms, probability = pools[i % len(pools)]
+        size = rng.integers(min_terms, max_terms + 1)
+        documents.append(" ".join(rng.choice(terms, size=size, p=probability)))
+    return documents
+
+
+def _holdout_accuracy(task, outputs, labels):
+    return {name: float((decisions(task, values) == labels).mean()) for name, values in outputs.items()}
+
+
+def calibrate(source_dir, documents, holdouts=None, weights=CANDIDATE_WEIGHTS,
+              max_disagreement=0.01, max_accuracy_drop=0.005):
+    """
+    Elige el umbral de cada tarea. `documents` son los documentos de
+    calibración y `holdouts` {tarea: (documentos, etiquetas)}. Para cada
+    tarea se recorren `weights` de menor a mayor y se para en el primero que
+    se sale del presupuesto, así que el elegido y todos los menores lo
+    cumplen (0.0, sin podar términos, si ninguno lo cumple).
+
+    Devuelve ({tarea: umbral}, filas del informe), con una fila por tarea y
+    umbral: (tarea, umbral, términos, total, bytes, desacuerdo, variación de
+    exactitud o None, dentro del presupuesto).
+    """
+    holdouts = holdouts or {}
+    original_registry = ModelRegistry(source_dir, use_mmap=False)
+    original = score(original_registry, documents)
+    original_holdout = {
+        task: _holdout_accuracy(task, score(original_registry, texts)[task], labels)["ensemble"]
+        for task, (texts, labels) in holdouts.items()
+    }
+    chosen = dict.fromkeys(TASKS, 0.0)
+    open_tasks = set(TASKS)
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for weight in weights:
+            if not open_tasks:
+                break
+            candidate_dir = os.path.join(tmp, f"{weight:g}")
+            vocabulary = compress(source_dir, candidate_dir, weight)
+            registry = ModelRegistry(candidate_dir, use_mmap=False)
+            outputs = score(registry, documents)
+            for task in sorted(open_tasks):
+                disagreement = float((
+                    decisions(task, original[task]["ensemble"]) != decisions(task, outputs[task]["ensemble"])
+                ).mean())
+                accuracy_delta = None
+                if task in holdouts:
+                    texts, labels = holdouts[task]
+                    accuracy = _holdout_accuracy(task, score(registry, texts)[task], labels)["ensemble"]
+                    accuracy_delta = accuracy - original_holdout[task]
+                within = disagreement <= max_disagreement and (
+                    accuracy_delta is None or accuracy_delta >= -max_accuracy_drop
+                )
+                rows.append((task, weight, *vocabulary[task], task_size(candidate_dir, task),
+                             disagreement, accuracy_delta, within))
+                if within:
+                    chosen[task] = weight
+                else:
+                    open_tasks.discard(task)
+            shutil.rmtree(candidate_dir, ignore_errors=True)
+    return chosen, rows
+
+
+def _load_seconds(artifacts_dir):
+    registry = ModelRegistry(artifacts_dir, use_mmap=False)
+    start = time.perf_counter()
+    registry.load_all()
+    return time.perf_counter() - start
+
+
+def _read_holdout(path, text_column, label_column, limit):
+    import pandas as pd
+
+    data = pd.read_csv(path, usecols=[text_column, label_column], nrows=limit).dropna()
+    return data[text_column].astype(str).tolist(), data[label_column].tolist()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera un paquete de modelos compacto y lo compara con los originales.")
+    parser.add_argument("output", nargs="?", default=os.path.join(ARTIFACTS_DIR, "compact"))
+    parser.add_argument("--source", default=ARTIFACTS_DIR, help="Directorio de los artefactos originales")
+    parser.add_argument("--min-weight", type=float,
+                        help="Umbral fijo para todas las tareas (por defecto se calibra cada una)")
+    parser.add_argument("--max-disagreement", type=float, default=0.01,
+                        help="Fracción máxima de decisiones del ensemble que puede cambiar al calibrar")
+    parser.add_argument("--max-accuracy-drop", type=float, default=0.005,
+                        help="Pérdida máxima de exactitud del ensemble en los conjuntos etiquetados al calibrar")
+    parser.add_argument("--calibration-texts", type=int, default=2000,
+                        help="Documentos generados con el vocabulario para calibrar y medir el acuerdo")
+    parser.add_argument("--texts", type=int, default=2000, help="Textos sintéticos para medir el acuerdo")
+    parser.add_argument("--suicide-holdout", help="CSV etiquetado (columnas text y class, como Suicide_Detection.csv)")
+    parser.add_argument("--sentiment-holdout", help="CSV etiquetado (columnas text y label, como emotions.csv)")
+    parser.add_argument("--text-column", default="text")
+    parser.add_argument("--limit", type=int, default=20000, help="Filas leídas de cada CSV etiquetado")
+    args = parser.parse_args(argv)
+
+    from .preprocessing import _synthetic_corpus
+    from .prueba import preprocessor
+
+    holdout_files = {
+        "suicide": (args.suicide_holdout, "class", lambda label: label == "suicide"),
+        "sentiment": (args.sentiment_holdout, "label", int),
+    }
+    holdouts = {}
+    for task, (path, label_column, encode) in holdout_files.items():
+        if path:
+            texts, labels = _read_holdout(path, args.text_column, label_column, args.limit)
+            holdouts[task] = (preprocessor.preprocess_batch(texts), np.asarray([encode(label) for label in labels]))
+
+    source_registry = ModelRegistry(args.source, use_mmap=False)
+    calibration = calibration_documents(source_registry, args.calibration_texts)
+    if args.min_weight is None:
+        min_weight, rows = calibrate(args.source, calibration, holdouts,
+                                     max_disagreement=args.max_disagreement,
+                                     max_accuracy_drop=args.max_accuracy_drop)
+        print(f"calibración ({len(calibration)} documentos del vocabulario; presupuesto: "
+              f"{args.max_disagreement:.2%} de decisiones distintas, {args.max_accuracy_drop:.2%} de exactitud):")
+        print(f"    {'tarea':<11}{'umbral':>8}{'términos':>14}{'tamaño':>10}{'desacuerdo':>12}{'exactitud':>11}")
+        for task, weight, kept, total, size, disagreement, accuracy_delta, within in rows:
+            accuracy = f"{accuracy_delta:+.2%}" if accuracy_delta is not None else "-"
+            print(f"    {task:<11}{weight:>8g}{kept:>7}/{total:<6}{size / 1024:>8.0f}KB"
+                  f"{disagreement:>12.2%}{accuracy:>11}{'' if within else '  fuera del presupuesto'}")
+        print("umbral elegido: " + "  ".join(f"{task} {weight:g}" for task, weight in min_weight.items()))
+    else:
+        min_weight = dict.fromkeys(TASKS, args.min_weight)
+
+    vocabulary = compress(args.source, args.output, min_weight)
+    for task, (kept, total) in vocabulary.items():
+        print(f"vocabulario {task}: {kept}/{total} términos ({kept / total:.1%}) con umbral {min_weight[task]:g}")
+
+    print(f"{'artefacto':<52}{'original':>11}{'compacto':>11}")
+    totals = [0, 0]
+    for filename in ARTIFACTS.values():
+        sizes = [os.path.getsize(os.path.join(d, filename)) if os.path.exists(os.path.join(d, filename)) else 0
+                 for d in (args.source, args.output)]
+        if sizes[0]:
+            totals = [t + s for t, s in zip(totals, sizes)]
+            print(f"{filename:<52}{sizes[0] / 1024:>9.0f}KB{sizes[1] / 1024:>9.0f}KB")
+    print(f"{'total':<52}{totals[0] / 1024:>9.0f}KB{totals[1] / 1024:>9.0f}KB ({totals[1] / totals[0]:.1%})")
+    print(f"carga: original {_load_seconds(args.source) * 1000:.0f}ms  compacto {_load_seconds(args.output) * 1000:.0f}ms")
+
+    registries = [ModelRegistry(d, use_mmap=False) for d in (args.source, args.output)]
+    corpora = {
+        "documentos del vocabulario": calibration,
+        "textos sintéticos": preprocessor.preprocess_batch(_synthetic_corpus(args.texts)),
+    }
+    for label, documents in corpora.items():
+        original, compact = (score(registry, documents) for registry in registries)
+        print(f"acuerdo con los originales ({len(documents)} {label}):")
+        for task, outputs in original.items():
+            for name, expected in outputs.items():
+                same = (decisions(task, expected) == decisions(task, compact[task][name])).mean()
+                detail = f"  error máximo de probabilidad {np.abs(expected - compact[task][name]).max():.2e}" \
+                    if task == "suicide" else ""
+                print(f"    {name:<20}{same:>9.2%}{detail}")
+
+    for task, (documents, expected) in holdouts.items():
+        original, compact = (_holdout_accuracy(task, score(registry, documents)[task], expected) for registry in registries)
+        print(f"exactitud {task} ({len(documents)} textos de {holdout_files[task][0]}):")
+        for name in original:
+            print(f"    {name:<20}original {original[name]:.4f}  compacto {compact[name]:.4f}  "
+                  f"diferencia {compact[name] - original[name]:+.4f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
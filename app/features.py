@@ -0,0 +1,134 @@
+"""
+Vectorización TF-IDF fusionada.
+
+Los modelos de sentimientos y de depresión usan cada uno su propio
+`TfidfVectorizer`, pero ambos tokenizan el mismo texto preprocesado de la
+misma forma. `FusedTfidfFeaturizer` tokeniza cada documento una sola vez,
+busca cada token en un índice que une los vocabularios y construye a la vez
+las matrices de conteos de todos los vectorizadores. La ponderación idf y la
+normalización se delegan en el `TfidfTransformer` de cada vectorizador, por lo
+que el resultado es idéntico al de `transform`.
+
+    python -m app.features
+
+comprueba la igualdad con los vectorizadores del repositorio.
+"""
+import numpy as np
+import scipy.sparse as sp
+
+# Parámetros que determinan cómo se tokeniza un documento
+ANALYZER_PARAMS = (
+    "input",
+    "encoding",
+    "decode_error",
+    "strip_accents",
+    "lowercase",
+    "preprocessor",
+    "tokenizer",
+    "stop_words",
+    "token_pattern",
+    "ngram_range",
+    "analyzer",
+)
+
+
+def _same_analyzer(vectorizers):
+    params = [vectorizer.get_params() for vectorizer in vectorizers]
+    return all(
+        p.get(name) == params[0].get(name)
+        for p in params[1:]
+        for name in ANALYZER_PARAMS
+    )
+
+
+class FusedTfidfFeaturizer:
+    """Transforma documentos con varios `TfidfVectorizer` ajustados en una sola pasada."""
+
+    def __init__(self, *vectorizers):
+        self.vectorizers = vectorizers
+        self.fused = _same_analyzer(vectorizers)
+        self._analyze = vectorizers[0].build_analyzer()
+
+        # término -> columna en cada vectorizador (-1 si no está en su vocabulario)
+        index = {}
+        for k, vectorizer in enumerate(vectorizers):
+            for term, column in vectorizer.vocabulary_.items():
+                index.setdefault(term, [-1] * len(vectorizers))[k] = column
+        self._index = {term: tuple(columns) for term, columns in index.items()}
+
+    def transform(self, documents):
+        """Devuelve una matriz TF-IDF por vectorizador, en el mismo orden."""
+        if not self.fused:
+            return [vectorizer.transform(documents) for vectorizer in self.vectorizers]
+
+        n_vectorizers = len(self.vectorizers)
+        analyze = self._analyze
+        index = self._index
+        j_indices = [[] for _ in range(n_vectorizers)]
+        values = [[] for _ in range(n_vectorizers)]
+        indptr = [[0] for _ in range(n_vectorizers)]
+        n_documents = 0
+
+        for document in documents:
+            counts = {}
+            for token in analyze(document):
+                if token in index:
+                    counts[token] = counts.get(token, 0) + 1
+            for token, count in counts.items():
+                for k, column in enumerate(index[token]):
+                    if column >= 0:
+                        j_indices[k].append(column)
+                        values[k].append(count)
+            for k in range(n_vectorizers):
+                indptr[k].append(len(j_indices[k]))
+            n_documents += 1
+
+        matrices = []
+        for k, vectorizer in enumerate(self.vectorizers):
+            index_dtype = np.int32 if indptr[k][-1] < np.iinfo(np.int32).max else np.int64
+            X = sp.csr_matrix(
+                (
+                    np.asarray(values[k], dtype=vectorizer.dtype),
+                    np.asarray(j_indices[k], dtype=index_dtype),
+                    np.asarray(indptr[k], dtype=index_dtype),
+                ),
+                shape=(n_documents, len(vectorizer.vocabulary_)),
+                dtype=vectorizer.dtype,
+            )
+            X.sort_indices()
+            if vectorizer.binary:
+                X.data.fill(1)
+            matrices.append(vectorizer._tfidf.transform(X, copy=False))
+        return matrices
+
+
+def main():
+    import time
+
+    from .preprocessing import _synthetic_corpus
+    from .prueba import preprocessor, registry
+
+    documents = preprocessor.preprocess_batch(_synthetic_corpus(2000))
+    vectorizers = [registry.get("tfidf_sentiment"), registry.get("tfidf_suicide")]
+    featurizer = FusedTfidfFeaturizer(*vectorizers)
+
+    start = time.perf_counter()
+    expected = [vectorizer.transform(documents) for vectorizer in vectorizers]
+    separate_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = featurizer.transform(documents)
+    fused_time = time.perf_counter() - start
+
+    print(f"Fusionado: {featurizer.fused}")
+    print(f"Por separado: {separate_time:.3f}s  Fusionado: {fused_time:.3f}s")
+    for a, b in zip(expected, actual):
+        if a.shape != b.shape or (a != b).nnz:
+            print("ERROR: las matrices difieren")
+            return 1
+    print("Paridad OK: matrices idénticas")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
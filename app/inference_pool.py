@@ -0,0 +1,317 @@
+"""
+Pool de procesos para puntuar textos fuera del GIL del proceso principal.
+
+Los workers se crean desde un servidor de fork (`forkserver`): un proceso de
+un solo hilo que ya importó el módulo de `score_texts`. Hacer fork del
+proceso de la API, que tiene hilos (event loop, escritor, pools de lectura),
+podría copiar un lock tomado por otro hilo y bloquear al worker para siempre.
+Cada worker ejecuta `warmup` al arrancar y carga sus propios modelos; los
+arrays grandes (coeficientes, idf) se cargan con mmap desde `mmap_cache`, así
+que siguen compartiendo páginas, pero los árboles van en la memoria de cada
+worker. Cada lote se reparte en fragmentos, uno por worker. Los textos viajan
+en un bloque de memoria compartida (offsets + UTF-8) y los resultados vuelven
+en el mismo bloque; por la tubería solo pasan el nombre del bloque y, de
+vuelta, los tiempos por etapa y por miembro que midió el worker, que se
+observan en las métricas del padre. Si un worker muere, se vuelve a crear y
+su fragmento se reintenta una vez; si no responde en `timeout` segundos, se
+mata, se crea otro y el fragmento falla. Si `version` cambia (otros
+artefactos en disco), se crea una generación nueva de workers
+y los anteriores se retiran cuando terminan su fragmento.
+
+    python -m app.inference_pool --workers 4
+
+compara los resultados con la ejecución en proceso y mide el rendimiento.
+"""
+import argparse
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .metrics import collect, replay, warn
+
+# Fragmento mínimo por worker: por debajo no compensa repartir
+MIN_SHARD_SIZE = 8
+
+
+def _layout(n_texts):
+    """Desplazamientos (probabilidades, emociones, máscaras, offsets, texto) dentro del bloque."""
+    probabilities = 0
+    emotions = probabilities + 8 * n_texts
+    masks = emotions + 8 * n_texts
+    offsets = masks + 8 * n_texts
+    text = offsets + 8 * (n_texts + 1)
+    return probabilities, emotions, masks, offsets, text
+
+
+def _pack(texts):
+    encoded = [text.encode("utf-8") for text in texts]
+    _, _, _, offsets_at, text_at = _layout(len(texts))
+    offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+    np.cumsum([len(item) for item in encoded], out=offsets[1:])
+    block = shared_memory.SharedMemory(create=True, size=max(text_at + int(offsets[-1]), 1))
+    block.buf[offsets_at:text_at] = offsets.tobytes()
+    block.buf[text_at:text_at + int(offsets[-1])] = b"".join(encoded)
+    return block
+
+
+def _unpack_texts(block, n_texts):
+    _, _, _, offsets_at, text_at = _layout(n_texts)
+    offsets = np.frombuffer(block.buf, dtype=np.int64, count=n_texts + 1, offset=offsets_at)
+    data = bytes(block.buf[text_at:text_at + int(offsets[-1])])
+    return [data[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(n_texts)]
+
+
+def _worker_main(score_texts, warmup, conn):
+    # El padre crea y libera los bloques; el worker solo se adjunta. Con
+    # forkserver el resource tracker es el del padre, que lo desregistra al
+    # liberarlo.
+    if warmup is not None:
+        warmup()
+    conn.send("ready")
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+        name, n_texts, args = message
+        block = shared_memory.SharedMemory(name=name)
+        try:
+            with collect() as observations:
+                probabilities, emotions, masks = score_texts(_unpack_texts(block, n_texts), *args)
+            probabilities_at, emotions_at, masks_at, _, _ = _layout(n_texts)
+            np.frombuffer(block.buf, dtype=np.float64, count=n_texts, offset=probabilities_at)[:] = probabilities
+            np.frombuffer(block.buf, dtype=np.int64, count=n_texts, offset=emotions_at)[:] = emotions
+            np.frombuffer(block.buf, dtype=np.int64, count=n_texts, offset=masks_at)[:] = masks
+            conn.send((None, observations))
+        except Exception as e:
+            conn.send((f"{type(e).__name__}: {e}", []))
+        finally:
+            block.close()
+
+
+class _Worker:
+    def __init__(self, context, score_texts, warmup, generation):
+        self.generation = generation
+        self.ready = False
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(score_texts, warmup, child_conn), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def wait_ready(self, timeout):
+        """Espera a que termine `warmup`; EOFError si el worker murió, TimeoutError si no acaba."""
+        if not self.ready:
+            self._receive(timeout)
+            self.ready = True
+
+    def run(self, name, n_texts, args, timeout, startup_timeout):
+        """
+        Devuelve (mensaje de error o None, observaciones de métricas); EOFError
+        si el worker murió y TimeoutError si no respondió a tiempo.
+        """
+        self.wait_ready(startup_timeout)
+        self.conn.send((name, n_texts, args))
+        return self._receive(timeout)
+
+    def _receive(self, timeout):
+        if not self.conn.poll(timeout):
+            raise TimeoutError(f"el worker de inferencia {self.process.pid} no respondió en {timeout:.0f}s")
+        return self.conn.recv()
+
+    def stop(self, timeout=5.0):
+        try:
+            self.conn.send(None)
+        except (OSError, BrokenPipeError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class InferencePool:
+    """
+    `score_texts(textos, *args) -> (probabilidades, índices de emoción,
+    máscaras de miembros)` ejecutado en
+    `n_workers` procesos. `warmup` se llama en cada worker al arrancar, antes
+    de aceptar lotes; `version`, si se indica, devuelve la versión de los
+    modelos en disco. `timeout` es el máximo de segundos por fragmento y
+    `startup_timeout` el de `warmup`.
+    """
+
+    def __init__(self, score_texts, n_workers, warmup=None, version=None, timeout=60.0, startup_timeout=600.0):
+        self.score_texts = score_texts
+        self.n_workers = n_workers
+        self.warmup = warmup
+        self.version = version
+        self.timeout = timeout
+        self.startup_timeout = startup_timeout
+        self._context = multiprocessing.get_context("forkserver")
+        # El servidor de fork importa el módulo una vez; cada worker parte de ahí
+        self._context.set_forkserver_preload([score_texts.__module__])
+        self._idle = queue.Queue()
+        self._workers = []
+        self._lock = threading.Lock()
+        # Hilos del padre que esperan a cada worker (liberan el GIL mientras esperan)
+        self._dispatch = None
+        self.generation = 0
+        self._models_version = None
+        self.restarts = 0
+
+    def start(self):
+        self._dispatch = ThreadPoolExecutor(max_workers=self.n_workers)
+        self._new_generation()
+        # Los errores de carga de modelos aparecen al arrancar y no en el primer lote
+        for worker in list(self._workers):
+            try:
+                worker.wait_ready(self.startup_timeout)
+            except (EOFError, OSError, TimeoutError) as e:
+                self.stop()
+                raise RuntimeError(f"No arrancó el worker de inferencia {worker.process.pid}: {e}") from e
+
+    def stop(self):
+        with self._lock:
+            workers, self._workers = self._workers, []
+            self.generation += 1
+        for worker in workers:
+            worker.stop()
+        self._idle = queue.Queue()
+        if self._dispatch is not None:
+            self._dispatch.shutdown(wait=True)
+            self._dispatch = None
+
+    def _new_generation(self, only_if_stale=False):
+        with self._lock:
+            if only_if_stale and self.version() == self._models_version:
+                return  # Otro hilo ya creó la generación nueva
+            self._models_version = self.version() if self.version is not None else None
+            self.generation += 1
+            for _ in range(self.n_workers):
+                self._add_worker()
+
+    def score(self, texts, *args):
+        """Mismo contrato que score_texts, repartido entre los workers; `args` se pasa tal cual."""
+        if self.version is not None and self.version() != self._models_version:
+            self._new_generation(only_if_stale=True)
+        n_texts = len(texts)
+        if n_texts == 0:
+            return np.zeros(0), np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.int64)
+        n_shards = max(1, min(self.n_workers, n_texts // MIN_SHARD_SIZE))
+        bounds = np.linspace(0, n_texts, n_shards + 1).astype(int)
+        shards = [texts[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+        results = list(self._dispatch.map(lambda shard: self._score_shard(shard, args), shards))
+        # En el hilo que llama, para que también cuenten en su `trace`
+        for result in results:
+            replay(result[3])
+        return tuple(np.concatenate([result[i] for result in results]) for i in range(3))
+
+    def _add_worker(self):
+        # Se llama con self._lock tomado
+        worker = _Worker(self._context, self.score_texts, self.warmup, self.generation)
+        self._workers.append(worker)
+        self._idle.put(worker)
+
+    def _retire(self, worker, timeout=5.0):
+        with self._lock:
+            if worker in self._workers:
+                self._workers.remove(worker)
+        worker.stop(timeout)
+
+    def _replace(self, worker, reason=None):
+        self._retire(worker, timeout=0)
+        reason = reason or f"terminó (código {worker.process.exitcode})"
+        warn(f"el worker de inferencia {worker.process.pid} {reason}; se crea otro",
+             pid=worker.process.pid, exitcode=worker.process.exitcode)
+        with self._lock:
+            self.restarts += 1
+            if worker.generation == self.generation:
+                self._add_worker()
+
+    def _take(self):
+        # Los workers de generaciones anteriores se retiran al salir de la cola
+        while True:
+            worker = self._idle.get()
+            if worker.generation == self.generation:
+                return worker
+            self._retire(worker)
+
+    def _score_shard(self, texts, args):
+        block = _pack(texts)
+        try:
+            for attempt in range(2):
+                worker = self._take()
+                try:
+                    error, observations = worker.run(block.name, len(texts), args, self.timeout, self.startup_timeout)
+                except TimeoutError as e:
+                    # Se mata para que no escriba en el bloque ni responda tarde
+                    self._replace(worker, reason="no respondió a tiempo")
+                    raise RuntimeError(f"Tiempo agotado en el pool de inferencia: {e}") from e
+                except (EOFError, OSError, BrokenPipeError):
+                    self._replace(worker)
+                    if attempt == 1:
+                        raise RuntimeError("El worker de inferencia terminó dos veces con el mismo lote")
+                    continue
+                self._idle.put(worker)
+                if error is not None:
+                    raise RuntimeError(f"Error en el worker de inferencia: {error}")
+                probabilities_at, emotions_at, masks_at, _, _ = _layout(len(texts))
+                probabilities = np.frombuffer(block.buf, dtype=np.float64, count=len(texts), offset=probabilities_at).copy()
+                emotions = np.frombuffer(block.buf, dtype=np.int64, count=len(texts), offset=emotions_at).astype(np.intp)
+                masks = np.frombuffer(block.buf, dtype=np.int64, count=len(texts), offset=masks_at).copy()
+                return probabilities, emotions, masks, observations
+        finally:
+            block.close()
+            block.unlink()
+
+
+def main(argv=None):
+    from .preprocessing import _synthetic_corpus
+    from .prueba import calentar_modelos, puntuar_textos
+
+    parser = argparse.ArgumentParser(description="Compara el pool de inferencia con la ejecución en proceso.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=256)
+    args = parser.parse_args(argv)
+
+    texts = _synthetic_corpus(args.texts)
+    batches = [texts[i:i + args.batch_size] for i in range(0, len(texts), args.batch_size)]
+    calentar_modelos()
+
+    start = time.perf_counter()
+    expected = [puntuar_textos(batch) for batch in batches]
+    serial_time = time.perf_counter() - start
+
+    pool = InferencePool(puntuar_textos, args.workers, warmup=calentar_modelos)
+    pool.start()
+    try:
+        start = time.perf_counter()
+        # Varios lotes a la vez, como llegan de /predict/batch y de los micro-lotes
+        with ThreadPoolExecutor(max_workers=args.workers) as clients:
+            actual = list(clients.map(pool.score, batches))
+        pool_time = time.perf_counter() - start
+    finally:
+        pool.stop()
+
+    same = all(
+        np.allclose(e_prob, a_prob) and np.array_equal(e_emotion, a_emotion) and np.array_equal(e_mask, a_mask)
+        for (e_prob, e_emotion, e_mask), (a_prob, a_emotion, a_mask) in zip(expected, actual)
+    )
+    print(f"{args.texts} textos en lotes de {args.batch_size}")
+    print(f"en proceso: {args.texts / serial_time:.0f} textos/s")
+    print(f"pool ({args.workers} workers): {args.texts / pool_time:.0f} textos/s  "
+          f"({serial_time / pool_time:.2f}x)  resultados iguales: {same}")
+    return 0 if same else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
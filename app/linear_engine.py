@@ -0,0 +1,151 @@
+"""
+Motor de inferencia para los miembros lineales del ensemble.
+
+La regresión logística y el Naive Bayes multinomial son lineales en el
+espacio TF-IDF: sus puntuaciones son `X @ W + b`. `LinearEnsembleEngine`
+apila los pesos de todos los miembros lineales de una tarea en una sola
+matriz densa, de modo que un lote de filas dispersas se puntúa con un único
+producto disperso-denso seguido de softmax/sigmoide por miembro, en lugar de
+una llamada a `predict_proba` por estimador.
+
+    python -m app.linear_engine
+
+compara los resultados con sklearn y mide el tiempo por lote.
+"""
+import numpy as np
+from scipy.special import expit
+
+LINEAR_ESTIMATORS = ("LogisticRegression", "MultinomialNB")
+
+
+def is_linear(estimator):
+    return type(estimator).__name__ in LINEAR_ESTIMATORS
+
+
+def _softmax(z):
+    z = z - z.max(axis=1, keepdims=True)
+    np.exp(z, out=z)
+    z /= z.sum(axis=1, keepdims=True)
+    return z
+
+
+def _logistic_link(estimator):
+    """Función de enlace, con la misma lógica que LogisticRegression.predict_proba."""
+    binary = len(estimator.classes_) <= 2
+    multi_class = getattr(estimator, "multi_class", "auto")
+    ovr = multi_class in ("ovr", "warn") or (
+        multi_class in ("auto", "deprecated") and (binary or estimator.solver == "liblinear")
+    )
+    if binary:
+        # softmax([-d, d]) equivale a la sigmoide de 2d
+        return "binary" if ovr else "binary_softmax"
+    return "ovr" if ovr else "softmax"
+
+
+def _floating(weights):
+    # Los pesos en float32 (paquetes de app.compress_models) se quedan en float32
+    weights = np.asarray(weights)
+    return weights if weights.dtype == np.float32 else weights.astype(np.float64, copy=False)
+
+
+class _Member:
+    def __init__(self, name, estimator, start):
+        self.name = name
+        self.classes = estimator.classes_
+        if type(estimator).__name__ == "LogisticRegression":
+            self.link = _logistic_link(estimator)
+            self.weights = _floating(estimator.coef_)
+            self.bias = np.asarray(estimator.intercept_, dtype=np.float64)
+        else:
+            # Naive Bayes: log-verosimilitud conjunta, normalizada con softmax
+            self.link = "softmax"
+            self.weights = _floating(estimator.feature_log_prob_)
+            self.bias = np.asarray(estimator.class_log_prior_, dtype=np.float64)
+        self.columns = slice(start, start + self.weights.shape[0])
+
+    def proba(self, scores):
+        if self.link in ("binary", "binary_softmax"):
+            p = expit(scores[:, 0] if self.link == "binary" else 2.0 * scores[:, 0])
+            return np.column_stack([1.0 - p, p])
+        if self.link == "ovr":
+            p = expit(scores)
+            return p / p.sum(axis=1, keepdims=True)
+        return _softmax(scores.copy())
+
+    def predict(self, scores):
+        if self.link in ("binary", "binary_softmax"):
+            return self.classes[(scores[:, 0] > 0).astype(np.intp)]
+        return self.classes[scores.argmax(axis=1)]
+
+
+class LinearEnsembleEngine:
+    """Puntúa todos los miembros lineales de una tarea con un solo producto matricial."""
+
+    def __init__(self, members):
+        self.members = []
+        start = 0
+        for name, estimator in members:
+            member = _Member(name, estimator, start)
+            self.members.append(member)
+            start = member.columns.stop
+        if not self.members:
+            self.weights = self.bias = None
+            return
+        # (n_features, total de columnas de todos los miembros)
+        self.weights = np.ascontiguousarray(np.vstack([m.weights for m in self.members]).T)
+        self.bias = np.concatenate([m.bias for m in self.members])
+
+    @property
+    def names(self):
+        return [member.name for member in self.members]
+
+    def scores(self, X):
+        return X @ self.weights + self.bias
+
+    def predict_proba(self, X):
+        """Devuelve {nombre: probabilidades} para cada miembro."""
+        if not self.members:
+            return {}
+        scores = self.scores(X)
+        return {m.name: m.proba(scores[:, m.columns]) for m in self.members}
+
+    def predict(self, X):
+        """Devuelve {nombre: etiquetas} para cada miembro."""
+        if not self.members:
+            return {}
+        scores = self.scores(X)
+        return {m.name: m.predict(scores[:, m.columns]) for m in self.members}
+
+
+def main():
+    import time
+
+    from .model_registry import SENTIMENT_MEMBERS, SUICIDE_MEMBERS
+    from .preprocessing import _synthetic_corpus
+    from .prueba import featurizer, preprocessor, registry
+
+    documents = preprocessor.preprocess_batch(_synthetic_corpus(1000))
+    X_sentiment, X_suicide = featurizer().transform(documents)
+    status = 0
+    for task, names, X in (("sentimientos", SENTIMENT_MEMBERS, X_sentiment), ("depresión", SUICIDE_MEMBERS, X_suicide)):
+        members = [(name, model) for name, model in registry.members(names) if is_linear(model)]
+        engine = LinearEnsembleEngine(members)
+
+        start = time.perf_counter()
+        expected = {name: model.predict_proba(X) for name, model in members}
+        sklearn_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual = engine.predict_proba(X)
+        engine_time = time.perf_counter() - start
+
+        max_error = max(np.abs(expected[name] - actual[name]).max() for name in expected)
+        print(f"{task}: sklearn {sklearn_time * 1000:.1f}ms  motor {engine_time * 1000:.1f}ms  "
+              f"aceleración {sklearn_time / max(engine_time, 1e-9):.1f}x  error máximo {max_error:.2e}")
+        if max_error > 1e-9:
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
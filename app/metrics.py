@@ -0,0 +1,278 @@
+"""
+Métricas de inferencia y de la API en formato de texto de Prometheus.
+
+Histogramas, contadores y gauges mínimos, seguros entre hilos y pensados
+para dejarlos activos en producción: cada observación es un `bisect` y unas
+sumas bajo un lock, y se hace por lote o por etapa, nunca por fila. Los
+gauges pueden leer su valor de una función en el momento del scrape (p. ej.
+la profundidad de una cola).
+
+Con METRICS_LOG se escriben además registros JSON, uno por línea, con los
+tiempos por etapa de cada lote ("-" = salida estándar, o la ruta de un archivo).
+Los avisos y errores del servidor (`warn`) van al mismo registro; sin
+METRICS_LOG se escriben como texto en la salida de errores.
+
+El registro es de cada proceso: lo que se mide en otro (los workers del pool
+de inferencia) se recoge con `collect` y se repite en el padre con `replay`.
+"""
+import bisect
+import json
+import math
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+
+class _Value(_Metric):
+    """Valor por etiquetas, propio o leído de `function()` en cada scrape ({etiquetas: valor} si tiene etiquetas)."""
+
+    def __init__(self, name, help, labelnames=(), function=None):
+        super().__init__(name, help, labelnames)
+        self.function = function
+        self._values = {}
+
+    def _samples(self):
+        with self._lock:
+            values = dict(self._values)
+        if self.function is not None:
+            try:
+                result = self.function()
+            except Exception as e:
+                warn(f"no se pudo leer la métrica {self.name}: {e}", metric=self.name)
+                result = None
+            if isinstance(result, dict):
+                values.update({key if isinstance(key, tuple) else (key,): value for key, value in result.items()})
+            elif result is not None:
+                values[()] = result
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in sorted(values.items())]
+
+
+class Counter(_Value):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Value):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+        # Las etapas y los miembros se suman también al registro del lote en curso
+        _trace_add(labels.get("stage") or labels.get("member"), value)
+        collected = getattr(_local, "collected", None)
+        if collected is not None:
+            collected.append((self.name, labels, value))
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self):
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        lines = []
+        for key, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [('le', _number(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name, help, labelnames=(), function=None):
+        return self._with_function(self._register(Counter, name, help, labelnames), function)
+
+    def gauge(self, name, help, labelnames=(), function=None):
+        return self._with_function(self._register(Gauge, name, help, labelnames), function)
+
+    @staticmethod
+    def _with_function(metric, function):
+        if function is not None:
+            metric.function = function
+        return metric
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram, name, help, labelnames, buckets)
+
+    def get(self, name):
+        with self._lock:
+            return self._metrics.get(name)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# Métricas comunes a la inferencia y a la API
+STAGE_SECONDS = REGISTRY.histogram(
+    "favfix_stage_seconds", "Duración de cada etapa del pipeline por lote.", ("stage",))
+MEMBER_SECONDS = REGISTRY.histogram(
+    "favfix_member_seconds", "Duración de la evaluación de cada miembro del ensemble por lote.", ("member",))
+BATCH_SIZE = REGISTRY.histogram(
+    "favfix_batch_size", "Elementos por lote.", ("batch",), buckets=SIZE_BUCKETS)
+MODEL_LOAD_SECONDS = REGISTRY.gauge(
+    "favfix_model_load_seconds", "Tiempo de la última carga de cada artefacto.", ("artifact",))
+
+
+# Registros estructurados
+_log_target = os.getenv("METRICS_LOG") or None
+_log_lock = threading.Lock()
+_local = threading.local()
+
+
+def log_event(event, **fields):
+    """Escribe un registro JSON si METRICS_LOG está activo."""
+    if _log_target is None:
+        return
+    line = json.dumps({"ts": time.time(), "event": event, **fields}, ensure_ascii=False, default=str)
+    with _log_lock:
+        if _log_target == "-":
+            print(line, file=sys.stdout, flush=True)
+        else:
+            with open(_log_target, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+_PREFIXES = {"warning": "Aviso", "error": "Error"}
+
+
+def warn(message, level="warning", **fields):
+    """
+    Aviso ("warning") o error ("error") del servidor. Con METRICS_LOG se
+    escribe como un registro más, con `message` y `fields`; sin él, como
+    "Aviso: ..." o "Error: ..." en la salida de errores.
+    """
+    if _log_target is None:
+        print(f"{_PREFIXES[level]}: {message}", file=sys.stderr, flush=True)
+    else:
+        log_event(level, message=message, **fields)
+
+
+def _trace_add(name, seconds):
+    record = getattr(_local, "trace", None)
+    if record is not None and name is not None:
+        record[name] = record.get(name, 0.0) + seconds * 1000
+
+
+@contextmanager
+def trace(event, **fields):
+    """
+    Agrupa los tiempos de las etapas observadas en este hilo dentro del
+    bloque y los escribe como un solo registro (en ms). Sin METRICS_LOG no hace nada.
+    """
+    if _log_target is None or getattr(_local, "trace", None) is not None:
+        yield
+        return
+    _local.trace = {}
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stages, _local.trace = _local.trace, None
+        log_event(event, total_ms=(time.perf_counter() - start) * 1000, stages_ms=stages, **fields)
+
+
+@contextmanager
+def collect():
+    """
+    Devuelve la lista de observaciones de histogramas hechas en este hilo
+    dentro del bloque, como (nombre, etiquetas, valor), para `replay`.
+    """
+    previous = getattr(_local, "collected", None)
+    _local.collected = collected = []
+    try:
+        yield collected
+    finally:
+        _local.collected = previous
+
+
+def replay(observations):
+    """Observa en este proceso lo recogido con `collect` en otro; ignora las métricas que no existen aquí."""
+    for name, labels, value in observations:
+        metric = REGISTRY.get(name)
+        if isinstance(metric, Histogram):
+            metric.observe(value, **labels)
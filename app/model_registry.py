@@ -0,0 +1,248 @@
+"""
+Registro de modelos con carga perezosa.
+
+Cada artefacto se deserializa la primera vez que se pide. Los arrays grandes
+(coeficientes, log-probabilidades de Naive Bayes, idf del TF-IDF) se exportan
+una sola vez a archivos .npy junto a un "esqueleto" pickle del estimador, y se
+cargan con `np.load(mmap_mode='r')`. Así varios procesos (p. ej. varios workers
+de uvicorn) comparten las mismas páginas de memoria en lugar de tener cada uno
+su copia.
+
+MODEL_ARTIFACTS_DIR apunta a otro directorio con los mismos archivos, p. ej.
+un paquete compacto generado con `python -m app.compress_models`.
+"""
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import threading
+import time
+
+import numpy as np
+import scipy.sparse as sp
+
+from .metrics import MODEL_LOAD_SECONDS, log_event, warn
+
+ARTIFACTS_DIR = os.getenv("MODEL_ARTIFACTS_DIR") or os.path.dirname(os.path.abspath(__file__))
+MMAP_DIR = os.path.join(ARTIFACTS_DIR, "mmap_cache")
+
+ARTIFACTS = {
+    "sentiment_log_reg": "modelo_sentimientos_regresin_logstica.pkl",
+    "sentiment_nb": "modelo_sentimientos_naive_bayes.pkl",
+    "sentiment_rf": "modelo_sentimientos_random_forest_random_forest.pkl",
+    "sentiment_xgb": "modelo_sentimientos_xgboost_xgboost.pkl",
+    "suicide_log_reg": "modelo_depresion_regresin_logstica.pkl",
+    "suicide_nb": "modelo_depresion_naive_bayes.pkl",
+    "suicide_rf": "modelo_depresion_random_forest_random_forest.pkl",
+    "suicide_xgb": "modelo_depresion_xgboost_xgboost.pkl",
+    "tfidf_sentiment": "tfidf_vectorizador_sentimientos.pkl",
+    "tfidf_suicide": "tfidf_vectorizador_depresion.pkl",
+}
+
+SUICIDE_MEMBERS = ["suicide_log_reg", "suicide_nb", "suicide_rf", "suicide_xgb"]
+SENTIMENT_MEMBERS = ["sentiment_log_reg", "sentiment_nb", "sentiment_rf", "sentiment_xgb"]
+
+# Atributos que se guardan como .npy y se cargan mapeados en memoria
+ARRAY_ATTRIBUTES = (
+    "coef_",
+    "intercept_",
+    "feature_log_prob_",
+    "class_log_prior_",
+    "feature_count_",
+    "class_count_",
+    "_tfidf.idf_",
+)
+# Matrices dispersas (el idf de sklearn < 1.0 se guarda como matriz diagonal)
+SPARSE_ATTRIBUTES = ("_tfidf._idf_diag",)
+# Atributos que no se usan para predecir y solo ocupan memoria
+DROP_ATTRIBUTES = ("stop_words_",)
+
+
+def _resolve(obj, path):
+    """Devuelve (objeto, nombre) para una ruta tipo "_tfidf.idf_", o (None, None)."""
+    *parents, name = path.split(".")
+    for parent in parents:
+        obj = vars(obj).get(parent) if hasattr(obj, "__dict__") else None
+        if obj is None:
+            return None, None
+    if not hasattr(obj, "__dict__") or name not in vars(obj):
+        return None, None
+    return obj, name
+
+
+def _resolve_parent(obj, path):
+    *parents, name = path.split(".")
+    for parent in parents:
+        obj = getattr(obj, parent)
+    return obj, name
+
+
+def _source_signature(path):
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+class ModelRegistry:
+    """Carga los artefactos bajo demanda y los mantiene en memoria."""
+
+    def __init__(self, artifacts_dir=ARTIFACTS_DIR, mmap_dir=MMAP_DIR, use_mmap=True):
+        self.artifacts_dir = artifacts_dir
+        self.mmap_dir = mmap_dir
+        self.use_mmap = use_mmap
+        self._models = {}
+        self._missing = set()
+        self._lock = threading.Lock()
+
+    def path(self, name):
+        return os.path.join(self.artifacts_dir, ARTIFACTS[name])
+
+    def available(self, name):
+        return os.path.exists(self.path(name))
+
+    def get(self, name):
+        """Devuelve el artefacto `name`, cargándolo si hace falta."""
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        with self._lock:
+            if name not in self._models:
+                start = time.perf_counter()
+                self._models[name] = self._load(name)
+                elapsed = time.perf_counter() - start
+                MODEL_LOAD_SECONDS.set(elapsed, artifact=name)
+                log_event("model_load", artifact=name, seconds=elapsed)
+            return self._models[name]
+
+    def members(self, names):
+        """
+        Devuelve [(nombre, modelo)] para los miembros disponibles del ensemble.
+        Los que faltan en disco se omiten con un aviso.
+        """
+        members = []
+        for name in names:
+            if not self.available(name):
+                if name not in self._missing:
+                    self._missing.add(name)
+                    warn(f"no se encontró {ARTIFACTS[name]}, se omite '{name}' del ensemble", artifact=name)
+                continue
+            members.append((name, self.get(name)))
+        if not members:
+            raise RuntimeError(f"No hay ningún modelo disponible entre {names}")
+        return members
+
+    def load_all(self):
+        """Carga todos los artefactos disponibles (útil antes de hacer fork de workers)."""
+        for name in ARTIFACTS:
+            if self.available(name):
+                self.get(name)
+
+    def version(self):
+        """
+        Huella del conjunto de artefactos en disco (nombre, tamaño y fecha de
+        modificación). Cambia en cuanto se reemplaza cualquier pickle.
+        """
+        signatures = {
+            name: _source_signature(self.path(name)) if self.available(name) else None
+            for name in ARTIFACTS
+        }
+        return hashlib.sha1(json.dumps(signatures, sort_keys=True).encode()).hexdigest()[:16]
+
+    def reset(self):
+        """Descarta los artefactos cargados; se volverán a cargar al pedirlos."""
+        with self._lock:
+            self._models.clear()
+            self._missing.clear()
+
+    def _load(self, name):
+        source = self.path(name)
+        if not self.use_mmap:
+            with open(source, "rb") as f:
+                return pickle.load(f)
+
+        target = os.path.join(self.mmap_dir, name)
+        signature = _source_signature(source)
+        if self._is_fresh(target, signature):
+            return self._load_mmap(target)
+
+        with open(source, "rb") as f:
+            model = pickle.load(f)
+        try:
+            self._export(model, target, signature)
+        except (OSError, pickle.PicklingError) as e:
+            warn(f"no se pudo exportar '{name}' para mmap: {e}", artifact=name)
+            return model
+        return self._load_mmap(target)
+
+    def _is_fresh(self, target, signature):
+        try:
+            with open(os.path.join(target, "manifest.json")) as f:
+                return json.load(f)["source"] == signature
+        except (OSError, ValueError, KeyError):
+            return False
+
+    def _export(self, model, target, signature):
+        # Se escribe en un directorio temporal y se renombra, para que otro
+        # proceso nunca vea una exportación a medias
+        tmp = f"{target}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        arrays, sparse, dropped = {}, {}, {}
+        try:
+            for path in DROP_ATTRIBUTES:
+                obj, attr = _resolve(model, path)
+                if obj is not None:
+                    dropped[path] = vars(obj).pop(attr)
+            for path in ARRAY_ATTRIBUTES:
+                obj, attr = _resolve(model, path)
+                if obj is not None and isinstance(vars(obj)[attr], np.ndarray):
+                    arrays[path] = vars(obj).pop(attr)
+                    np.save(os.path.join(tmp, f"{path}.npy"), arrays[path])
+            for path in SPARSE_ATTRIBUTES:
+                obj, attr = _resolve(model, path)
+                if obj is not None and sp.issparse(vars(obj)[attr]):
+                    matrix = vars(obj).pop(attr)
+                    sparse[path] = matrix
+                    matrix = matrix.tocsr()
+                    for part in ("data", "indices", "indptr"):
+                        np.save(os.path.join(tmp, f"{path}.{part}.npy"), getattr(matrix, part))
+            with open(os.path.join(tmp, "skeleton.pkl"), "wb") as f:
+                pickle.dump(model, f, protocol=pickle.HIGHEST_PROTOCOL)
+        finally:
+            # El objeto en memoria queda como estaba
+            for values in (dropped, arrays, sparse):
+                for path, value in values.items():
+                    obj, attr = _resolve_parent(model, path)
+                    setattr(obj, attr, value)
+
+        manifest = {
+            "source": signature,
+            "arrays": list(arrays),
+            "sparse": {path: list(matrix.shape) for path, matrix in sparse.items()},
+        }
+        with open(os.path.join(tmp, "manifest.json"), "w") as f:
+            json.dump(manifest, f)
+
+        shutil.rmtree(target, ignore_errors=True)
+        try:
+            os.replace(tmp, target)
+        except OSError:
+            # Otro proceso exportó el mismo artefacto a la vez
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def _load_mmap(self, target):
+        with open(os.path.join(target, "manifest.json")) as f:
+            manifest = json.load(f)
+        with open(os.path.join(target, "skeleton.pkl"), "rb") as f:
+            model = pickle.load(f)
+        for path in manifest["arrays"]:
+            obj, attr = _resolve_parent(model, path)
+            setattr(obj, attr, np.load(os.path.join(target, f"{path}.npy"), mmap_mode="r"))
+        for path, shape in manifest["sparse"].items():
+            data, indices, indptr = (
+                np.load(os.path.join(target, f"{path}.{part}.npy"), mmap_mode="r")
+                for part in ("data", "indices", "indptr")
+            )
+            obj, attr = _resolve_parent(model, path)
+            setattr(obj, attr, sp.csr_matrix((data, indices, indptr), shape=tuple(shape), copy=False))
+        return model
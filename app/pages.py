@@ -1,158 +1,172 @@
 import reflex as rx
+from typing import Dict, List
+from . import api_client
 from .components import sidebar, header, stats_card
-import httpx
 
-# Función para obtener datos del backend (con manejo de errores)
-def fetch_data():
-    try:
-        with httpx.Client() as client:
-            response = client.get("http://localhost:8000/users")
-            if response.status_code == 200:
-                return response.json()["users"]
-            else:
-                return []
-    except Exception as e:
-        print(f"Error fetching data: {e}")
-        return []
+# Filas por página: es también el máximo de filas en el DOM
+PAGE_SIZE = 50
 
-# Página de Admin
-def admin_page():
-    # Datos predeterminados en caso de que el backend no responda
-    default_stats = [
-        {"title": "Visitors", "value": "0", "icon": "users"},
-        {"title": "Messages", "value": "0", "icon": "message-circle"},
-        {"title": "Users", "value": "0", "icon": "user"},
-    ]
+# Origen de datos de cada tabla: endpoint y columnas (clave, título).
+# Mensajes y configuración todavía no tienen endpoint en la API.
+TABLES = {
+    "users": {
+        "path": "/users",
+        "columns": [
+            ("id", "ID"), ("name", "Name"), ("age", "Age"), ("gender", "Gender"), ("sector", "Sector"),
+            ("result", "Result"), ("emotion", "Emotion"), ("suicide_probability", "Suicide Probability"),
+        ],
+    },
+    "messages": {
+        "path": None,
+        "columns": [
+            ("id", "ID"), ("sender", "Sender"), ("recipient", "Recipient"), ("subject", "Subject"),
+            ("message", "Message"), ("status", "Status"),
+        ],
+    },
+    "settings": {
+        "path": None,
+        "columns": [("id", "ID"), ("setting", "Setting"), ("value", "Value"), ("status", "Status")],
+    },
+}
+
+def _format_cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    return str(value)
+
+class AdminTableState(rx.State):
+    """Estado compartido de las tablas de administración: una página de filas cada vez."""
+
+    table: str = "users"
+    rows: List[Dict[str, str]] = []
+    cursor: str = ""  # Cursor de la página actual ("" = primera página)
+    previous_cursors: List[str] = []
+    next_cursor: str = ""
+    is_loading: bool = False
+
+    @rx.var
+    def has_previous(self) -> bool:
+        return len(self.previous_cursors) > 0
 
-    # Obtener datos del backend (o usar datos predeterminados)
-    users_data = fetch_data()
+    @rx.var
+    def has_next(self) -> bool:
+        return self.next_cursor != ""
 
+    async def load(self, table: str):
+        """Carga la primera página al montar la página."""
+        self.table = table
+        self.cursor = ""
+        self.previous_cursors = []
+        self.rows = []
+        self.next_cursor = ""
+        self.is_loading = True
+        yield
+        await self._fetch_page()
+
+    async def next_page(self):
+        if not self.next_cursor:
+            return
+        self.previous_cursors = self.previous_cursors + [self.cursor]
+        self.cursor = self.next_cursor
+        self.is_loading = True
+        yield
+        await self._fetch_page()
+
+    async def previous_page(self):
+        if not self.previous_cursors:
+            return
+        self.cursor = self.previous_cursors[-1]
+        self.previous_cursors = self.previous_cursors[:-1]
+        self.is_loading = True
+        yield
+        await self._fetch_page()
+
+    async def _fetch_page(self):
+        table = TABLES[self.table]
+        try:
+            if table["path"] is None:
+                self.rows, self.next_cursor = [], ""
+                return
+            params = {"limit": PAGE_SIZE, "fields": ",".join(key for key, _ in table["columns"])}
+            if self.cursor:
+                params["cursor"] = self.cursor
+            response = await api_client.get(table["path"], params=params)
+            if response.status_code == 200:
+                data = response.json()
+                self.rows = [
+                    {key: _format_cell(row.get(key)) for key, _ in table["columns"]} for row in data["users"]
+                ]
+                self.next_cursor = data.get("next_cursor") or ""
+            else:
+                print(f"Error fetching data: {response.status_code}")
+                self.rows, self.next_cursor = [], ""
+        except Exception as e:
+            print(f"Error fetching data: {e}")
+            self.rows, self.next_cursor = [], ""
+        finally:
+            self.is_loading = False
+
+def data_table(table):
+    """Tabla con ventana de PAGE_SIZE filas; las filas se renderizan en el cliente con rx.foreach."""
+    columns = TABLES[table]["columns"]
     return rx.box(
-        rx.hstack(
-            sidebar(),
-            rx.vstack(
-                header(),
-                rx.hstack(
-                    *[stats_card(stat["title"], stat["value"], stat["icon"]) for stat in default_stats],
-                    spacing="4",
-                    padding="4",
-                ),
+        rx.box(
+            *[rx.text(title, font_weight="bold") for _, title in columns],
+            display="flex",
+            justify_content="space-between",
+            padding="4",
+            background="bg-gray-800",
+        ),
+        rx.cond(
+            AdminTableState.is_loading,
+            rx.center(rx.spinner(), padding="4"),
+            rx.cond(
+                AdminTableState.rows,
                 rx.box(
-                    rx.heading("User Analysis", size="5", padding="4"),  # Tamaño ajustado a valor numérico válido
-                    rx.cond(
-                        users_data,  # Si hay datos, mostrar la tabla
-                        rx.box(
-                            rx.box(
-                                rx.text("ID", font_weight="bold"),
-                                rx.text("Name", font_weight="bold"),
-                                rx.text("Age", font_weight="bold"),
-                                rx.text("Gender", font_weight="bold"),
-                                rx.text("Sector", font_weight="bold"),
-                                rx.text("Result", font_weight="bold"),
-                                rx.text("Emotion", font_weight="bold"),
-                                rx.text("Suicide Probability", font_weight="bold"),
-                                display="flex",
-                                justify_content="space-between",
-                                padding="4",
-                                background="bg-gray-800",
-                            ),
-                            *[
-                                rx.box(
-                                    rx.text(str(user["id"])),
-                                    rx.text(user["name"]),
-                                    rx.text(str(user["age"])),
-                                    rx.text(user["gender"]),
-                                    rx.text(user["sector"]),
-                                    rx.text(user["result"]),
-                                    rx.text(user["emotion"]),
-                                    rx.text(f"{user['suicide_probability']:.2f}"),
-                                    display="flex",
-                                    justify_content="space-between",
-                                    padding="4",
-                                    border_bottom="1px solid gray",
-                                )
-                                for user in users_data
-                            ],
-                            width="100%",
-                            background="bg-gray-700",
-                            color="text-white",
+                    rx.foreach(
+                        AdminTableState.rows,
+                        lambda row: rx.box(
+                            *[rx.text(row[key]) for key, _ in columns],
+                            display="flex",
+                            justify_content="space-between",
+                            padding="4",
+                            border_bottom="1px solid gray",
                         ),
-                        rx.text("No data available", padding="4"),  # Si no hay datos, mostrar un mensaje
                     ),
-                    padding="4",
+                    max_height="60vh",
+                    overflow_y="auto",
                 ),
-                width="100%",
+                rx.text("No data available", padding="4"),  # Si no hay datos, mostrar un mensaje
             ),
-            height="100vh",
         ),
-        background="bg-gray-900",
+        rx.hstack(
+            rx.button("Previous", on_click=AdminTableState.previous_page, disabled=~AdminTableState.has_previous),
+            rx.button("Next", on_click=AdminTableState.next_page, disabled=~AdminTableState.has_next),
+            justify="end",
+            padding="4",
+        ),
+        width="100%",
+        background="bg-gray-700",
         color="text-white",
     )
 
-# Página de Usuarios
-def users_page():
-    # Datos predeterminados en caso de que el backend no responda
-    default_stats = [
-        {"title": "Total Users", "value": "0", "icon": "user"},
-        {"title": "Active Users", "value": "0", "icon": "user-check"},
-        {"title": "Inactive Users", "value": "0", "icon": "user-x"},
-    ]
-
-    # Obtener datos del backend (o usar datos predeterminados)
-    users_data = fetch_data()
-
+def admin_table_page(table, heading, default_stats, title=None):
+    """Estructura común de las páginas de administración. No pide datos al construirse."""
     return rx.box(
         rx.hstack(
             sidebar(),
             rx.vstack(
-                header(title="Users"),
+                header() if title is None else header(title=title),
                 rx.hstack(
                     *[stats_card(stat["title"], stat["value"], stat["icon"]) for stat in default_stats],
                     spacing="4",
                     padding="4",
                 ),
                 rx.box(
-                    rx.heading("User Management", size="5", padding="4"),  # Tamaño ajustado a valor numérico válido
-                    rx.cond(
-                        users_data,  # Si hay datos, mostrar la tabla
-                        rx.box(
-                            rx.box(
-                                rx.text("ID", font_weight="bold"),
-                                rx.text("Name", font_weight="bold"),
-                                rx.text("Age", font_weight="bold"),
-                                rx.text("Gender", font_weight="bold"),
-                                rx.text("Sector", font_weight="bold"),
-                                rx.text("Result", font_weight="bold"),
-                                rx.text("Emotion", font_weight="bold"),
-                                rx.text("Suicide Probability", font_weight="bold"),
-                                display="flex",
-                                justify_content="space-between",
-                                padding="4",
-                                background="bg-gray-800",
-                            ),
-                            *[
-                                rx.box(
-                                    rx.text(str(user["id"])),
-                                    rx.text(user["name"]),
-                                    rx.text(str(user["age"])),
-                                    rx.text(user["gender"]),
-                                    rx.text(user["sector"]),
-                                    rx.text(user["result"]),
-                                    rx.text(user["emotion"]),
-                                    rx.text(f"{user['suicide_probability']:.2f}"),
-                                    display="flex",
-                                    justify_content="space-between",
-                                    padding="4",
-                                    border_bottom="1px solid gray",
-                                )
-                                for user in users_data
-                            ],
-                            width="100%",
-                            background="bg-gray-700",
-                            color="text-white",
-                        ),
-                        rx.text("No data available", padding="4"),  # Si no hay datos, mostrar un mensaje
-                    ),
+                    rx.heading(heading, size="5", padding="4"),  # Tamaño ajustado a valor numérico válido
+                    data_table(table),
                     padding="4",
                 ),
                 width="100%",
@@ -161,140 +175,42 @@ def users_page():
         ),
         background="bg-gray-900",
         color="text-white",
+        on_mount=AdminTableState.load(table),  # Los datos se cargan al montar, de forma asíncrona
     )
 
+# Página de Admin
+def admin_page():
+    # Datos predeterminados en caso de que el backend no responda
+    default_stats = [
+        {"title": "Visitors", "value": "0", "icon": "users"},
+        {"title": "Messages", "value": "0", "icon": "message-circle"},
+        {"title": "Users", "value": "0", "icon": "user"},
+    ]
+    return admin_table_page("users", "User Analysis", default_stats)
+
+# Página de Usuarios
+def users_page():
+    default_stats = [
+        {"title": "Total Users", "value": "0", "icon": "user"},
+        {"title": "Active Users", "value": "0", "icon": "user-check"},
+        {"title": "Inactive Users", "value": "0", "icon": "user-x"},
+    ]
+    return admin_table_page("users", "User Management", default_stats, title="Users")
+
 # Página de Mensajes
 def messages_page():
-    # Datos predeterminados en caso de que el backend no responda
     default_stats = [
         {"title": "Total Messages", "value": "0", "icon": "message-circle"},
         {"title": "Unread Messages", "value": "0", "icon": "mail"},
         {"title": "Read Messages", "value": "0", "icon": "mail-open"},
     ]
-
-    # Obtener datos del backend (o usar datos predeterminados)
-    messages_data = fetch_data()
-
-    return rx.box(
-        rx.hstack(
-            sidebar(),
-            rx.vstack(
-                header(title="Messages"),
-                rx.hstack(
-                    *[stats_card(stat["title"], stat["value"], stat["icon"]) for stat in default_stats],
-                    spacing="4",
-                    padding="4",
-                ),
-                rx.box(
-                    rx.heading("Messages", size="5", padding="4"),  # Tamaño ajustado a valor numérico válido
-                    rx.cond(
-                        messages_data,  # Si hay datos, mostrar la tabla
-                        rx.box(
-                            rx.box(
-                                rx.text("ID", font_weight="bold"),
-                                rx.text("Sender", font_weight="bold"),
-                                rx.text("Recipient", font_weight="bold"),
-                                rx.text("Subject", font_weight="bold"),
-                                rx.text("Message", font_weight="bold"),
-                                rx.text("Status", font_weight="bold"),
-                                display="flex",
-                                justify_content="space-between",
-                                padding="4",
-                                background="bg-gray-800",
-                            ),
-                            *[
-                                rx.box(
-                                    rx.text(str(message["id"])),
-                                    rx.text(message["sender"]),
-                                    rx.text(message["recipient"]),
-                                    rx.text(message["subject"]),
-                                    rx.text(message["message"]),
-                                    rx.text(message["status"]),
-                                    display="flex",
-                                    justify_content="space-between",
-                                    padding="4",
-                                    border_bottom="1px solid gray",
-                                )
-                                for message in messages_data
-                            ],
-                            width="100%",
-                            background="bg-gray-700",
-                            color="text-white",
-                        ),
-                        rx.text("No data available", padding="4"),  # Si no hay datos, mostrar un mensaje
-                    ),
-                    padding="4",
-                ),
-                width="100%",
-            ),
-            height="100vh",
-        ),
-        background="bg-gray-900",
-        color="text-white",
-    )
+    return admin_table_page("messages", "Messages", default_stats, title="Messages")
 
 # Página de Configuración
 def settings_page():
-    # Datos predeterminados en caso de que el backend no responda
     default_stats = [
         {"title": "Settings Changed", "value": "0", "icon": "settings"},
         {"title": "Pending Changes", "value": "0", "icon": "clock"},
         {"title": "Completed Changes", "value": "0", "icon": "circle_check"},
     ]
-
-    # Obtener datos del backend (o usar datos predeterminados)
-    settings_data = fetch_data()
-
-    return rx.box(
-        rx.hstack(
-            sidebar(),
-            rx.vstack(
-                header(title="Settings"),
-                rx.hstack(
-                    *[stats_card(stat["title"], stat["value"], stat["icon"]) for stat in default_stats],
-                    spacing="4",
-                    padding="4",
-                ),
-                rx.box(
-                    rx.heading("Settings Management", size="5", padding="4"),  # Tamaño ajustado a valor numérico válido
-                    rx.cond(
-                        settings_data,  # Si hay datos, mostrar la tabla
-                        rx.box(
-                            rx.box(
-                                rx.text("ID", font_weight="bold"),
-                                rx.text("Setting", font_weight="bold"),
-                                rx.text("Value", font_weight="bold"),
-                                rx.text("Status", font_weight="bold"),
-                                display="flex",
-                                justify_content="space-between",
-                                padding="4",
-                                background="bg-gray-800",
-                            ),
-                            *[
-                                rx.box(
-                                    rx.text(str(setting["id"])),
-                                    rx.text(setting["setting"]),
-                                    rx.text(setting["value"]),
-                                    rx.text(setting["status"]),
-                                    display="flex",
-                                    justify_content="space-between",
-                                    padding="4",
-                                    border_bottom="1px solid gray",
-                                )
-                                for setting in settings_data
-                            ],
-                            width="100%",
-                            background="bg-gray-700",
-                            color="text-white",
-                        ),
-                        rx.text("No data available", padding="4"),  # Si no hay datos, mostrar un mensaje
-                    ),
-                    padding="4",
-                ),
-                width="100%",
-            ),
-            height="100vh",
-        ),
-        background="bg-gray-900",
-        color="text-white",
-    )
\ No newline at end of file
+    return admin_table_page("settings", "Settings Management", default_stats, title="Settings")
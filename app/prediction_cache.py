@@ -0,0 +1,114 @@
+"""
+Caché de predicciones por contenido.
+
+La clave es un hash del texto normalizado (minúsculas y espacios colapsados,
+lo que no cambia el resultado del preprocesamiento) más la versión del
+conjunto de modelos. Hay una capa LRU en memoria y, opcionalmente, una capa
+SQLite en disco compartida entre procesos y reinicios.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+def normalize_text(text):
+    return " ".join(text.lower().split())
+
+
+def cache_key(text, version):
+    return hashlib.sha256(f"{version}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class PredictionCache:
+    """LRU en memoria con una capa SQLite opcional detrás."""
+
+    def __init__(self, maxsize=100_000, db_path=None):
+        self.maxsize = maxsize
+        self.db_path = db_path
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS prediction_cache ("
+                "key TEXT PRIMARY KEY, version TEXT NOT NULL, value TEXT NOT NULL)"
+            )
+            self._db.commit()
+
+    def get_many(self, keys):
+        """Devuelve {clave: resultado} para las claves que estén en caché."""
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in found:
+                    continue
+                value = self._entries.get(key)
+                if value is not None:
+                    self._entries.move_to_end(key)
+                    found[key] = value
+            missing = [key for key in dict.fromkeys(keys) if key not in found]
+            if missing and self._db is not None:
+                for key, value in self._db_get(missing).items():
+                    found[key] = value
+                    self._remember(key, value)
+                    self.disk_hits += 1
+            self.hits += len(found)
+            self.misses += len(set(keys)) - len(found)
+        return {key: dict(value) for key, value in found.items()}
+
+    def set_many(self, items, version):
+        """Guarda {clave: resultado} en memoria y, si está activa, en disco."""
+        with self._lock:
+            for key, value in items.items():
+                self._remember(key, dict(value))
+            if self._db is not None and items:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO prediction_cache (key, version, value) VALUES (?, ?, ?)",
+                    [(key, version, json.dumps(value)) for key, value in items.items()],
+                )
+                self._db.commit()
+
+    def invalidate(self, version):
+        """Vacía la capa en memoria y borra de disco las entradas de otras versiones."""
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM prediction_cache WHERE version != ?", (version,))
+                self._db.commit()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "disk": self.db_path,
+        }
+
+    def _remember(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def _db_get(self, keys):
+        found = {}
+        # SQLite limita el número de parámetros por consulta
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self._db.execute(
+                f"SELECT key, value FROM prediction_cache WHERE key IN ({placeholders})", chunk
+            )
+            for key, value in rows:
+                found[key] = json.loads(value)
+        return found
@@ -0,0 +1,124 @@
+"""
+Preprocesamiento de texto compilado.
+
+Produce exactamente la misma salida que el `preprocess_text` original de los
+notebooks (minúsculas, sin puntuación, sin stop words, lematizado), pero con
+una tabla de traducción para la puntuación, un frozenset para las stop words
+y una caché acotada de lemas por token.
+
+    python -m app.preprocessing [corpus.csv] [--text-column text]
+
+comprueba la paridad con la implementación original y mide ambas.
+"""
+import string
+from functools import lru_cache
+
+# Las palabras se repiten mucho entre textos: con 100k entradas la caché
+# cubre prácticamente todo el vocabulario de los corpus de entrenamiento
+LEMMA_CACHE_SIZE = 100_000
+
+
+def preprocess_text_reference(text, stop_words, lemmatizer):
+    """Implementación original, usada como referencia de paridad."""
+    text = text.lower()
+    text = ''.join([char for char in text if char not in string.punctuation])
+    tokens = text.split()
+    tokens = [word for word in tokens if word not in stop_words]
+    tokens = [lemmatizer.lemmatize(word) for word in tokens]
+    return ' '.join(tokens)
+
+
+class TextPreprocessor:
+    """Preprocesador reutilizable; una instancia por proceso es suficiente."""
+
+    def __init__(self, stop_words=None, lemmatizer=None, cache_size=LEMMA_CACHE_SIZE):
+        if stop_words is None:
+            from nltk.corpus import stopwords
+            stop_words = stopwords.words('english')
+        if lemmatizer is None:
+            from nltk.stem import WordNetLemmatizer
+            lemmatizer = WordNetLemmatizer()
+        self._punctuation_table = str.maketrans('', '', string.punctuation)
+        self._stop_words = frozenset(stop_words)
+        self.lemmatize = lru_cache(maxsize=cache_size)(lemmatizer.lemmatize)
+
+    def __call__(self, text):
+        stop_words = self._stop_words
+        lemmatize = self.lemmatize
+        tokens = text.lower().translate(self._punctuation_table).split()
+        return ' '.join([lemmatize(word) for word in tokens if word not in stop_words])
+
+    def preprocess_batch(self, texts):
+        """Preprocesa una lista de textos; los textos repetidos se procesan una sola vez."""
+        processed = {}
+        results = []
+        for text in texts:
+            result = processed.get(text)
+            if result is None:
+                result = processed[text] = self(text)
+            results.append(result)
+        return results
+
+    def cache_info(self):
+        return self.lemmatize.cache_info()
+
+
+def _synthetic_corpus(n_texts, seed=0):
+    import random
+
+    rng = random.Random(seed)
+    words = (
+        "I feel so sad and hopeless today , nobody cares about me . "
+        "My job is killing me ! The meeting was great ; we're happy :) "
+        "running ran runs studies studying better leaves wolves feet "
+        "can't won't don't it's he's she's they're "
+        "love hate fear anger surprise joy alone tired family friends"
+    ).split()
+    return [' '.join(rng.choice(words) for _ in range(rng.randint(5, 400))) for _ in range(n_texts)]
+
+
+def main(argv=None):
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Paridad y micro-benchmark del preprocesamiento.")
+    parser.add_argument("corpus", nargs="?", help="CSV con textos (por defecto, corpus sintético)")
+    parser.add_argument("--text-column", default="text")
+    parser.add_argument("--limit", type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    if args.corpus:
+        import pandas as pd
+        texts = pd.read_csv(args.corpus, nrows=args.limit)[args.text_column].fillna("").astype(str).tolist()
+    else:
+        texts = _synthetic_corpus(args.limit)
+
+    from nltk.corpus import stopwords
+    from nltk.stem import WordNetLemmatizer
+
+    stop_words = stopwords.words('english')
+    lemmatizer = WordNetLemmatizer()
+    preprocessor = TextPreprocessor(stop_words, lemmatizer)
+
+    start = time.perf_counter()
+    expected = [preprocess_text_reference(text, stop_words, lemmatizer) for text in texts]
+    reference_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = preprocessor.preprocess_batch(texts)
+    fast_time = time.perf_counter() - start
+
+    mismatches = [i for i, (a, b) in enumerate(zip(expected, actual)) if a != b]
+    print(f"Textos: {len(texts)}")
+    print(f"Original: {reference_time:.3f}s  Compilado: {fast_time:.3f}s  "
+          f"Aceleración: {reference_time / max(fast_time, 1e-9):.1f}x")
+    print(f"Caché de lemas: {preprocessor.cache_info()}")
+    if mismatches:
+        print(f"ERROR: {len(mismatches)} textos difieren, el primero en la posición {mismatches[0]}")
+        return 1
+    print("Paridad OK: salida idéntica")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
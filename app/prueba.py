@@ -1,89 +1,302 @@
 import os
-import pickle
+import threading
+import time
+from functools import lru_cache, wraps
 import numpy as np
-import string
 from nltk.corpus import stopwords
 from nltk.stem import WordNetLemmatizer
+from .cascade import members_from_mask, suicide_resolved, vote_resolved
+from .features import FusedTfidfFeaturizer
+from .linear_engine import LinearEnsembleEngine, is_linear
+from .metrics import MEMBER_SECONDS, STAGE_SECONDS, trace, warn
+from .model_registry import ModelRegistry, SENTIMENT_MEMBERS, SUICIDE_MEMBERS
+from .prediction_cache import PredictionCache, cache_key
+from .preprocessing import TextPreprocessor
+from .tree_engine import LatencyBudget, TreeEnsembleEngine, crossover, is_tree_ensemble, random_probe
 
-# Imprimir el directorio de trabajo actual
-print("Current working directory:", os.getcwd())
+# Los modelos y vectorizadores se cargan bajo demanda la primera vez que se usan
+registry = ModelRegistry()
 
-# Cargar los modelos entrenados y los vectorizadores
-with open('app/modelo_sentimientos_regresin_logstica.pkl', 'rb') as f:
-    sentiment_model_log_reg = pickle.load(f)
+def _una_vez(function):
+    """
+    lru_cache con un lock: si varios hilos (el micro-batcher y los de
+    /predict/batch) piden a la vez algo que no está en caché, se construye una
+    sola vez y los demás esperan a ese resultado.
+    """
+    cached = lru_cache(maxsize=None)(function)
+    lock = threading.Lock()
 
-with open('app/modelo_sentimientos_naive_bayes.pkl', 'rb') as f:
-    sentiment_model_nb = pickle.load(f)
+    @wraps(function)
+    def wrapper(*args):
+        with lock:
+            return cached(*args)
 
-with open('app/modelo_sentimientos_random_forest_random_forest.pkl', 'rb') as f:
-    sentiment_model_rf = pickle.load(f)
+    wrapper.cache_clear = cached.cache_clear
+    return wrapper
 
-with open('app/modelo_sentimientos_xgboost_xgboost.pkl', 'rb') as f:
-    sentiment_model_xgb = pickle.load(f)
+@_una_vez
+def featurizer():
+    """Vectorizador fusionado: tokeniza una vez para los dos modelos TF-IDF."""
+    return FusedTfidfFeaturizer(registry.get("tfidf_sentiment"), registry.get("tfidf_suicide"))
 
-with open('app/modelo_depresion_regresin_logstica.pkl', 'rb') as f:
-    suicide_model_log_reg = pickle.load(f)
+@_una_vez
+def linear_engine(miembros):
+    """Motor que puntúa de una vez los miembros lineales (LR y NB) de una tarea."""
+    return LinearEnsembleEngine([
+        (nombre, modelo) for nombre, modelo in registry.members(miembros) if is_linear(modelo)
+    ])
 
-with open('app/modelo_depresion_naive_bayes.pkl', 'rb') as f:
-    suicide_model_nb = pickle.load(f)
+@_una_vez
+def tree_engine(nombre, n_features):
+    """
+    Versión aplanada de un random forest o XGBoost. Solo se usa si reproduce
+    las probabilidades del estimador original; si no, devuelve None.
+    `motor.max_rows` es el mayor lote en el que se usa.
+    """
+    modelo = registry.get(nombre)
+    try:
+        motor = TreeEnsembleEngine.compile(modelo)
+    except (TypeError, KeyError, ValueError, ImportError) as e:
+        warn(f"no se pudo compilar '{nombre}', se usa el estimador original: {e}", member=nombre)
+        return None
+    if not motor.verify(modelo, random_probe(n_features)):
+        warn(f"'{nombre}' compilado no coincide con el original, se usa el estimador original", member=nombre)
+        return None
+    motor.max_rows = TREE_ENGINE_MAX_ROWS or crossover(motor, modelo, n_features)
+    return motor
 
-with open('app/modelo_depresion_random_forest_random_forest.pkl', 'rb') as f:
-    suicide_model_rf = pickle.load(f)
+# Presupuesto de latencia por lote en milisegundos (desactivado si no se define).
+# Si se supera, se omiten los miembros más caros del ensemble.
+presupuesto = LatencyBudget(float(os.getenv("INFERENCE_LATENCY_BUDGET_MS", "0")) or None)
 
-with open('app/modelo_depresion_xgboost_xgboost.pkl', 'rb') as f:
-    suicide_model_xgb = pickle.load(f)
+# Filas por lote hasta las que los árboles se evalúan con el motor aplanado;
+# en lotes mayores los estimadores originales son más rápidos. Sin definir (o
+# 0), el corte se mide para cada modelo al compilarlo.
+TREE_ENGINE_MAX_ROWS = int(os.getenv("TREE_ENGINE_MAX_ROWS", "0"))
 
-with open('app/tfidf_vectorizador_sentimientos.pkl', 'rb') as f:
-    tfidf_vectorizer_sentiment = pickle.load(f)
-
-with open('app/tfidf_vectorizador_depresion.pkl', 'rb') as f:
-    tfidf_vectorizer_suicide = pickle.load(f)
+def _evaluar(nombre, modelo, X, metodo):
+    # Los lineales se resuelven aparte; aquí se evalúan los árboles por su motor
+    if is_tree_ensemble(modelo):
+        motor = tree_engine(nombre, X.shape[1])
+        if motor is not None and X.shape[0] <= motor.max_rows:
+            modelo = motor
+    with MEMBER_SECONDS.time(member=nombre):
+        return presupuesto.timed(nombre, X.shape[0], getattr(modelo, metodo), X)
 
 stop_words_english = stopwords.words('english')
 lemmatizer = WordNetLemmatizer()
+preprocessor = TextPreprocessor(stop_words_english, lemmatizer)
 
 def preprocess_text(text):
-    text = text.lower()
-    text = ''.join([char for char in text if char not in string.punctuation])
-    tokens = text.split()
-    tokens = [word for word in tokens if word not in stop_words_english]
-    tokens = [lemmatizer.lemmatize(word) for word in tokens]
-    return ' '.join(tokens)
-
-def probar_prediccion(texto_entrada):
-    # Preprocesar el texto de entrada
-    texto_procesado = preprocess_text(texto_entrada)
-    
-    # Vectorizar el texto
-    texto_vectorizado_sentiment = tfidf_vectorizer_sentiment.transform([texto_procesado])
-    texto_vectorizado_suicide = tfidf_vectorizer_suicide.transform([texto_procesado])
-    
-    # Realizar las predicciones con todos los modelos de suicidio excepto SVM
-    probabilidades_suicidio = []
-    for modelo in [suicide_model_log_reg, suicide_model_nb, suicide_model_rf, suicide_model_xgb]:
-        probabilidad = modelo.predict_proba(texto_vectorizado_suicide)
-        probabilidades_suicidio.append(probabilidad[0])
-    
-    probabilidad_promedio_suicidio = np.mean(probabilidades_suicidio, axis=0)
-    
-    umbral = 0.5
-    prediccion_suicidio = "suicidio" if probabilidad_promedio_suicidio[1] >= umbral else "no suicidio"
-    
-    # Realizar las predicciones con todos los modelos de emociones excepto SVM
-    emociones_predichas = []
-    for modelo in [sentiment_model_log_reg, sentiment_model_nb, sentiment_model_rf, sentiment_model_xgb]:
-        emocion_predicha = modelo.predict(texto_vectorizado_sentiment)[0]
-        emociones_predichas.append(emocion_predicha)
-    
-    emocion_final = max(set(emociones_predichas), key=emociones_predichas.count)
-    emociones = ["Tristeza", "Alegría", "Amor", "Enojo", "Miedo", "Sorpresa"]
-    emocion_texto = emociones[emocion_final]
-    
-    return {
-        "prediccion_suicidio": prediccion_suicidio,
-        "probabilidad_suicidio": probabilidad_promedio_suicidio[1],
-        "emocion": emocion_texto
+    return preprocessor(text)
+
+emociones = ["Tristeza", "Alegría", "Amor", "Enojo", "Miedo", "Sorpresa"]
+umbral = 0.5
+
+# Bits de la máscara de miembros evaluados de cada resultado
+MIEMBROS = SUICIDE_MEMBERS + SENTIMENT_MEMBERS
+BIT_MIEMBRO = {nombre: 1 << i for i, nombre in enumerate(MIEMBROS)}
+
+# Modo por defecto: exacto (todos los miembros). INFERENCE_EXACT=0 activa la
+# cascada con salida anticipada: mismas decisiones, pero `probabilidad_suicidio`
+# puede ser la media de solo parte de los miembros (ver app.cascade)
+INFERENCE_EXACT = os.getenv("INFERENCE_EXACT", "1") != "0"
+
+def _por_coste(miembros, lineales):
+    # Los lineales ya están calculados juntos; el resto, del más barato al más caro según lo medido
+    return sorted(miembros, key=lambda miembro: (miembro[0] not in lineales, presupuesto.cost_per_row.get(miembro[0], 0.0)))
+
+def puntuar_textos_procesados(textos_procesados, exacto=True, con_miembros=False):
+    """
+    Evalúa el ensemble sobre textos ya preprocesados y devuelve dos arrays:
+    la probabilidad promedio de suicidio y el índice de la emoción votada.
+    Con `exacto=False` evalúa en cascada (ver app.cascade). Con
+    `con_miembros=True` devuelve además una máscara por fila con los miembros
+    evaluados (bits de BIT_MIEMBRO).
+    """
+    n = len(textos_procesados)
+    if n == 0:
+        vacio = (np.zeros(0), np.zeros(0, dtype=np.intp))
+        return vacio + (np.zeros(0, dtype=np.int64),) if con_miembros else vacio
+
+    # Vectorizar todos los textos con una sola tokenización para ambos vectorizadores
+    with STAGE_SECONDS.time(stage="vectorize"):
+        textos_vectorizados_sentiment, textos_vectorizados_suicide = featurizer().transform(textos_procesados)
+
+    miembros = presupuesto.select({
+        "suicide": registry.members(SUICIDE_MEMBERS),
+        "sentiment": registry.members(SENTIMENT_MEMBERS),
+    }, n)
+    mascaras = np.zeros(n, dtype=np.int64)
+
+    # Cada modelo de suicidio se evalúa una sola vez para todo el lote; los
+    # miembros lineales comparten un solo producto matricial y los que no
+    # estén en disco se omiten del promedio
+    inicio = time.perf_counter()
+    with MEMBER_SECONDS.time(member="linear_suicide"):
+        lineales = linear_engine(tuple(SUICIDE_MEMBERS)).predict_proba(textos_vectorizados_suicide)
+    if exacto:
+        probabilidades_suicidio = [
+            lineales[nombre] if nombre in lineales else _evaluar(nombre, modelo, textos_vectorizados_suicide, "predict_proba")
+            for nombre, modelo in miembros["suicide"]
+        ]
+        probabilidad_promedio_suicidio = np.mean(probabilidades_suicidio, axis=0)[:, 1]
+        for nombre, _ in miembros["suicide"]:
+            mascaras |= BIT_MIEMBRO[nombre]
+    else:
+        orden = _por_coste(miembros["suicide"], lineales)
+        suma = np.zeros(n)
+        evaluados = np.zeros(n, dtype=np.int64)
+        activas = np.arange(n)
+        for k, (nombre, modelo) in enumerate(orden):
+            if k > 0:
+                activas = activas[~suicide_resolved(suma[activas], len(orden) - k, len(orden), umbral)]
+                if len(activas) == 0:
+                    break
+            if nombre in lineales:
+                probabilidades = lineales[nombre][activas]
+            else:
+                probabilidades = _evaluar(nombre, modelo, textos_vectorizados_suicide[activas], "predict_proba")
+            suma[activas] += probabilidades[:, 1]
+            evaluados[activas] += 1
+            mascaras[activas] |= BIT_MIEMBRO[nombre]
+        # Media de los miembros evaluados en cada fila
+        probabilidad_promedio_suicidio = suma / evaluados
+
+    # Tiempos por tarea (incluyen los de sus miembros)
+    STAGE_SECONDS.observe(time.perf_counter() - inicio, stage="suicide_average")
+    inicio = time.perf_counter()
+
+    # Voto mayoritario entre los modelos de emociones. argmax devuelve la
+    # primera emoción con más votos, igual que max(set(votos), key=votos.count)
+    votos = np.zeros((n, len(emociones)), dtype=np.int64)
+    with MEMBER_SECONDS.time(member="linear_sentiment"):
+        lineales = linear_engine(tuple(SENTIMENT_MEMBERS)).predict(textos_vectorizados_sentiment)
+    orden = miembros["sentiment"] if exacto else _por_coste(miembros["sentiment"], lineales)
+    activas = np.arange(n)
+    for k, (nombre, modelo) in enumerate(orden):
+        if not exacto and k > 0:
+            activas = activas[~vote_resolved(votos[activas], len(orden) - k)]
+            if len(activas) == 0:
+                break
+        if nombre in lineales:
+            predicciones = lineales[nombre][activas]
+        else:
+            predicciones = _evaluar(nombre, modelo, textos_vectorizados_sentiment[activas], "predict")
+        votos[activas, predicciones.astype(np.intp)] += 1
+        mascaras[activas] |= BIT_MIEMBRO[nombre]
+
+    indices_emocion = votos.argmax(axis=1)
+    STAGE_SECONDS.observe(time.perf_counter() - inicio, stage="vote")
+
+    if con_miembros:
+        return probabilidad_promedio_suicidio, indices_emocion, mascaras
+    return probabilidad_promedio_suicidio, indices_emocion
+
+def puntuar_textos(textos, exacto=True):
+    """
+    Preprocesa y puntúa textos sin procesar; es lo que ejecuta cada worker del
+    pool. Devuelve (probabilidades, índices de emoción, máscaras de miembros).
+    """
+    with STAGE_SECONDS.time(stage="preprocess"):
+        textos_procesados = preprocessor.preprocess_batch(textos)
+    return puntuar_textos_procesados(textos_procesados, exacto, con_miembros=True)
+
+def calentar_modelos():
+    """
+    Carga artefactos, vectorizadores y motores al arrancar la API (antes de
+    crear los workers del pool, si lo hay), para que la compilación y la
+    medida del corte no caigan en la primera petición. Se puntúa en modo
+    exacto para compilar (y medir) todos los motores.
+    """
+    version_modelos()
+    puntuar_textos(["warm up"], exacto=True)
+
+def formatear_resultado(probabilidad_suicidio, indice_emocion, mascara=None):
+    resultado = {
+        "prediccion_suicidio": "suicidio" if probabilidad_suicidio >= umbral else "no suicidio",
+        "probabilidad_suicidio": float(probabilidad_suicidio),
+        "emocion": emociones[indice_emocion]
     }
+    if mascara is not None:
+        resultado["miembros"] = members_from_mask(int(mascara), MIEMBROS)
+    return resultado
+
+# Caché de resultados por contenido. PREDICTION_CACHE_DB activa además la capa
+# en disco (p. ej. ./prediction_cache.db, junto a test.db)
+cache = PredictionCache(
+    maxsize=int(os.getenv("PREDICTION_CACHE_SIZE", "100000")),
+    db_path=os.getenv("PREDICTION_CACHE_DB") or None,
+)
+_version_modelos = {"valor": None, "comprobada": 0.0}
+
+def version_modelos():
+    """
+    Versión del conjunto de artefactos, revisada como mucho una vez por segundo.
+    Si algún pickle cambió, se descartan los modelos cargados y la caché.
+    """
+    ahora = time.monotonic()
+    if _version_modelos["valor"] is None or ahora - _version_modelos["comprobada"] >= 1.0:
+        version = registry.version()
+        if version != _version_modelos["valor"]:
+            if _version_modelos["valor"] is not None:
+                registry.reset()
+                featurizer.cache_clear()
+                linear_engine.cache_clear()
+                tree_engine.cache_clear()
+            cache.invalidate(version)
+            _version_modelos["valor"] = version
+        _version_modelos["comprobada"] = ahora
+    return _version_modelos["valor"]
+
+def probar_prediccion_lote(textos_entrada, progreso=None, puntuar=None, exacto=None):
+    """
+    Predice suicidio y emoción para una lista de textos en una sola pasada.
+    `progreso`, si se indica, se llama con la etapa ("preprocessing", "scoring")
+    al empezarla; los textos que ya estaban en caché no pasan por ninguna.
+    `puntuar` sustituye a `puntuar_textos` (p. ej. el pool de procesos), que
+    hace ambas etapas de una vez. `exacto` elige el modo (por defecto
+    INFERENCE_EXACT); cada resultado lista en "miembros" los que se evaluaron.
+    """
+    exacto = INFERENCE_EXACT if exacto is None else exacto
+    with trace("prediction_batch", size=len(textos_entrada), exact=exacto):
+        return _prediccion_lote(textos_entrada, progreso, puntuar, exacto)
+
+
+def _prediccion_lote(textos_entrada, progreso, puntuar, exacto):
+    version = version_modelos()
+    # Los resultados en cascada y los exactos se guardan por separado en la caché
+    claves = [cache_key(texto, version if exacto else f"{version}/cascada") for texto in textos_entrada]
+    resultados = cache.get_many(claves)
+
+    # Solo se puntúan los textos que no estaban en caché, una vez cada uno
+    pendientes = {}
+    for clave, texto in zip(claves, textos_entrada):
+        if clave not in resultados:
+            pendientes.setdefault(clave, texto)
+    if pendientes:
+        if progreso is not None:
+            progreso("preprocessing")
+        if puntuar is not None:
+            with STAGE_SECONDS.time(stage="score"):
+                probabilidades, indices_emocion, mascaras = puntuar(list(pendientes.values()), exacto)
+        else:
+            with STAGE_SECONDS.time(stage="preprocess"):
+                textos_procesados = preprocessor.preprocess_batch(list(pendientes.values()))
+            if progreso is not None:
+                progreso("scoring")
+            probabilidades, indices_emocion, mascaras = puntuar_textos_procesados(textos_procesados, exacto, con_miembros=True)
+        nuevos = {
+            clave: formatear_resultado(probabilidad, indice, mascara)
+            for clave, probabilidad, indice, mascara in zip(pendientes, probabilidades, indices_emocion, mascaras)
+        }
+        cache.set_many(nuevos, version)
+        resultados.update(nuevos)
+
+    return [dict(resultados[clave]) for clave in claves]
+
+def probar_prediccion(texto_entrada, exacto=None):
+    return probar_prediccion_lote([texto_entrada], exacto=exacto)[0]
 
 # Prueba con un texto de ejemplo en inglés
 if __name__ == "__main__":
@@ -0,0 +1,142 @@
+"""
+Puntúa un corpus completo (CSV o Parquet) con el ensemble de modelos.
+
+Uso (desde la raíz del repositorio):
+
+    python -m app.score_corpus posts.csv resultados.csv --text-column text --chunk-size 5000
+
+El archivo se procesa por bloques de tamaño fijo y cada bloque se escribe en
+la salida en cuanto está listo, de modo que la memoria no crece con el tamaño
+de la entrada. La salida puede ser .csv, .ndjson/.jsonl o .parquet.
+"""
+import argparse
+import os
+import sys
+
+import pandas as pd
+
+from .prueba import emociones, preprocessor, puntuar_textos_procesados, umbral
+
+
+def iter_chunks(path, chunk_size):
+    """Lee el archivo de entrada por bloques de `chunk_size` filas."""
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        # Todo como texto: pandas infiere los tipos de cada bloque por separado
+        # (una columna vacía sale float64 y un entero con huecos también), y el
+        # esquema de la salida Parquet se fija con el primer bloque
+        yield from pd.read_csv(path, chunksize=chunk_size, dtype=str)
+
+
+def score_chunk(chunk, text_column):
+    """Añade al bloque las columnas de predicción."""
+    textos_procesados = preprocessor.preprocess_batch(chunk[text_column].fillna("").astype(str).tolist())
+    probabilidades, indices_emocion = puntuar_textos_procesados(textos_procesados)
+    chunk = chunk.copy()
+    chunk["suicide_probability"] = probabilidades
+    chunk["result"] = pd.Series(probabilidades >= umbral, index=chunk.index).map(
+        {True: "suicidio", False: "no suicidio"}
+    )
+    chunk["emotion"] = pd.Categorical.from_codes(indices_emocion, categories=emociones).astype(str)
+    return chunk
+
+
+def _parquet_schema(table):
+    # Una columna vacía en el primer bloque se infiere como null; se escribe como
+    # texto, que es el tipo con el que se leen todas las columnas de un CSV
+    import pyarrow as pa
+
+    for i, field in enumerate(table.schema):
+        if pa.types.is_null(field.type):
+            table = table.set_column(i, field.with_type(pa.string()), table.column(i).cast(pa.string()))
+    return table.schema
+
+
+def output_schema(input_path):
+    """Esquema de Arrow de la salida si la entrada es Parquet; None si no se conoce de antemano."""
+    if not input_path.endswith(".parquet"):
+        return None
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pq.ParquetFile(input_path).schema_arrow
+    for name, type_ in (("suicide_probability", pa.float64()), ("result", pa.string()), ("emotion", pa.string())):
+        if name in schema.names:
+            schema = schema.remove(schema.get_field_index(name))
+        schema = schema.append(pa.field(name, type_))
+    return schema
+
+
+class ChunkWriter:
+    """
+    Escribe bloques de forma incremental en CSV, NDJSON o Parquet. En Parquet
+    todos los bloques se convierten al mismo esquema: `schema` o, si no se
+    indica, el del primer bloque.
+    """
+
+    def __init__(self, path, schema=None):
+        self.path = path
+        self.schema = schema
+        self._first = True
+        self._parquet_writer = None
+
+    def write(self, chunk):
+        if self.path.endswith(".parquet"):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            if self.schema is None:
+                self.schema = _parquet_schema(pa.Table.from_pandas(chunk, preserve_index=False))
+            table = pa.Table.from_pandas(chunk, schema=self.schema, preserve_index=False)
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self.path, self.schema)
+            self._parquet_writer.write_table(table)
+        elif self.path.endswith((".ndjson", ".jsonl")):
+            # Según la versión de pandas, lines=True termina o no en salto de línea
+            lines = chunk.to_json(orient="records", lines=True, force_ascii=False, date_format="iso")
+            with open(self.path, "w" if self._first else "a", encoding="utf-8") as f:
+                f.write(lines if not lines or lines.endswith("\n") else lines + "\n")
+        else:
+            chunk.to_csv(self.path, mode="w" if self._first else "a", header=self._first, index=False)
+        self._first = False
+
+    def close(self):
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+
+
+def score_file(input_path, output_path, text_column="text", chunk_size=5000):
+    """Puntúa `input_path` y escribe el resultado en `output_path`. Devuelve el número de filas."""
+    writer = ChunkWriter(output_path, output_schema(input_path))
+    total = 0
+    try:
+        for chunk in iter_chunks(input_path, chunk_size):
+            if text_column not in chunk.columns:
+                raise KeyError(f"La columna '{text_column}' no existe en {input_path}")
+            writer.write(score_chunk(chunk, text_column))
+            total += len(chunk)
+            print(f"{total} filas procesadas", file=sys.stderr)
+    finally:
+        writer.close()
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Puntúa un corpus CSV/Parquet con el ensemble de modelos.")
+    parser.add_argument("input", help="Archivo de entrada (.csv o .parquet)")
+    parser.add_argument("output", help="Archivo de salida (.csv, .ndjson, .jsonl o .parquet)")
+    parser.add_argument("--text-column", default="text", help="Columna con el texto a puntuar")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Filas por bloque")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.input):
+        parser.error(f"No existe el archivo {args.input}")
+    score_file(args.input, args.output, args.text_column, args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
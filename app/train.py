@@ -0,0 +1,409 @@
+"""
+Entrenamiento reproducible del ensemble, en sustitución de los notebooks.
+
+Para cada tarea (depresión/suicidio y emociones) repite lo que hacían
+`notebook_depresion.ipynb` y `notebook_sentimientos.ipynb`: muestra de
+filas con random_state=42, el mismo preprocesamiento, TF-IDF de 5000
+términos ajustado sobre la muestra, etiquetas con LabelEncoder, partición
+80/20 estratificada y los mismos hiperparámetros. Cambia cómo se ejecuta:
+
+  - el preprocesamiento se reparte entre procesos y se guarda en caché;
+  - la matriz TF-IDF se guarda como CSR en .npy (filas de entrenamiento
+    primero) y se abre con mmap: las particiones son vistas sin copia y
+    todos los procesos comparten las mismas páginas;
+  - los miembros se ajustan en paralelo, cada uno en un proceso, y cada
+    modelo ajustado queda en caché con una clave de los datos y sus
+    hiperparámetros. Si solo cambia el conjunto de miembros (o los
+    parámetros de alguno) solo se ajustan los que faltan.
+
+Cada ejecución escribe una versión nueva con los mismos nombres de archivo
+que carga `app.model_registry`, un manifest.json (datos, parámetros,
+exactitud en la partición de prueba, versiones de las librerías) y apunta
+el enlace `current` a ella:
+
+    python -m app.train --suicide-data Suicide_Detection.csv --sentiment-data emotions.csv
+    MODEL_ARTIFACTS_DIR=app/trained/current uvicorn api.main:app
+
+Una tarea sin datos copia sus artefactos de `--base` (por defecto la versión
+actual, o los artefactos de app/).
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import pickle
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import numpy as np
+import scipy.sparse as sp
+
+from .model_registry import ARTIFACTS, ARTIFACTS_DIR, SENTIMENT_MEMBERS, SUICIDE_MEMBERS, _source_signature
+
+TRAINED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "trained")
+CACHE_DIR = os.getenv("TRAIN_CACHE_DIR", "./.train_cache")
+
+TASKS = {
+    "suicide": {
+        "vectorizer": "tfidf_suicide", "members": SUICIDE_MEMBERS,
+        "text_column": "text", "label_column": "class", "sample": 120_000,
+    },
+    "sentiment": {
+        "vectorizer": "tfidf_sentiment", "members": SENTIMENT_MEMBERS,
+        "text_column": "text", "label_column": "label", "sample": 40_000,
+    },
+}
+TFIDF_PARAMS = {"max_features": 5000}
+TEST_SIZE = 0.2
+SEED = 42
+# Textos por tarea del pool de preprocesamiento
+PREPROCESS_CHUNK = 2000
+
+
+def _estimator(kind, n_jobs):
+    """Miembros con los hiperparámetros de los notebooks."""
+    if kind == "log_reg":
+        from sklearn.linear_model import LogisticRegression
+
+        return LogisticRegression(max_iter=1000)
+    if kind == "nb":
+        from sklearn.naive_bayes import MultinomialNB
+
+        return MultinomialNB()
+    if kind == "rf":
+        from sklearn.ensemble import RandomForestClassifier
+
+        return RandomForestClassifier(n_estimators=200, max_depth=10, min_samples_split=5,
+                                      min_samples_leaf=2, random_state=SEED, n_jobs=n_jobs)
+    if kind == "xgb":
+        import xgboost
+
+        return xgboost.XGBClassifier(max_depth=6, learning_rate=0.1, n_estimators=100,
+                                     eval_metric="logloss", n_jobs=n_jobs)
+    raise ValueError(f"Miembro desconocido: {kind}")
+
+
+# n_jobs con el que se guarda cada miembro, como en los notebooks
+SERVING_N_JOBS = {"rf": -1, "xgb": None}
+
+
+def _kind(member):
+    return member.split("_", 1)[1]
+
+
+def _key(*parts):
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def _libraries():
+    import scipy
+    import sklearn
+
+    versions = {"numpy": np.__version__, "scipy": scipy.__version__, "scikit-learn": sklearn.__version__}
+    try:
+        import xgboost
+
+        versions["xgboost"] = xgboost.__version__
+    except ImportError:
+        pass
+    return versions
+
+
+def _member_params(member):
+    params = _estimator(_kind(member), None).get_params()
+    params.pop("n_jobs", None)
+    return params
+
+
+# --- Preprocesamiento en paralelo ---
+
+_preprocessor = None
+
+
+def _init_preprocessor():
+    global _preprocessor
+    from .preprocessing import TextPreprocessor
+
+    _preprocessor = TextPreprocessor()
+
+
+def _preprocess_chunk(texts):
+    return _preprocessor.preprocess_batch(texts)
+
+
+def preprocess_parallel(texts, jobs):
+    """Preprocesa `texts` con `jobs` procesos, conservando el orden."""
+    chunks = [texts[i:i + PREPROCESS_CHUNK] for i in range(0, len(texts), PREPROCESS_CHUNK)]
+    if jobs <= 1 or len(chunks) <= 1:
+        _init_preprocessor()
+        return [document for chunk in chunks for document in _preprocess_chunk(chunk)]
+    with multiprocessing.Pool(min(jobs, len(chunks)), initializer=_init_preprocessor) as pool:
+        return [document for chunk in pool.imap(_preprocess_chunk, chunks) for document in chunk]
+
+
+def _read_dataset(task, path, sample):
+    import pandas as pd
+
+    spec = TASKS[task]
+    data = pd.read_csv(path, usecols=[spec["text_column"], spec["label_column"]])
+    data = data.dropna(subset=[spec["label_column"]])
+    if sample and len(data) > sample:
+        data = data.sample(n=sample, random_state=SEED)
+    return data[spec["text_column"]].fillna("").astype(str).tolist(), data[spec["label_column"]].tolist()
+
+
+def load_documents(task, path, sample, jobs, cache_dir):
+    """(documentos preprocesados, etiquetas) de la muestra, desde la caché si existe."""
+    key = _key(task, os.path.abspath(path), _source_signature(path), sample, SEED, TASKS[task])
+    target = os.path.join(cache_dir, f"documents-{task}-{key}.pkl")
+    if os.path.exists(target):
+        with open(target, "rb") as f:
+            return key, *pickle.load(f)
+    texts, labels = _read_dataset(task, path, sample)
+    start = time.perf_counter()
+    documents = preprocess_parallel(texts, jobs)
+    print(f"{task}: {len(documents)} textos preprocesados en {time.perf_counter() - start:.1f}s con {jobs} procesos")
+    _write_pickle(target, (documents, labels))
+    return key, documents, labels
+
+
+def _write_pickle(path, obj):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f"{path}.tmp-{os.getpid()}"
+    with open(temporary, "wb") as f:
+        pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary, path)
+
+
+# --- Matriz TF-IDF en caché ---
+
+class TrainingSet:
+    """Matriz TF-IDF mapeada en memoria con las filas de entrenamiento primero."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, "manifest.json")) as f:
+            self.manifest = json.load(f)
+        data, indices, indptr, self.labels = (
+            np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+            for name in ("data", "indices", "indptr", "labels")
+        )
+        self._arrays = data, indices, indptr
+
+    @property
+    def n_train(self):
+        return self.manifest["n_train"]
+
+    def vectorizer(self):
+        with open(os.path.join(self.directory, "vectorizer.pkl"), "rb") as f:
+            return pickle.load(f)
+
+    def split(self, part):
+        """(X, y) de "train" o "test"; las filas de entrenamiento no se copian."""
+        data, indices, indptr = self._arrays
+        n_rows, n_features = self.manifest["shape"]
+        start, stop = (0, self.n_train) if part == "train" else (self.n_train, n_rows)
+        first, last = int(indptr[start]), int(indptr[stop])
+        rows = indptr[start:stop + 1] if start == 0 else indptr[start:stop + 1] - first
+        X = sp.csr_matrix((data[first:last], indices[first:last], rows), shape=(stop - start, n_features), copy=False)
+        return X, self.labels[start:stop]
+
+    @classmethod
+    def build(cls, directory, documents, labels):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.model_selection import train_test_split
+        from sklearn.preprocessing import LabelEncoder
+
+        encoder = LabelEncoder()
+        y = encoder.fit_transform(labels)
+        train, test = train_test_split(np.arange(len(y)), test_size=TEST_SIZE, random_state=SEED, stratify=y)
+        # Como en los notebooks, el vectorizador se ajusta con toda la muestra
+        vectorizer = TfidfVectorizer(**TFIDF_PARAMS)
+        X = vectorizer.fit_transform(documents)
+        order = np.concatenate([train, test])
+        X = X[order].tocsr()
+        X.sort_indices()
+
+        temporary = f"{directory}.tmp-{os.getpid()}"
+        shutil.rmtree(temporary, ignore_errors=True)
+        os.makedirs(temporary)
+        for name, array in (("data", X.data), ("indices", X.indices), ("indptr", X.indptr), ("labels", y[order])):
+            np.save(os.path.join(temporary, f"{name}.npy"), array)
+        with open(os.path.join(temporary, "vectorizer.pkl"), "wb") as f:
+            pickle.dump(vectorizer, f, protocol=pickle.HIGHEST_PROTOCOL)
+        with open(os.path.join(temporary, "manifest.json"), "w") as f:
+            json.dump({"shape": list(X.shape), "n_train": len(train), "classes": encoder.classes_.tolist()}, f,
+                      default=str)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(temporary, directory)
+        return cls(directory)
+
+
+def load_training_set(task, documents_key, documents, labels, cache_dir):
+    key = _key(documents_key, TFIDF_PARAMS, TEST_SIZE, SEED, _libraries()["scikit-learn"])
+    directory = os.path.join(cache_dir, f"tfidf-{task}-{key}")
+    if os.path.exists(os.path.join(directory, "manifest.json")):
+        return key, TrainingSet(directory)
+    start = time.perf_counter()
+    training_set = TrainingSet.build(directory, documents, labels)
+    print(f"{task}: TF-IDF {tuple(training_set.manifest['shape'])} en {time.perf_counter() - start:.1f}s")
+    return key, training_set
+
+
+# --- Ajuste de los miembros ---
+
+def fit_member(member, directory, target, n_jobs):
+    """Ajusta un miembro con el TrainingSet de `directory` y lo guarda en `target`. Se ejecuta en un proceso aparte."""
+    from sklearn.metrics import accuracy_score
+
+    training_set = TrainingSet(directory)
+    X_train, y_train = training_set.split("train")
+    X_test, y_test = training_set.split("test")
+    estimator = _estimator(_kind(member), n_jobs)
+    start = time.perf_counter()
+    estimator.fit(X_train, y_train)
+    seconds = time.perf_counter() - start
+    accuracy = float(accuracy_score(y_test, estimator.predict(X_test)))
+    if _kind(member) in SERVING_N_JOBS:
+        estimator.set_params(n_jobs=SERVING_N_JOBS[_kind(member)])
+    _write_pickle(target, estimator)
+    with open(f"{target}.json", "w") as f:
+        json.dump({"accuracy": accuracy, "fit_seconds": seconds}, f)
+    return member, accuracy, seconds
+
+
+def fit_members(jobs_to_run, jobs):
+    """`jobs_to_run` es [(miembro, directorio, destino)]. Devuelve {miembro: (exactitud, segundos)}."""
+    if not jobs_to_run:
+        return {}
+    workers = max(1, min(jobs, len(jobs_to_run)))
+    # Los hilos de random forest y XGBoost se reparten entre los procesos
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    # Los más caros primero, para que no queden solos al final
+    cost = {"rf": 0, "xgb": 1, "log_reg": 2, "nb": 3}
+    ordered = sorted(jobs_to_run, key=lambda job: cost.get(_kind(job[0]), 0))
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(fit_member, member, directory, target, threads) for member, directory, target in ordered]
+        for future in as_completed(futures):
+            member, accuracy, seconds = future.result()
+            print(f"    {member}: exactitud {accuracy:.4f}  ajuste {seconds:.1f}s")
+            results[member] = (accuracy, seconds)
+    return results
+
+
+def _default_base(output):
+    current = os.path.join(output, "current")
+    return current if os.path.isdir(current) else ARTIFACTS_DIR
+
+
+def _update_current(output, version):
+    link = os.path.join(output, "current")
+    temporary = f"{link}.tmp-{os.getpid()}"
+    try:
+        os.symlink(version, temporary)
+        os.replace(temporary, link)
+    except OSError as e:
+        print(f"Aviso: no se pudo actualizar {link}: {e}")
+
+
+def train(datasets, output=TRAINED_DIR, members=None, jobs=None, cache_dir=CACHE_DIR, base=None, sample=None):
+    """
+    Entrena las tareas de `datasets` ({tarea: csv}) y escribe una versión
+    nueva en `output`. `members` limita los miembros (por defecto todos);
+    `sample` sustituye al tamaño de muestra de los notebooks. Devuelve el
+    directorio de la versión.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    base = base or _default_base(output)
+    version = datetime.now().strftime("%Y%m%d-%H%M%S")
+    target = os.path.join(output, version)
+    temporary = os.path.join(output, f".{version}.tmp")
+    shutil.rmtree(temporary, ignore_errors=True)
+    os.makedirs(temporary)
+
+    manifest = {"version": version, "created": datetime.now().isoformat(timespec="seconds"),
+                "libraries": _libraries(), "tasks": {}}
+    pending, selected = [], {}
+    for task, spec in TASKS.items():
+        path = datasets.get(task)
+        if not path:
+            copied = []
+            for name in [spec["vectorizer"], *spec["members"]]:
+                source = os.path.join(base, ARTIFACTS[name])
+                if os.path.exists(source):
+                    shutil.copyfile(source, os.path.join(temporary, ARTIFACTS[name]))
+                    copied.append(name)
+            manifest["tasks"][task] = {"copied_from": os.path.realpath(base), "artifacts": copied}
+            continue
+
+        documents_key, documents, labels = load_documents(task, path, sample or spec["sample"], jobs, cache_dir)
+        matrix_key, training_set = load_training_set(task, documents_key, documents, labels, cache_dir)
+        del documents, labels
+        shutil.copyfile(os.path.join(training_set.directory, "vectorizer.pkl"),
+                        os.path.join(temporary, ARTIFACTS[spec["vectorizer"]]))
+        manifest["tasks"][task] = {
+            "dataset": {"path": os.path.abspath(path), **_source_signature(path)},
+            "rows": training_set.manifest["shape"][0], "n_train": training_set.n_train,
+            "features": training_set.manifest["shape"][1], "classes": training_set.manifest["classes"],
+            "matrix_key": matrix_key, "members": {},
+        }
+        for member in spec["members"]:
+            if members and member not in members:
+                continue
+            params = _member_params(member)
+            key = _key(matrix_key, member, params, _libraries())
+            fitted = os.path.join(cache_dir, "members", f"{member}-{key}.pkl")
+            selected[member] = (task, fitted, params, key)
+            if not os.path.exists(f"{fitted}.json"):
+                pending.append((member, training_set.directory, fitted))
+
+    cached = [member for member in selected if member not in {job[0] for job in pending}]
+    print(f"Miembros: {len(pending)} por ajustar, {len(cached)} desde la caché ({', '.join(cached) or '-'})")
+    start = time.perf_counter()
+    fit_members(pending, jobs)
+    if pending:
+        print(f"Ajuste en paralelo: {time.perf_counter() - start:.1f}s con hasta {min(jobs, len(pending))} procesos")
+
+    for member, (task, fitted, params, key) in selected.items():
+        shutil.copyfile(fitted, os.path.join(temporary, ARTIFACTS[member]))
+        with open(f"{fitted}.json") as f:
+            metrics = json.load(f)
+        manifest["tasks"][task]["members"][member] = {
+            **metrics, "params": params, "key": key, "cached": member in cached,
+        }
+    with open(os.path.join(temporary, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2, default=str)
+        f.write("\n")
+    os.replace(temporary, target)
+    _update_current(output, version)
+    return target
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Entrena el ensemble y escribe una versión nueva de los artefactos.")
+    parser.add_argument("--suicide-data", help="CSV con columnas text y class (Suicide_Detection.csv)")
+    parser.add_argument("--sentiment-data", help="CSV con columnas text y label (emotions.csv)")
+    parser.add_argument("--output", default=TRAINED_DIR, help="Directorio de las versiones")
+    parser.add_argument("--members", nargs="+", choices=SUICIDE_MEMBERS + SENTIMENT_MEMBERS,
+                        help="Miembros a incluir (por defecto todos)")
+    parser.add_argument("--jobs", type=int, default=None, help="Procesos (por defecto, uno por núcleo)")
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--base", help="Versión de la que se copian las tareas sin datos")
+    parser.add_argument("--sample", type=int, help="Filas por tarea (por defecto, las de los notebooks)")
+    args = parser.parse_args(argv)
+
+    datasets = {"suicide": args.suicide_data, "sentiment": args.sentiment_data}
+    if not any(datasets.values()):
+        parser.error("indica al menos --suicide-data o --sentiment-data")
+    start = time.perf_counter()
+    target = train(datasets, args.output, args.members, args.jobs, args.cache_dir, args.base, args.sample)
+    print(f"Versión {os.path.basename(target)} en {target} ({time.perf_counter() - start:.1f}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
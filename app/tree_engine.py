@@ -0,0 +1,388 @@
+"""
+Motor de inferencia para los miembros de árboles (random forest y XGBoost).
+
+Cada ensemble se aplana en tablas de nodos contiguas (feature, umbral, hijos,
+dirección por defecto y valor de hoja) que abarcan todos sus árboles. Un lote
+se evalúa avanzando a la vez todas las parejas (fila, árbol) un nivel por
+iteración, así que el número de iteraciones es la profundidad máxima y no el
+número de árboles ni de filas. Las hojas apuntan a sí mismas, de modo que
+todas las parejas avanzan juntas sin compactar las activas en cada nivel.
+
+Cada bloque de filas se densifica en float32 (los ausentes valen 0.0 para
+sklearn y NaN, valor faltante, para XGBoost, igual que en los estimadores
+originales) y los valores se leen con un único gather por nivel. Es un
+compromiso deliberado: se abandona el recorrido que solo toca las entradas
+no nulas de la fila dispersa a cambio de un acceso indexado sin búsquedas.
+Cada bloque de 256 filas ocupa 256 × n_features × 4 bytes (5 MB con 5000
+términos), y el coste de rellenarlo crece con el ancho del vocabulario y no
+con los términos presentes, así que con lotes grandes el motor pierde. Features,
+umbrales y valores de hoja del random forest se guardan en int32 y float32
+(la mitad de memoria); los hijos siguen en intp, que numpy usa para indexar
+sin convertir. Los umbrales de sklearn (float64) se redondean hacia abajo al
+float32 anterior, que da la misma decisión `x > umbral` para todo x float32.
+
+El motor gana en lotes pequeños (la ruta de /predict); en lotes grandes los
+estimadores originales, multihilo y en C, son más rápidos. El punto de corte
+depende del modelo (con los artefactos actuales, 8 filas para el XGBoost de
+sentimientos, 32 para el de suicidio y 128 o más para el random forest), así
+que `crossover` lo mide para
+cada uno al compilarlo y `app.prueba` solo usa el motor hasta ese tamaño
+(TREE_ENGINE_MAX_ROWS lo fija a mano para todos).
+
+    python -m app.tree_engine
+
+compara los resultados con los estimadores originales y mide ambos.
+"""
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.special import expit
+
+TREE_ESTIMATORS = ("RandomForestClassifier", "ExtraTreesClassifier", "XGBClassifier")
+
+
+def is_tree_ensemble(estimator):
+    return type(estimator).__name__ in TREE_ESTIMATORS
+
+
+class TreeEnsembleEngine:
+    """Tablas de nodos de un ensemble de árboles y su recorrido por lotes."""
+
+    def __init__(self, feature, threshold, left, right, default_left, leaf_value,
+                 roots, tree_group, classes, kind, base_margin=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.default_left = default_left
+        self.leaf_value = leaf_value
+        self.roots = roots
+        self.tree_group = tree_group
+        self.classes = classes
+        self.kind = kind
+        self.base_margin = base_margin
+        self.is_leaf = left < 0
+        # Tablas del recorrido: las hojas son su propio hijo y nunca van a la derecha
+        nodes = np.arange(len(left), dtype=np.intp)
+        self.children = np.column_stack([
+            np.where(self.is_leaf, nodes, left), np.where(self.is_leaf, nodes, right),
+        ])
+        self.split = _round_down_float32(np.where(self.is_leaf, np.inf, threshold))
+        self.missing_right = (
+            np.zeros(len(left), dtype=bool) if default_left is None else ~default_left & ~self.is_leaf
+        )
+        self.depth = self._max_depth()
+
+    @classmethod
+    def compile(cls, estimator):
+        name = type(estimator).__name__
+        if name == "XGBClassifier":
+            return cls._compile_xgboost(estimator)
+        if name in ("RandomForestClassifier", "ExtraTreesClassifier"):
+            return cls._compile_forest(estimator)
+        raise TypeError(f"Estimador no soportado: {name}")
+
+    @classmethod
+    def _compile_forest(cls, forest):
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        for tree in (estimator.tree_ for estimator in forest.estimators_):
+            n_nodes = tree.node_count
+            leaf = tree.children_left < 0
+            features.append(np.where(leaf, 0, tree.feature))
+            thresholds.append(tree.threshold)
+            lefts.append(np.where(leaf, -1, tree.children_left + offset))
+            rights.append(np.where(leaf, -1, tree.children_right + offset))
+            # Distribución de clases normalizada en cada nodo, como DecisionTreeClassifier.predict_proba
+            value = tree.value[:, 0, :].astype(np.float64)
+            normalizer = value.sum(axis=1, keepdims=True)
+            normalizer[normalizer == 0.0] = 1.0
+            values.append(value / normalizer)
+            roots.append(offset)
+            offset += n_nodes
+        n_trees = len(roots)
+        return cls(
+            feature=np.concatenate(features).astype(np.int32),
+            threshold=np.concatenate(thresholds).astype(np.float64),
+            left=np.concatenate(lefts).astype(np.int64),
+            right=np.concatenate(rights).astype(np.int64),
+            default_left=None,
+            leaf_value=np.concatenate(values).astype(np.float32),
+            roots=np.asarray(roots, dtype=np.int64),
+            tree_group=np.zeros(n_trees, dtype=np.int64),
+            classes=forest.classes_,
+            kind="forest",
+        )
+
+    @classmethod
+    def _compile_xgboost(cls, classifier):
+        booster = classifier.get_booster()
+        model = _xgboost_json(booster)
+        learner = model["learner"]
+        gbm = learner["gradient_booster"]
+        if gbm.get("name") != "gbtree":
+            raise TypeError(f"Booster no soportado: {gbm.get('name')}")
+        trees = gbm["model"]["trees"]
+        tree_info = gbm["model"]["tree_info"]
+        n_groups = max(int(learner["learner_model_param"].get("num_class", "0")), 1)
+
+        features, thresholds, lefts, rights, defaults, values, roots = [], [], [], [], [], [], []
+        offset = 0
+        for tree in trees:
+            left = np.asarray(tree["left_children"], dtype=np.int64)
+            right = np.asarray(tree["right_children"], dtype=np.int64)
+            conditions = np.asarray(tree["split_conditions"], dtype=np.float32)
+            leaf = left < 0
+            features.append(np.where(leaf, 0, np.asarray(tree["split_indices"], dtype=np.int64)))
+            # En las hojas split_conditions guarda el valor de la hoja
+            thresholds.append(conditions)
+            lefts.append(np.where(leaf, -1, left + offset))
+            rights.append(np.where(leaf, -1, right + offset))
+            defaults.append(np.asarray(tree["default_left"], dtype=bool))
+            values.append(np.where(leaf, conditions, 0.0).astype(np.float64))
+            roots.append(offset)
+            offset += len(left)
+
+        classes = getattr(classifier, "classes_", None)
+        if classes is None:
+            classes = np.arange(max(n_groups, 2))
+        engine = cls(
+            feature=np.concatenate(features).astype(np.int32),
+            threshold=np.concatenate(thresholds),
+            left=np.concatenate(lefts),
+            right=np.concatenate(rights),
+            default_left=np.concatenate(defaults),
+            leaf_value=np.concatenate(values)[:, np.newaxis],
+            roots=np.asarray(roots, dtype=np.int64),
+            tree_group=np.asarray(tree_info, dtype=np.int64),
+            classes=np.asarray(classes),
+            kind="xgboost_softmax" if n_groups > 1 else "xgboost_logistic",
+        )
+        engine.n_groups = n_groups
+        # El margen base depende de la versión y del objetivo; se calcula
+        # comparando con el propio booster sobre una fila vacía
+        import xgboost
+
+        empty = xgboost.DMatrix(sp.csr_matrix((1, booster.num_features()), dtype=np.float32))
+        reference = np.asarray(booster.predict(empty, output_margin=True), dtype=np.float64).reshape(1, -1)
+        engine.base_margin = reference[0] - engine._margins(sp.csr_matrix((1, booster.num_features())))[0]
+        return engine
+
+    def _max_depth(self):
+        depth, frontier = 0, self.roots[~self.is_leaf[self.roots]]
+        while len(frontier):
+            depth += 1
+            frontier = np.concatenate([self.left[frontier], self.right[frontier]])
+            frontier = frontier[~self.is_leaf[frontier]]
+        return depth
+
+    def _leaves(self, X, block_rows=256):
+        """Índice de la hoja alcanzada para cada (fila, árbol): array (n_filas, n_árboles)."""
+        X = sp.csr_matrix(X)
+        X.sum_duplicates()
+        n_rows, n_features = X.shape
+        n_trees = len(self.roots)
+        leaves = np.empty((n_rows, n_trees), dtype=np.int64)
+        fill = np.float32(0.0) if self.kind == "forest" else np.float32(np.nan)
+        for start in range(0, n_rows, block_rows):
+            block = X[start:start + block_rows]
+            rows = block.shape[0]
+            # sklearn y XGBoost comparan en float32
+            dense = np.full(block.shape, fill, dtype=np.float32)
+            dense[np.repeat(np.arange(rows), np.diff(block.indptr)), block.indices] = block.data
+            flat = dense.ravel()
+            offsets = np.repeat(np.arange(rows, dtype=np.int64) * n_features, n_trees)
+            nodes = np.tile(self.roots, rows)
+            for _ in range(self.depth):
+                values = flat[offsets + self.feature[nodes]]
+                if self.kind == "forest":
+                    go_right = values > self.split[nodes]
+                else:
+                    go_right = np.where(np.isnan(values), self.missing_right[nodes], values >= self.split[nodes])
+                nodes = self.children[nodes, go_right.view(np.int8)]
+            leaves[start:start + rows] = nodes.reshape(rows, n_trees)
+        return leaves
+
+    def _margins(self, X):
+        leaves = self._leaves(X)
+        n_groups = getattr(self, "n_groups", 1)
+        margins = np.zeros((leaves.shape[0], n_groups))
+        leaf_values = self.leaf_value[leaves, 0]
+        for group in range(n_groups):
+            margins[:, group] = leaf_values[:, self.tree_group == group].sum(axis=1)
+        return margins
+
+    def predict_proba(self, X):
+        if self.kind == "forest":
+            leaves = self._leaves(X)
+            return self.leaf_value[leaves].mean(axis=1, dtype=np.float64)
+        margins = self._margins(X) + self.base_margin
+        if self.kind == "xgboost_logistic":
+            p = expit(margins[:, 0])
+            return np.column_stack([1.0 - p, p])
+        margins -= margins.max(axis=1, keepdims=True)
+        np.exp(margins, out=margins)
+        return margins / margins.sum(axis=1, keepdims=True)
+
+    def predict(self, X):
+        proba = self.predict_proba(X)
+        if self.kind == "xgboost_logistic":
+            # XGBClassifier usa p > 0.5 para el caso binario
+            return self.classes[(proba[:, 1] > 0.5).astype(np.intp)]
+        return self.classes[proba.argmax(axis=1)]
+
+    def verify(self, estimator, X, atol=1e-5):
+        """Comprueba que las probabilidades coinciden con las del estimador original."""
+        expected = estimator.predict_proba(X)
+        actual = self.predict_proba(X)
+        return expected.shape == actual.shape and np.allclose(expected, actual, atol=atol)
+
+
+def _round_down_float32(values):
+    """El mayor float32 que no supera cada valor."""
+    rounded = values.astype(np.float32)
+    above = rounded > values
+    rounded[above] = np.nextafter(rounded[above], np.float32(-np.inf))
+    return rounded
+
+
+def _xgboost_json(booster):
+    try:
+        raw = booster.save_raw(raw_format="json")
+    except TypeError:
+        # Versiones antiguas de xgboost: se guarda el modelo en un archivo .json
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "model.json")
+            booster.save_model(path)
+            with open(path) as f:
+                return json.load(f)
+    return json.loads(bytes(raw).decode("utf-8"))
+
+
+def random_probe(n_features, n_rows=64, density=0.01, seed=0):
+    """Lote disperso aleatorio con valores en [0, 1], para verificar equivalencias."""
+    return sp.random(n_rows, n_features, density=density, format="csr", random_state=seed)
+
+
+CROSSOVER_SIZES = (1, 2, 4, 8, 16, 32, 64, 128)
+
+
+def crossover(engine, estimator, n_features, sizes=CROSSOVER_SIZES, repeats=5):
+    """
+    Mayor tamaño de lote de `sizes` en el que el motor es más rápido que el
+    estimador original (0 si no lo es ni con una fila). Se mide con lotes
+    aleatorios tan dispersos como los textos vectorizados y se toma el mejor
+    de `repeats` intentos para no depender de un pico de carga.
+    """
+    probe = random_probe(n_features, n_rows=max(sizes), density=0.002, seed=1)
+    best = 0
+    for n_rows in sizes:
+        X = probe[:n_rows]
+        timings = []
+        for predict in (estimator.predict_proba, engine.predict_proba):
+            elapsed = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                predict(X)
+                elapsed.append(time.perf_counter() - start)
+            timings.append(min(elapsed))
+        if timings[1] >= timings[0]:
+            break
+        best = n_rows
+    return best
+
+
+class LatencyBudget:
+    """
+    Presupuesto de latencia por lote. Lleva una media móvil del coste por fila
+    de cada miembro y, si el coste estimado del lote supera el presupuesto,
+    descarta los miembros más caros (siempre queda al menos uno por tarea).
+    """
+
+    def __init__(self, budget_ms=None, alpha=0.2):
+        self.budget = budget_ms / 1000.0 if budget_ms else None
+        self.alpha = alpha
+        self.cost_per_row = {}
+
+    def record(self, name, seconds, n_rows):
+        cost = seconds / max(n_rows, 1)
+        previous = self.cost_per_row.get(name)
+        self.cost_per_row[name] = cost if previous is None else previous + self.alpha * (cost - previous)
+
+    def timed(self, name, n_rows, function, *args):
+        start = time.perf_counter()
+        result = function(*args)
+        self.record(name, time.perf_counter() - start, n_rows)
+        return result
+
+    def select(self, groups, n_rows):
+        """`groups` es {tarea: [(nombre, modelo)]}; devuelve el mismo dict filtrado."""
+        if self.budget is None:
+            return groups
+        selected = {task: list(members) for task, members in groups.items()}
+
+        def estimate(name):
+            return self.cost_per_row.get(name, 0.0) * n_rows
+
+        while sum(estimate(name) for members in selected.values() for name, _ in members) > self.budget:
+            candidates = [
+                (estimate(name), task, i)
+                for task, members in selected.items() if len(members) > 1
+                for i, (name, _) in enumerate(members)
+            ]
+            if not candidates:
+                break
+            _, task, i = max(candidates)
+            del selected[task][i]
+        return selected
+
+
+def main():
+    from .model_registry import SENTIMENT_MEMBERS, SUICIDE_MEMBERS
+    from .preprocessing import _synthetic_corpus
+    from .prueba import TREE_ENGINE_MAX_ROWS, featurizer, preprocessor, registry, tree_engine
+
+    documents = preprocessor.preprocess_batch(_synthetic_corpus(500))
+    X_sentiment, X_suicide = featurizer().transform(documents)
+    status = 0
+    print(f"TREE_ENGINE_MAX_ROWS={TREE_ENGINE_MAX_ROWS or 'medido por modelo'}")
+    for names, X in ((SENTIMENT_MEMBERS, X_sentiment), (SUICIDE_MEMBERS, X_suicide)):
+        for name, model in registry.members(names):
+            if not is_tree_ensemble(model):
+                continue
+            engine = TreeEnsembleEngine.compile(model)
+
+            start = time.perf_counter()
+            expected = model.predict_proba(X)
+            original_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            actual = engine.predict_proba(X)
+            engine_time = time.perf_counter() - start
+
+            max_error = np.abs(expected - actual).max()
+            same_labels = (model.predict(X) == engine.predict(X)).mean()
+            print(f"{name}: lote {X.shape[0]}: original {original_time * 1000:.1f}ms  "
+                  f"motor {engine_time * 1000:.1f}ms  error máximo {max_error:.2e}  etiquetas iguales {same_labels:.2%}")
+            for n_rows in (1, 16, 64):
+                timings = []
+                for predict in (model.predict_proba, engine.predict_proba):
+                    start = time.perf_counter()
+                    for _ in range(5):
+                        predict(X[:n_rows])
+                    timings.append((time.perf_counter() - start) / 5 * 1000)
+                print(f"    lote {n_rows}: original {timings[0]:.2f}ms  motor {timings[1]:.2f}ms")
+            compiled = tree_engine(name, X.shape[1])
+            if compiled is not None:
+                print(f"    app.prueba usa el motor hasta {compiled.max_rows} filas")
+            if max_error > 1e-5:
+                status = 1
+    return status
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,44 +1,67 @@
 import reflex as rx
 from .components import sidebar, header
-import httpx
-from typing import Any
-from .prueba import probar_prediccion  # Importar la función desde prueba.py
+from . import api_client
+import json
+
+# Texto que se muestra para cada etapa del trabajo de análisis
+JOB_STATUS_LABELS = {
+    "queued": "En cola",
+    "preprocessing": "Preprocesando el texto",
+    "scoring": "Evaluando los modelos",
+    "scored": "Guardando el resultado",
+    "stored": "Guardado",
+    "failed": "Error en el análisis",
+}
 
 class UserInputState(rx.State):
     # Estado inicial del formulario
     form_data: dict = {}
     result: dict = {}
+    job_id: str = ""
+    job_status: str = ""
+
+    @rx.var
+    def job_status_label(self) -> str:
+        return JOB_STATUS_LABELS.get(self.job_status, self.job_status)
 
-    def send_data_to_backend(self, data: dict[str, Any]) -> dict:
+    @rx.event(background=True)
+    async def handle_submit(self, form_data: dict):
+        """
+        Manejar el envío del formulario. El análisis se hace en el backend como
+        un trabajo: el id llega enseguida y el progreso y el resultado se van
+        mostrando a medida que llegan, sin bloquear el manejador.
+        """
+        async with self:
+            self.form_data = form_data
+            self.result = {}
+            self.job_id = ""
+            self.job_status = "queued"
         try:
-            with httpx.Client() as client:
-                response = client.post("http://localhost:8000/predecir", json=data)
-                if response.status_code == 200:
-                    return response.json()
-                else:
-                    return {"error": "Failed to send data"}
+            response = await api_client.post("/jobs", json=form_data)
+            if response.status_code != 200:
+                print(f"Error creating job: {response.status_code}")
+                async with self:
+                    self.job_status = "failed"
+                return
+            job_id = response.json()["job_id"]
+            async with self:
+                self.job_id = job_id
+
+            async with api_client.stream(f"/jobs/{job_id}/events") as events:
+                async for line in events.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    job = json.loads(line[len("data:"):])
+                    async with self:
+                        if self.job_id != job_id:
+                            return  # Se envió otro formulario mientras tanto
+                        self.job_status = job["status"]
+                        if job.get("result"):
+                            self.result = job["result"]
         except Exception as e:
             print(f"Error sending data: {e}")
-            return {"error": str(e)}
-
-    @rx.event
-    def handle_submit(self, form_data: dict):
-        """Manejar el envío del formulario."""
-        self.form_data = form_data
-        
-        # Calcular los resultados usando la función de prueba.py
-        resultado = probar_prediccion(form_data["text"])
-        
-        # Actualizar el resultado
-        self.result = {
-            **form_data,
-            "result": resultado["prediccion_suicidio"],
-            "emotion": resultado["emocion"],
-            "suicide_probability": resultado["probabilidad_suicidio"]
-        }
-        
-        # Enviar los datos al backend
-        self.send_data_to_backend(self.result)
+            async with self:
+                self.job_status = "failed"
 
 # Página de entrada de datos del usuario
 def user_input_page():
@@ -107,6 +130,17 @@ def user_input_page():
                             reset_on_submit=True,
                             width="100%",
                         ),
+                        rx.cond(
+                            UserInputState.job_status != "",
+                            rx.hstack(
+                                rx.cond(
+                                    (UserInputState.job_status != "stored") & (UserInputState.job_status != "failed"),
+                                    rx.spinner(size="1"),
+                                ),
+                                rx.text(UserInputState.job_status_label, color="rgb(107 114 128)"),
+                                spacing="2",
+                            ),
+                        ),
                         rx.cond(
                             UserInputState.result,
                             rx.vstack(
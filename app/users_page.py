@@ -1,7 +1,9 @@
 import reflex as rx
-import httpx
+import asyncio
+import json
 from typing import List, Dict, Any
-from datetime import datetime
+from datetime import datetime, timedelta
+from . import api_client
 
 # Define un modelo de datos para la información de las emociones
 class EmotionData(rx.Base):
@@ -14,6 +16,32 @@ class SectorSentiment(rx.Base):
     average_suicide_probability: float
     time: datetime
 
+# Espera antes de reconectar tras un corte; se duplica en cada fallo seguido
+SUBSCRIBE_RETRY_SECONDS = 5
+SUBSCRIBE_MAX_RETRY_SECONDS = 60
+
+def _grain(time_interval):
+    # Igual que el backend (api.rollups.choose_grain): como mucho 180 buckets por serie
+    return "minute" if time_interval <= 180 else "hour"
+
+def _window_start(time_interval):
+    """Inicio del primer bucket de la ventana, como lo calcula el backend."""
+    since = datetime.utcnow() - timedelta(minutes=time_interval)
+    if _grain(time_interval) == "minute":
+        return since.replace(second=0, microsecond=0)
+    return since.replace(minute=0, second=0, microsecond=0)
+
+def _merge_buckets(current, rows, model, key, since):
+    """Sustituye los buckets recibidos por (clave, hora) y descarta los que salen de la ventana."""
+    merged = {(getattr(item, key), item.time): item for item in current}
+    for row in rows:
+        item = model(**row)
+        merged[(getattr(item, key), item.time)] = item
+    return sorted(
+        (item for item in merged.values() if item.time >= since),
+        key=lambda item: (item.time, getattr(item, key)),
+    )
+
 class UsersState(rx.State):
     """Define el estado reactivo para la página de Usuarios."""
 
@@ -21,21 +49,83 @@ class UsersState(rx.State):
     sector_sentiment_data: List[SectorSentiment] = []
     time_interval: int = 60  # Intervalo de tiempo predeterminado en minutos
     is_loading: bool = False
+    is_subscribed: bool = False  # Suscripción activa a /dashboard/stream
+
+    @rx.event(background=True)
+    async def subscribe_updates(self):
+        """
+        Se suscribe una sola vez a los deltas del backend (Server-Sent Events)
+        y los aplica a los gráficos, en lugar de volver a pedir la ventana entera.
+        Si el backend rechaza la suscripción (503 con varios workers de la API,
+        o un 4xx) se deja de intentar y los datos se actualizan con el botón;
+        si la conexión se corta, se reintenta con esperas crecientes.
+        """
+        async with self:
+            if self.is_subscribed:
+                return
+            self.is_subscribed = True
+        espera = SUBSCRIBE_RETRY_SECONDS
+        while True:
+            try:
+                async with api_client.stream("/dashboard/stream") as response:
+                    if response.status_code == 503 or 400 <= response.status_code < 500:
+                        print(f"El backend no admite la suscripción al dashboard ({response.status_code}); "
+                              f"se deja de intentar")
+                        async with self:
+                            self.is_subscribed = False
+                        return
+                    if response.status_code != 200:
+                        raise RuntimeError(f"respuesta {response.status_code}")
+                    espera = SUBSCRIBE_RETRY_SECONDS
+                    event = None
+                    async for line in response.aiter_lines():
+                        if line.startswith("event:"):
+                            event = line[len("event:"):].strip()
+                            continue
+                        delta = None
+                        if line.startswith("data:") and event == "delta":
+                            delta = json.loads(line[len("data:"):])
+                        elif not line.startswith(":"):
+                            continue
+                        # Los deltas y los pings del servidor sirven para comprobar si seguimos suscritos
+                        async with self:
+                            if not self.is_subscribed:
+                                return
+                            if delta is not None:
+                                self._apply_delta(delta)
+            except Exception as e:
+                print(f"Error en la suscripción al dashboard: {e}")
+            async with self:
+                if not self.is_subscribed:
+                    return
+            await asyncio.sleep(espera)  # Reintento de conexión
+            espera = min(espera * 2, SUBSCRIBE_MAX_RETRY_SECONDS)
+
+    def unsubscribe_updates(self):
+        """Detiene la suscripción al salir de la página."""
+        self.is_subscribed = False
+
+    def _apply_delta(self, delta):
+        changes = delta.get(_grain(self.time_interval), {})
+        since = _window_start(self.time_interval)
+        self.emotion_data = _merge_buckets(
+            self.emotion_data, changes.get("emotions", []), EmotionData, "emotion", since
+        )
+        self.sector_sentiment_data = _merge_buckets(
+            self.sector_sentiment_data, changes.get("sectors", []), SectorSentiment, "sector", since
+        )
 
     async def fetch_emotion_data(self):
         """Obtiene los datos de las emociones desde el backend."""
         self.is_loading = True
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"http://localhost:8000/emotions_over_time?time_interval={self.time_interval}"
-                )
-                if response.status_code == 200:
-                    # Analiza la respuesta JSON y crea objetos EmotionData
-                    data = response.json()
-                    self.emotion_data = [EmotionData(**item) for item in data]
-                else:
-                    print(f"Error al obtener los datos: {response.status_code}")
+            response = await api_client.get("/emotions_over_time", params={"time_interval": self.time_interval})
+            if response.status_code == 200:
+                # Analiza la respuesta JSON y crea objetos EmotionData
+                data = response.json()
+                self.emotion_data = [EmotionData(**item) for item in data]
+            else:
+                print(f"Error al obtener los datos: {response.status_code}")
         except Exception as e:
             print(f"Error al obtener los datos: {e}")
         finally:
@@ -45,16 +135,13 @@ class UsersState(rx.State):
         """Obtiene el sentimiento promedio por sector desde el backend."""
         self.is_loading = True
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"http://localhost:8000/sentiment_by_sector?time_interval={self.time_interval}"
-                )
-                if response.status_code == 200:
-                    # Analiza la respuesta JSON y crea objetos SectorSentiment
-                    data = response.json()
-                    self.sector_sentiment_data = [SectorSentiment(**item) for item in data]
-                else:
-                    print(f"Error al obtener los datos: {response.status_code}")
+            response = await api_client.get("/sentiment_by_sector", params={"time_interval": self.time_interval})
+            if response.status_code == 200:
+                # Analiza la respuesta JSON y crea objetos SectorSentiment
+                data = response.json()
+                self.sector_sentiment_data = [SectorSentiment(**item) for item in data]
+            else:
+                print(f"Error al obtener los datos: {response.status_code}")
         except Exception as e:
             print(f"Error al obtener los datos: {e}")
         finally:
@@ -141,7 +228,9 @@ def users_page():
         emotion_chart(),
         sector_sentiment_chart(),  # Agrega el nuevo gráfico
         rx.button("Actualizar Datos", on_click=UsersState.fetch_emotion_data),  # Agrega un botón de actualización
-        on_mount=[UsersState.fetch_emotion_data, UsersState.fetch_sector_sentiment_data],  # Carga los datos al cargar la página
+        # Carga la ventana al cargar la página; después llegan solo los cambios
+        on_mount=[UsersState.fetch_emotion_data, UsersState.fetch_sector_sentiment_data, UsersState.subscribe_updates],
+        on_unmount=UsersState.unsubscribe_updates,
         align_items="start",
         spacing="4",
         padding="4",
@@ -0,0 +1,84 @@
+"""
+Benchmark del archivo en Parquet frente a la tabla `predictions`.
+
+Carga filas sintéticas que abarcan `--days` días en una base temporal con el
+esquema migrado, mide las consultas en bruto por hora sobre todo el periodo
+leyendo de SQLite, archiva todos los días anteriores a hoy y las mide de
+nuevo leyendo del archivo. Compara también el espacio en disco.
+
+    python -m benchmarks.archive_queries --rows 2000000 --days 180
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from api.archive import PredictionArchive, archive_predictions, query_raw_emotions, query_raw_sectors
+from api.storage import apply_pragmas, migrate_connection
+
+from .sqlite_queries import ORIGINAL_SCHEMA, load_rows
+
+QUERIES = {"emotions": query_raw_emotions, "sectors": query_raw_sectors}
+
+
+def measure(conn, archive, since, until, grain, repeat):
+    results = {}
+    for name, query in QUERIES.items():
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            rows = query(conn, archive, since, until, grain)
+            timings.append((time.perf_counter() - start) * 1000)
+        results[name] = (statistics.median(timings), rows)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Consultas históricas sobre SQLite y sobre el archivo Parquet.")
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--days", type=int, default=180, help="Días que abarcan las filas sintéticas")
+    parser.add_argument("--grain", default="hour", choices=["minute", "hour", "day"])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        conn = sqlite3.connect(path)
+        conn.executescript(ORIGINAL_SCHEMA)
+        load_rows(conn, args.rows, args.days)
+        apply_pragmas(conn)
+        migrate_connection(conn)
+        conn.execute("VACUUM")
+        sqlite_size = os.path.getsize(path)
+
+        now = datetime.utcnow()
+        since, until = now - timedelta(days=args.days), now.replace(hour=0, minute=0, second=0, microsecond=0)
+        before = measure(conn, None, since, until, args.grain, args.repeat)
+
+        archive = PredictionArchive(os.path.join(tmp, "archive"))
+        start = time.perf_counter()
+        moved = archive_predictions(conn, archive, older_than_days=0, now=now)
+        print(f"{moved} filas archivadas en {time.perf_counter() - start:.1f}s")
+
+        after = measure(conn, archive, since, until, args.grain, args.repeat)
+        conn.close()
+
+        print(f"Disco: SQLite {sqlite_size / 2**20:.1f} MiB  Parquet {archive.size() / 2**20:.1f} MiB "
+              f"({archive.size() / sqlite_size:.1%})")
+        print(f"{'consulta':<12}{'SQLite (ms)':>14}{'Parquet (ms)':>14}{'mejora':>9}  resultados iguales")
+        status = 0
+        for name, (before_ms, expected) in before.items():
+            after_ms, actual = after[name]
+            same = len(expected) == len(actual) and all(
+                e[0] == a[0] and e[2] == a[2] and abs(e[1] - a[1]) < 1e-9 for e, a in zip(expected, actual)
+            )
+            status |= not same
+            print(f"{name:<12}{before_ms:>14.1f}{after_ms:>14.1f}{before_ms / max(after_ms, 1e-6):>8.1f}x  {same}")
+    return status
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,80 @@
+"""
+Micro-benchmarks del camino de inferencia sobre un corpus sintético:
+preprocesamiento de un texto, vectorización, cada miembro del ensemble (tal
+como lo evalúa `app.prueba`, con los motores lineal y de árboles) y el
+pipeline completo en modo exacto y en cascada, por tamaño de lote.
+
+    python -m benchmarks.inference --batch-sizes 1 64 --repeat 200
+"""
+import argparse
+import time
+
+from app.model_registry import SENTIMENT_MEMBERS, SUICIDE_MEMBERS
+
+from .report import print_table, summarize
+
+
+def _time(function, batches, repeat):
+    # La primera llamada compila los motores de árboles y llena cachés
+    function(batches[0])
+    samples = []
+    for i in range(repeat):
+        batch = batches[i % len(batches)]
+        start = time.perf_counter()
+        function(batch)
+        samples.append((time.perf_counter() - start) * 1000)
+    return summarize(samples)
+
+
+def run(batch_sizes=(1, 64), repeat=200, n_texts=2000, seed=0):
+    """Devuelve {nombre: resumen}; los nombres llevan el tamaño de lote al final."""
+    from app import prueba
+    from app.preprocessing import _synthetic_corpus
+
+    prueba.calentar_modelos()
+    texts = _synthetic_corpus(n_texts, seed)
+    documents = prueba.preprocessor.preprocess_batch(texts)
+    featurizer = prueba.featurizer()
+    results = {}
+
+    # Cada texto es distinto, pero la caché de lemas queda caliente como en producción
+    results["preprocess_text"] = _time(prueba.preprocessor, texts, repeat)
+
+    for batch_size in batch_sizes:
+        batches = [documents[i:i + batch_size] for i in range(0, len(documents) - batch_size + 1, batch_size)]
+        vectorized = [featurizer.transform(batch) for batch in batches]
+        results[f"vectorize/{batch_size}"] = _time(featurizer.transform, batches, repeat)
+
+        for task, names, method, index in (
+            ("suicide", SUICIDE_MEMBERS, "predict_proba", 1),
+            ("sentiment", SENTIMENT_MEMBERS, "predict", 0),
+        ):
+            linear = prueba.linear_engine(tuple(names))
+            linear_method = getattr(linear, method)
+            results[f"member/linear_{task}/{batch_size}"] = _time(
+                lambda X: linear_method(X[index]), vectorized, repeat)
+            for name, model in prueba.registry.members(names):
+                if name in linear.names:
+                    continue
+                results[f"member/{name}/{batch_size}"] = _time(
+                    lambda X, name=name, model=model: prueba._evaluar(name, model, X[index], method),
+                    vectorized, repeat)
+
+        for exact in (True, False):
+            results[f"pipeline/{'exact' if exact else 'cascade'}/{batch_size}"] = _time(
+                lambda batch, exact=exact: prueba.puntuar_textos_procesados(batch, exact), batches, repeat)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmarks del camino de inferencia.")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 64])
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--texts", type=int, default=2000)
+    args = parser.parse_args(argv)
+    print_table(run(args.batch_sizes, args.repeat, args.texts))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
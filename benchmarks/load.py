@@ -0,0 +1,159 @@
+"""
+Generador de carga local para la API.
+
+Lanza la API con uvicorn en un directorio temporal (base de datos vacía) o
+usa una ya en marcha con --url, y ejecuta cada escenario por separado con
+`--concurrency` clientes en bucle cerrado durante `--duration` segundos:
+
+  - predecir: POST /predecir con filas sintéticas (llena la base para los demás);
+  - emotions_over_time y sentiment_by_sector: GET con la ventana --window.
+
+    python -m benchmarks.load --concurrency 16 --duration 10
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+import httpx
+
+from .report import print_table, summarize
+from .sqlite_queries import EMOTIONS, SECTORS
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ("predecir", "emotions_over_time", "sentiment_by_sector")
+
+
+def _prediction_row(rng, i):
+    return {
+        "name": f"bench{i % 5000}",
+        "age": rng.randint(18, 70),
+        "gender": rng.choice("MF"),
+        "sector": rng.choice(SECTORS),
+        "text": "texto de prueba",
+        "result": rng.choice(["suicidio", "no suicidio"]),
+        "emotion": rng.choice(EMOTIONS),
+        "suicide_probability": rng.random(),
+    }
+
+
+def _scenario_request(name, window):
+    """Devuelve una función (cliente, rng, i) -> corrutina que hace una petición del escenario."""
+    if name == "predecir":
+        return lambda client, rng, i: client.post("/predecir", json=_prediction_row(rng, i))
+    return lambda client, rng, i: client.get(f"/{name}", params={"time_interval": window})
+
+
+async def run_scenario(url, name, concurrency, duration, window=60, warmup=20, seed=0):
+    send = _scenario_request(name, window)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30.0) as client:
+        rng = random.Random(seed)
+        for i in range(warmup):
+            await send(client, rng, i)
+
+        samples, errors, counter = [], 0, iter(range(warmup, sys.maxsize))
+        deadline = time.perf_counter() + duration
+
+        async def worker(worker_seed):
+            nonlocal errors
+            worker_rng = random.Random(worker_seed)
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    response = await send(client, worker_rng, next(counter))
+                    failed = response.status_code >= 400
+                except httpx.HTTPError:
+                    failed = True
+                samples.append((time.perf_counter() - start) * 1000)
+                errors += failed
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(seed + k + 1) for k in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return summarize(samples, elapsed, errors)
+
+
+async def run(url, scenarios=SCENARIOS, concurrency=16, duration=10.0, window=60, warmup=20):
+    """Devuelve {"load/<escenario>/c<concurrencia>": resumen}."""
+    results = {}
+    for name in scenarios:
+        results[f"load/{name}/c{concurrency}"] = await run_scenario(url, name, concurrency, duration, window, warmup)
+    return results
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def local_server(startup_timeout=120.0):
+    """Arranca la API con uvicorn en un directorio temporal y devuelve su URL."""
+    with tempfile.TemporaryDirectory() as workdir:
+        port = _free_port()
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_DIR, os.getenv("PYTHONPATH")])))
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "api.main:app", "--host", "127.0.0.1", "--port", str(port),
+             "--log-level", "warning"],
+            cwd=workdir, env=env,
+        )
+        url = f"http://127.0.0.1:{port}"
+        try:
+            deadline = time.monotonic() + startup_timeout
+            while True:
+                if process.poll() is not None:
+                    raise RuntimeError(f"La API terminó al arrancar (código {process.returncode})")
+                try:
+                    if httpx.get(f"{url}/metrics", timeout=1.0).status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    pass
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"La API no respondió en {startup_timeout:.0f}s")
+                time.sleep(0.2)
+            yield url
+        finally:
+            process.terminate()
+            try:
+                process.wait(10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+
+def add_arguments(parser):
+    parser.add_argument("--url", help="API ya en marcha (por defecto se arranca una local)")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="Segundos por escenario")
+    parser.add_argument("--window", type=int, default=60, help="Ventana en minutos de las consultas")
+    parser.add_argument("--warmup", type=int, default=20, help="Peticiones sin medir antes de cada escenario")
+
+
+def run_from_args(args):
+    def measure(url):
+        return asyncio.run(run(url, args.scenarios, args.concurrency, args.duration, args.window, args.warmup))
+
+    if args.url:
+        return measure(args.url)
+    with local_server() as url:
+        return measure(url)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Carga sobre /predecir y las consultas del dashboard.")
+    add_arguments(parser)
+    print_table(run_from_args(parser.parse_args(argv)))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,81 @@
+"""
+Resultados de los benchmarks: resumen de latencias, archivo JSON y
+comparación con una línea base guardada.
+
+Cada benchmark es un dict con "count", "p50_ms", "p95_ms", "p99_ms",
+"mean_ms" y, si se conoce la duración total, "rps". Una regresión es un
+percentil que sube más de `tolerance` (en proporción) o un rps que baja más
+de `tolerance` respecto a la línea base.
+"""
+import json
+import os
+import platform
+import sys
+from datetime import datetime
+
+import numpy as np
+
+# Percentiles que se comparan con la línea base
+COMPARED_PERCENTILES = ("p50_ms", "p95_ms")
+# Por debajo de este valor las variaciones son ruido del reloj
+MIN_COMPARED_MS = 0.05
+
+
+def summarize(samples_ms, elapsed=None, errors=0):
+    samples = np.asarray(samples_ms, dtype=np.float64)
+    summary = {"count": int(samples.size), "errors": int(errors)}
+    if samples.size:
+        p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+        summary.update(p50_ms=float(p50), p95_ms=float(p95), p99_ms=float(p99), mean_ms=float(samples.mean()))
+    if elapsed:
+        summary["rps"] = samples.size / elapsed
+    return summary
+
+
+def environment():
+    return {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "argv": sys.argv[1:],
+    }
+
+
+def write_results(path, benchmarks):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"environment": environment(), "benchmarks": benchmarks}, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+
+
+def load_results(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(benchmarks, baseline, tolerance):
+    """Devuelve [(benchmark, métrica, base, actual)] con las regresiones respecto a `baseline`."""
+    regressions = []
+    for name, current in benchmarks.items():
+        reference = baseline.get("benchmarks", {}).get(name)
+        if reference is None:
+            continue
+        for metric in COMPARED_PERCENTILES:
+            if metric in current and metric in reference:
+                if current[metric] > max(reference[metric], MIN_COMPARED_MS) * (1 + tolerance):
+                    regressions.append((name, metric, reference[metric], current[metric]))
+        if "rps" in current and "rps" in reference and current["rps"] < reference["rps"] * (1 - tolerance):
+            regressions.append((name, "rps", reference["rps"], current["rps"]))
+    return regressions
+
+
+def print_table(benchmarks, baseline=None):
+    reference = (baseline or {}).get("benchmarks", {})
+    print(f"{'benchmark':<40}{'n':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'rps':>9}{'err':>5}{'p95 base':>10}")
+    for name, result in benchmarks.items():
+        base = reference.get(name, {}).get("p95_ms")
+        rps = f"{result['rps']:.1f}" if "rps" in result else ""
+        print(f"{name:<40}{result['count']:>7}{result.get('p50_ms', 0):>10.2f}{result.get('p95_ms', 0):>10.2f}"
+              f"{result.get('p99_ms', 0):>10.2f}{rps:>9}{result.get('errors', 0):>5}"
+              f"{'' if base is None else f'{base:.2f}':>10}")
@@ -0,0 +1,66 @@
+"""
+Suite completa: micro-benchmarks de inferencia y carga sobre la API.
+
+Escribe los resultados en JSON (--output) y los compara con la línea base
+(--baseline); termina con código 1 si hay regresiones, para usarlo antes de
+desplegar. La línea base depende de la máquina: se genera en la de referencia
+con --save-baseline.
+
+    python -m benchmarks.run --save-baseline       # en la máquina de referencia
+    python -m benchmarks.run --tolerance 0.2       # antes de desplegar
+"""
+import argparse
+import os
+import shutil
+
+from . import inference, load
+from .report import compare, load_results, print_table, write_results
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks de inferencia y de la API con comparación contra una línea base.")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Guarda los resultados como nueva línea base")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Empeoramiento admitido (0.25 = 25%%)")
+    parser.add_argument("--skip-inference", action="store_true")
+    parser.add_argument("--skip-load", action="store_true")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 64])
+    parser.add_argument("--repeat", type=int, default=200)
+    load.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    results = {}
+    if not args.skip_inference:
+        results.update(inference.run(args.batch_sizes, args.repeat))
+    if not args.skip_load:
+        results.update(load.run_from_args(args))
+    write_results(args.output, results)
+
+    baseline = load_results(args.baseline) if os.path.exists(args.baseline) else None
+    print_table(results, baseline)
+    print(f"Resultados en {args.output}")
+
+    if args.save_baseline:
+        shutil.copyfile(args.output, args.baseline)
+        print(f"Línea base guardada en {args.baseline}")
+        return 0
+    if baseline is None:
+        print(f"Aviso: no hay línea base en {args.baseline}; genera una con --save-baseline")
+        return 0
+    if baseline["environment"].get("cpus") != os.cpu_count():
+        print(f"Aviso: la línea base se midió con {baseline['environment'].get('cpus')} CPUs y esta máquina tiene {os.cpu_count()}")
+
+    regressions = compare(results, baseline, args.tolerance)
+    for name, metric, before, after in regressions:
+        print(f"REGRESIÓN {name} {metric}: {before:.2f} -> {after:.2f}")
+    if regressions:
+        return 1
+    print(f"Sin regresiones (tolerancia {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,134 @@
+"""
+Benchmark de las consultas del dashboard sobre SQLite.
+
+Carga filas sintéticas en una base temporal con el esquema original de
+`predictions`, mide las consultas de /emotions_over_time y
+/sentiment_by_sector tal como eran (GROUP BY strftime sin índices) y después
+aplica el perfil de PRAGMAs y la migración de `api.storage` y las mide de nuevo.
+
+    python -m benchmarks.sqlite_queries --rows 2000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from api.storage import apply_pragmas, migrate_connection
+
+ORIGINAL_SCHEMA = """
+CREATE TABLE predictions (
+    id INTEGER NOT NULL PRIMARY KEY,
+    name VARCHAR, age INTEGER, gender VARCHAR, sector VARCHAR, text VARCHAR,
+    result VARCHAR, emotion VARCHAR, suicide_probability FLOAT, timestamp DATETIME
+);
+CREATE INDEX ix_predictions_id ON predictions (id);
+CREATE INDEX ix_predictions_name ON predictions (name);
+"""
+
+EMOTIONS = ["Tristeza", "Alegría", "Amor", "Enojo", "Miedo", "Sorpresa"]
+SECTORS = ["Salud", "Educación", "Tecnología", "Comercio", "Industria", "Gobierno", "Finanzas", "Transporte"]
+
+QUERIES_BEFORE = {
+    "emotions_over_time": (
+        "SELECT emotion, count(emotion), strftime('%Y-%m-%d %H:%M:00', timestamp) FROM predictions "
+        "WHERE timestamp >= ? GROUP BY emotion, strftime('%Y-%m-%d %H:%M', timestamp)"
+    ),
+    "sentiment_by_sector": (
+        "SELECT sector, avg(suicide_probability), strftime('%Y-%m-%d %H:%M:00', timestamp) FROM predictions "
+        "WHERE timestamp >= ? GROUP BY sector, strftime('%Y-%m-%d %H:%M', timestamp)"
+    ),
+}
+
+QUERIES_AFTER = {
+    "emotions_over_time": (
+        "SELECT emotion, count(emotion), minute_bucket FROM predictions "
+        "WHERE timestamp >= ? GROUP BY emotion, minute_bucket"
+    ),
+    "sentiment_by_sector": (
+        "SELECT sector, avg(suicide_probability), minute_bucket FROM predictions "
+        "WHERE timestamp >= ? GROUP BY sector, minute_bucket"
+    ),
+}
+
+
+def load_rows(conn, n_rows, days, seed=0):
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    span = days * 24 * 3600
+    batch = []
+    for i in range(n_rows):
+        timestamp = now - timedelta(seconds=rng.random() * span)
+        batch.append((
+            f"user{i % 5000}", rng.randint(18, 70), rng.choice("MF"), rng.choice(SECTORS), "texto",
+            rng.choice(["suicidio", "no suicidio"]), rng.choice(EMOTIONS), rng.random(),
+            timestamp.strftime("%Y-%m-%d %H:%M:%S.%f"),
+        ))
+        if len(batch) == 50_000:
+            _insert(conn, batch)
+            batch = []
+    if batch:
+        _insert(conn, batch)
+    conn.commit()
+
+
+def _insert(conn, rows):
+    conn.executemany(
+        "INSERT INTO predictions (name, age, gender, sector, text, result, emotion, suicide_probability, timestamp) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        rows,
+    )
+
+
+def measure(conn, queries, windows, repeat):
+    results = {}
+    for name, sql in queries.items():
+        for minutes in windows:
+            threshold = (datetime.utcnow() - timedelta(minutes=minutes)).strftime("%Y-%m-%d %H:%M:%S.%f")
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                conn.execute(sql, (threshold,)).fetchall()
+                timings.append((time.perf_counter() - start) * 1000)
+            results[(name, minutes)] = statistics.median(timings)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Latencia de las consultas del dashboard antes y después de la migración.")
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--days", type=int, default=30, help="Días que abarcan las filas sintéticas")
+    parser.add_argument("--windows", type=int, nargs="+", default=[60, 1440, 43200], help="Ventanas en minutos")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        conn = sqlite3.connect(path)
+        conn.executescript(ORIGINAL_SCHEMA)
+
+        start = time.perf_counter()
+        load_rows(conn, args.rows, args.days)
+        print(f"{args.rows} filas cargadas en {time.perf_counter() - start:.1f}s")
+
+        before = measure(conn, QUERIES_BEFORE, args.windows, args.repeat)
+
+        start = time.perf_counter()
+        apply_pragmas(conn)
+        migrate_connection(conn)
+        print(f"Migración en {time.perf_counter() - start:.1f}s")
+
+        after = measure(conn, QUERIES_AFTER, args.windows, args.repeat)
+        conn.close()
+
+    print(f"{'consulta':<22}{'ventana (min)':>14}{'antes (ms)':>12}{'después (ms)':>14}{'mejora':>9}")
+    for (name, minutes), before_ms in before.items():
+        after_ms = after[(name, minutes)]
+        print(f"{name:<22}{minutes:>14}{before_ms:>12.1f}{after_ms:>14.1f}{before_ms / max(after_ms, 1e-6):>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
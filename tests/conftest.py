@@ -0,0 +1,59 @@
+"""
+Fixtures comunes. Las pruebas usan los artefactos de app/ (o los de
+MODEL_ARTIFACTS_DIR) y no necesitan los datos de NLTK salvo las que cargan
+`app.prueba`, que se omiten si no están instalados.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.model_registry import ModelRegistry  # noqa: E402
+from app.preprocessing import TextPreprocessor, _synthetic_corpus  # noqa: E402
+
+STOP_WORDS = ["i", "me", "my", "we", "the", "a", "an", "and", "is", "was", "so", "it", "to", "of", "about", "nobody"]
+
+
+class SuffixLemmatizer:
+    """Sustituto determinista de WordNetLemmatizer para no depender de los datos de NLTK."""
+
+    def lemmatize(self, word):
+        return word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+
+
+@pytest.fixture(scope="session")
+def registry():
+    return ModelRegistry(use_mmap=False)
+
+
+@pytest.fixture(scope="session")
+def documents():
+    return TextPreprocessor(STOP_WORDS, SuffixLemmatizer()).preprocess_batch(_synthetic_corpus(300, seed=1))
+
+
+def load_members(registry, names):
+    """[(nombre, modelo)] de los miembros disponibles; omite la prueba si no hay ninguno."""
+    members = []
+    for name in names:
+        if not registry.available(name):
+            continue
+        try:
+            members.append((name, registry.get(name)))
+        except ImportError as e:
+            pytest.skip(f"No se puede cargar '{name}': {e}")
+    if not members:
+        pytest.skip(f"No hay artefactos para {names}")
+    return members
+
+
+@pytest.fixture(scope="session")
+def prueba():
+    try:
+        from app import prueba
+
+        prueba.preprocessor("tests")
+    except LookupError:
+        pytest.skip("Faltan los datos de NLTK (stopwords, wordnet)")
+    return prueba
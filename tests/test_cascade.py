@@ -0,0 +1,15 @@
+import numpy as np
+
+from app.preprocessing import _synthetic_corpus
+
+
+def test_cascade_decisions_match_exact(prueba):
+    prueba.calentar_modelos()
+    documents = prueba.preprocessor.preprocess_batch(_synthetic_corpus(200, seed=2))
+    for batch_size in (1, 64):
+        for start in range(0, 128, batch_size):
+            batch = documents[start:start + batch_size]
+            exact_probability, exact_emotion = prueba.puntuar_textos_procesados(batch, exacto=True)
+            cascade_probability, cascade_emotion = prueba.puntuar_textos_procesados(batch, exacto=False)
+            np.testing.assert_array_equal(exact_probability >= prueba.umbral, cascade_probability >= prueba.umbral)
+            np.testing.assert_array_equal(exact_emotion, cascade_emotion)
@@ -0,0 +1,49 @@
+import copy
+
+import numpy as np
+import pytest
+
+from app.compress_models import _collapse, member_terms, prune_member, select_terms
+from app.features import FusedTfidfFeaturizer
+from app.model_registry import SENTIMENT_MEMBERS, SUICIDE_MEMBERS
+from app.tree_engine import is_tree_ensemble
+
+from conftest import load_members
+
+
+def test_collapse_skips_bypassed_nodes():
+    #       0
+    #     1   2
+    #    3 4
+    left = np.array([1, 3, -1, -1, -1])
+    right = np.array([2, 4, -1, -1, -1])
+    order, new_left, new_right = _collapse(left, right, np.array([-1, 4, -1, -1, -1]))
+    np.testing.assert_array_equal(order, [0, 4, 2])
+    np.testing.assert_array_equal(new_left, [1, -1, -1])
+    np.testing.assert_array_equal(new_right, [2, -1, -1])
+
+
+def _without(X, keep):
+    # Documentos sin los términos podados: la poda no debe cambiar nada en ellos
+    X = X.tocsr(copy=True)
+    X.data[~keep[X.indices]] = 0.0
+    X.eliminate_zeros()
+    return X
+
+
+@pytest.mark.parametrize("names, index", [(SENTIMENT_MEMBERS, 0), (SUICIDE_MEMBERS, 1)])
+def test_pruned_trees_match_on_documents_without_pruned_terms(registry, documents, names, index):
+    members = [(name, model) for name, model in load_members(registry, names) if is_tree_ensemble(model)]
+    if not members:
+        pytest.skip("No hay miembros de árboles")
+    X = FusedTfidfFeaturizer(registry.get("tfidf_sentiment"), registry.get("tfidf_suicide")).transform(documents)[index]
+    for name, model in members:
+        used = member_terms(model, X.shape[1], 0.05)
+        keep = select_terms(X.shape[1], [(name, model)], 0.05)
+        assert 0 < used.sum() < X.shape[1]
+        pruned = copy.deepcopy(model)
+        prune_member(pruned, keep, used)
+        X_absent = _without(X, used)
+        np.testing.assert_allclose(
+            pruned.predict_proba(X_absent[:, keep]), model.predict_proba(X_absent), rtol=0, atol=1e-6,
+        )
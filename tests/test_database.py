@@ -0,0 +1,68 @@
+import asyncio
+import time
+
+import pytest
+
+from api.database import Database, QueryTimeoutError
+
+COUNT_TO = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?) SELECT count(*) FROM n"
+
+
+@pytest.fixture
+def database(tmp_path):
+    database = Database(str(tmp_path / "test.db"), readers=1, read_timeout=5.0)
+    database.open()
+    yield database
+    database.close()
+
+
+def _count(conn, n):
+    return conn.execute(COUNT_TO, (n,)).fetchone()[0]
+
+
+def test_timeout_interrupts_a_running_query(database):
+    async def scenario():
+        start = time.perf_counter()
+        with pytest.raises(QueryTimeoutError):
+            await database.read(_count, 10 ** 10, timeout=0.2)
+        assert time.perf_counter() - start < 2.0
+        # La misma conexión (solo hay una) sigue sirviendo
+        assert await database.read(_count, 1000) == 1000
+
+    asyncio.run(scenario())
+
+
+def test_late_timeout_does_not_interrupt_the_next_query(database):
+    def slow(conn):
+        time.sleep(0.3)
+        return conn.execute("SELECT 1").fetchone()[0]
+
+    async def scenario():
+        with pytest.raises(QueryTimeoutError):
+            await database.read(slow, timeout=0.1)
+        # La consulta anterior termina después de su plazo y libera la
+        # conexión; la siguiente petición no debe recibir la interrupción
+        assert await database.read(_count, 200_000) == 200_000
+
+    asyncio.run(scenario())
+
+
+def test_expired_query_never_starts(database):
+    calls = []
+
+    def record(conn):
+        calls.append(1)
+
+    def block(conn):
+        time.sleep(0.3)
+
+    async def scenario():
+        blocker = asyncio.ensure_future(database.read(block))
+        await asyncio.sleep(0.05)
+        with pytest.raises(QueryTimeoutError):
+            await database.read(record, timeout=0.1)
+        await blocker
+        await asyncio.sleep(0.1)
+        assert calls == []
+
+    asyncio.run(scenario())
@@ -0,0 +1,91 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from app.features import FusedTfidfFeaturizer
+from app.linear_engine import LinearEnsembleEngine, is_linear
+from app.model_registry import SENTIMENT_MEMBERS, SUICIDE_MEMBERS
+from app.tree_engine import TreeEnsembleEngine, CROSSOVER_SIZES, _round_down_float32, crossover, is_tree_ensemble, random_probe
+
+from conftest import load_members
+
+TASKS = [("sentiment", SENTIMENT_MEMBERS, 0), ("suicide", SUICIDE_MEMBERS, 1)]
+
+
+@pytest.fixture(scope="module")
+def features(registry, documents):
+    return FusedTfidfFeaturizer(registry.get("tfidf_sentiment"), registry.get("tfidf_suicide")).transform(documents)
+
+
+@pytest.mark.parametrize("task, names, index", TASKS)
+def test_linear_engine_matches_predict_proba(registry, features, task, names, index):
+    members = [(name, model) for name, model in load_members(registry, names) if is_linear(model)]
+    if not members:
+        pytest.skip(f"No hay miembros lineales en {task}")
+    X = features[index]
+    engine = LinearEnsembleEngine(members)
+    probabilities = engine.predict_proba(X)
+    labels = engine.predict(X)
+    for name, model in members:
+        np.testing.assert_allclose(probabilities[name], model.predict_proba(X), rtol=0, atol=1e-9)
+        np.testing.assert_array_equal(labels[name], model.predict(X))
+
+
+@pytest.mark.parametrize("task, names, index", TASKS)
+def test_tree_engine_matches_predict_proba(registry, features, task, names, index):
+    members = [(name, model) for name, model in load_members(registry, names) if is_tree_ensemble(model)]
+    if not members:
+        pytest.skip(f"No hay miembros de árboles en {task}")
+    X = features[index]
+    for name, model in members:
+        engine = TreeEnsembleEngine.compile(model)
+        for batch in (X, X[:1], X[:7], random_probe(X.shape[1])):
+            np.testing.assert_allclose(engine.predict_proba(batch), model.predict_proba(batch), rtol=0, atol=1e-5)
+        np.testing.assert_array_equal(engine.predict(X), model.predict(X))
+
+
+def test_crossover_is_a_measured_size(registry):
+    name, model = next(
+        ((name, model) for name, model in load_members(registry, SENTIMENT_MEMBERS + SUICIDE_MEMBERS)
+         if is_tree_ensemble(model)),
+        (None, None),
+    )
+    if model is None:
+        pytest.skip("No hay miembros de árboles")
+    engine = TreeEnsembleEngine.compile(model)
+    assert crossover(engine, model, model.n_features_in_, sizes=(1, 4), repeats=1) in (0, 1, 4)
+
+
+def test_round_down_float32_keeps_decisions():
+    rng = np.random.default_rng(0)
+    thresholds = rng.uniform(-1, 1, 10_000)
+    rounded = _round_down_float32(thresholds)
+    assert rounded.dtype == np.float32
+    assert (rounded.astype(np.float64) <= thresholds).all()
+    # Los float32 a ambos lados de cada umbral toman la misma dirección
+    for x in (rounded, np.nextafter(rounded, np.float32(np.inf)), thresholds.astype(np.float32)):
+        np.testing.assert_array_equal(x > rounded, x.astype(np.float64) > thresholds)
+
+
+def test_engines_are_compiled_once_across_threads(prueba):
+    calls = []
+
+    @prueba._una_vez
+    def compile_engine(name):
+        calls.append(name)
+        time.sleep(0.05)
+        return object()
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(compile_engine("rf"))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert calls == ["rf"]
+    assert all(result is results[0] for result in results)
+    compile_engine.cache_clear()
+    compile_engine("rf")
+    assert calls == ["rf", "rf"]
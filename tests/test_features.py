@@ -0,0 +1,26 @@
+import pytest
+
+from app.features import FusedTfidfFeaturizer
+
+
+@pytest.fixture(scope="module")
+def vectorizers(registry):
+    names = ("tfidf_sentiment", "tfidf_suicide")
+    if not all(registry.available(name) for name in names):
+        pytest.skip("Faltan los vectorizadores TF-IDF")
+    return [registry.get(name) for name in names]
+
+
+def test_fused_equals_separate_vectorizers(vectorizers, documents):
+    actual = FusedTfidfFeaturizer(*vectorizers).transform(documents)
+    assert len(actual) == len(vectorizers)
+    for vectorizer, matrix in zip(vectorizers, actual):
+        expected = vectorizer.transform(documents)
+        assert matrix.shape == expected.shape
+        assert (matrix != expected).nnz == 0
+
+
+def test_empty_and_repeated_documents(vectorizers):
+    documents = ["", "sad sad sad", "", "unknownterm"]
+    for vectorizer, matrix in zip(vectorizers, FusedTfidfFeaturizer(*vectorizers).transform(documents)):
+        assert (matrix != vectorizer.transform(documents)).nnz == 0
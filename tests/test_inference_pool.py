@@ -0,0 +1,115 @@
+import os
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from app.inference_pool import InferencePool
+from app.metrics import STAGE_SECONDS, collect
+from app.preprocessing import _synthetic_corpus
+
+
+def _score_lengths(texts, offset=0):
+    probabilities = np.array([len(text) / 1000 + offset for text in texts])
+    emotions = np.array([len(text.split()) for text in texts], dtype=np.intp)
+    masks = np.array([sum(map(ord, text)) for text in texts], dtype=np.int64)
+    return probabilities, emotions, masks
+
+
+def _score_timed(texts):
+    with STAGE_SECONDS.time(stage="pool_test"):
+        return _score_lengths(texts)
+
+
+def _score_slowly(texts):
+    if any(text == "sleep" for text in texts):
+        time.sleep(30)
+    return _score_lengths(texts)
+
+
+def _score_or_crash(texts, marker):
+    # Muere la primera vez que ve "crash"; el reintento en otro worker funciona
+    if "crash" in texts and not os.path.exists(marker):
+        open(marker, "w").close()
+        os._exit(1)
+    return _score_lengths(texts)
+
+
+@pytest.fixture
+def pool_factory():
+    pools = []
+
+    def make(score_texts, n_workers=2, **kwargs):
+        pool = InferencePool(score_texts, n_workers, **kwargs)
+        pool.start()
+        pools.append(pool)
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.stop()
+
+
+def _assert_same(actual, expected):
+    np.testing.assert_allclose(actual[0], expected[0])
+    np.testing.assert_array_equal(actual[1], expected[1])
+    np.testing.assert_array_equal(actual[2], expected[2])
+
+
+def test_pool_matches_in_process(pool_factory):
+    pool = pool_factory(_score_lengths)
+    texts = _synthetic_corpus(100) + ["", "ñandú 😀 ünïcode"]
+    _assert_same(pool.score(texts, 0.5), _score_lengths(texts, 0.5))
+    _assert_same(pool.score(texts[:3]), _score_lengths(texts[:3]))
+    assert [len(result) for result in pool.score([])] == [0, 0, 0]
+
+
+def test_pool_is_safe_with_threads_in_the_parent(pool_factory):
+    # Un hilo con un lock tomado no afecta a los workers (no se hace fork de este proceso)
+    lock, release = threading.Lock(), threading.Event()
+
+    def hold():
+        with lock:
+            release.wait()
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    try:
+        pool = pool_factory(_score_lengths)
+        texts = _synthetic_corpus(40)
+        _assert_same(pool.score(texts), _score_lengths(texts))
+    finally:
+        release.set()
+        holder.join()
+
+
+def test_worker_timings_are_observed_in_the_parent(pool_factory):
+    pool = pool_factory(_score_timed)
+    texts = _synthetic_corpus(40)
+    with collect() as observations:
+        _assert_same(pool.score(texts), _score_lengths(texts))
+    # Un fragmento por worker, cada uno con su etapa medida en el worker
+    assert [labels for _, labels, _ in observations] == [{"stage": "pool_test"}] * 2
+    assert "favfix_stage_seconds_count{stage=\"pool_test\"} 2" in STAGE_SECONDS.render()
+
+
+def test_timeout_kills_and_replaces_the_worker(pool_factory):
+    pool = pool_factory(_score_slowly, n_workers=1, timeout=1.0)
+    with pytest.raises(RuntimeError, match="Tiempo agotado"):
+        pool.score(["sleep"])
+    assert pool.restarts == 1
+    _assert_same(pool.score(["still works"]), _score_lengths(["still works"]))
+
+
+def test_dead_worker_is_replaced_and_the_shard_retried(pool_factory, tmp_path):
+    pool = pool_factory(_score_or_crash, n_workers=1)
+    _assert_same(pool.score(["crash"], str(tmp_path / "crashed")), _score_lengths(["crash"]))
+    assert pool.restarts == 1
+
+
+def test_pool_matches_prueba(prueba, pool_factory):
+    texts = _synthetic_corpus(64)
+    expected = prueba.puntuar_textos(texts, exacto=True)
+    pool = pool_factory(prueba.puntuar_textos, warmup=prueba.calentar_modelos)
+    _assert_same(pool.score(texts, True), expected)
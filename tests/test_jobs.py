@@ -0,0 +1,39 @@
+import asyncio
+
+import pytest
+
+from api.jobs import JobStore, TooManyJobsError
+
+
+def test_overflow_evicts_only_finished_jobs():
+    async def scenario():
+        store = JobStore(ttl=600.0, max_jobs=3)
+        running = store.create()
+        finished = store.create()
+        store.update(finished, "stored")
+        queued = store.create()
+        # Lleno: se descarta el terminado, nunca los que siguen en curso
+        newest = store.create()
+        assert set(store.jobs) == {running, queued, newest}
+        with pytest.raises(TooManyJobsError):
+            store.create()
+        assert set(store.jobs) == {running, queued, newest}
+
+    asyncio.run(scenario())
+
+
+def test_run_keeps_a_reference_until_the_task_ends():
+    async def scenario():
+        store = JobStore()
+        release = asyncio.Event()
+        task = store.run(release.wait())
+        assert task in store._tasks
+        release.set()
+        await task
+        await asyncio.sleep(0)
+        assert not store._tasks
+        pending = store.run(asyncio.Event().wait())
+        await store.stop()
+        assert pending.cancelled()
+
+    asyncio.run(scenario())
@@ -0,0 +1,33 @@
+from datetime import datetime, timedelta
+
+from api.live_aggregates import SlidingWindowAggregator
+
+NOW = datetime(2026, 1, 1, 12, 30)
+
+
+def _rows():
+    return [
+        {"timestamp": NOW - timedelta(minutes=i), "emotion": "Alegría", "sector": "Salud", "suicide_probability": 0.1 * (i % 3)}
+        for i in range(10)
+    ]
+
+
+def test_window_answers_recent_queries():
+    aggregator = SlidingWindowAggregator(60)
+    aggregator.add_rows(_rows())
+    assert aggregator.covers(60, "minute")
+    assert not aggregator.covers(120, "minute")
+    assert not aggregator.covers(60, "day")
+    since = NOW - timedelta(minutes=60)
+    assert sum(count for _, count, _ in aggregator.query_emotions(since, "hour", now=NOW)) == 10
+    [(sector, average, _)] = aggregator.query_sectors(since, "hour", now=NOW)
+    assert sector == "Salud"
+    assert abs(average - sum(row["suicide_probability"] for row in _rows()) / 10) < 1e-12
+
+
+def test_disabled_window_never_covers():
+    # Con varios workers cada proceso vería solo sus escrituras
+    aggregator = SlidingWindowAggregator(60, enabled=False)
+    aggregator.add_rows(_rows())
+    assert not aggregator.covers(60, "minute")
+    assert aggregator.emotions == {} and aggregator.sectors == {}
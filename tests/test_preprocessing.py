@@ -0,0 +1,48 @@
+import string
+
+import pytest
+
+from app.preprocessing import TextPreprocessor, _synthetic_corpus, preprocess_text_reference
+
+from conftest import STOP_WORDS, SuffixLemmatizer
+
+EDGE_CASES = [
+    "",
+    "   ",
+    "Don't STOP me now!!!",
+    "tabs\tand\nnew lines\r\nhere",
+    "¿Qué pasa? ÉLAN – “quotes” and emoji 😀",
+    "multiple    spaces ... and ---- dashes",
+    string.punctuation,
+    "I was so sad about my jobs and my friends",
+]
+
+
+@pytest.fixture
+def preprocessor():
+    return TextPreprocessor(STOP_WORDS, SuffixLemmatizer())
+
+
+@pytest.mark.parametrize("text", EDGE_CASES + _synthetic_corpus(200))
+def test_matches_reference(preprocessor, text):
+    assert preprocessor(text) == preprocess_text_reference(text, STOP_WORDS, SuffixLemmatizer())
+
+
+def test_batch_matches_single_texts(preprocessor):
+    texts = _synthetic_corpus(50) * 2
+    assert preprocessor.preprocess_batch(texts) == [preprocessor(text) for text in texts]
+
+
+def test_matches_reference_with_nltk():
+    try:
+        from nltk.corpus import stopwords
+        from nltk.stem import WordNetLemmatizer
+
+        stop_words = stopwords.words("english")
+        lemmatizer = WordNetLemmatizer()
+        lemmatizer.lemmatize("tests")
+    except LookupError:
+        pytest.skip("Faltan los datos de NLTK (stopwords, wordnet)")
+    preprocessor = TextPreprocessor(stop_words, lemmatizer)
+    for text in EDGE_CASES + _synthetic_corpus(200):
+        assert preprocessor(text) == preprocess_text_reference(text, stop_words, lemmatizer)
@@ -0,0 +1,21 @@
+import pandas as pd
+
+
+def test_parquet_output_from_csv_with_late_values(prueba, tmp_path):
+    from app.score_corpus import score_file
+
+    source = tmp_path / "posts.csv"
+    pd.DataFrame({
+        "text": ["i feel fine", "so tired", "nobody cares", "great day", "i am sad", "hello"],
+        "note": [None, None, None, "hello", None, "bye"],
+        "count": [1, 2, 3, None, 5, 6],
+    }).to_csv(source, index=False)
+    output = tmp_path / "scored.parquet"
+
+    assert score_file(str(source), str(output), chunk_size=3) == 6
+    scored = pd.read_parquet(output)
+    assert len(scored) == 6
+    assert scored["note"].isna().tolist() == [True, True, True, False, True, False]
+    assert scored["note"].dropna().tolist() == ["hello", "bye"]
+    assert scored["count"].dropna().tolist() == ["1.0", "2.0", "3.0", "5.0", "6.0"]
+    assert set(scored["result"]) <= {"suicidio", "no suicidio"}